@@ -0,0 +1,336 @@
+"""
+Benchmarks pipeline throughput on a synthetic inbox, with the fake LLM backend.
+
+Each repetition generates the same inbox (text, web clipping, CSV, PDF and image files, mixed and sized as
+requested) in a fresh temporary vault and runs `run_pipeline` on it in a child process. Reports
+files/sec, peak RSS and per-stage times, saves the results under benchmarks/results/ and
+compares them with the previous run of the same configuration.
+
+Usage: python benchmarks/bench_pipeline.py [--files 200] [--mix text=60,csv=15,pdf=15,image=10]
+                                           [--size-scale 1.0] [--llm-latency 0.2] [--repeat 3]
+"""
+import argparse
+import glob
+import json
+import os
+import random
+import resource
+import statistics
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+
+from bench_search import make_vocabulary
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(REPO_ROOT, "benchmarks", "results")
+
+# Size range of each file type, in bytes before --size-scale; sizes are drawn log-uniformly
+SIZE_RANGES = {
+    "text": (500, 50_000),
+    "clip": (2_000, 80_000),
+    "csv": (2_000, 2_000_000),
+    "pdf": (2_000, 500_000),
+    "image": (5_000, 1_000_000),
+}
+
+def parse_mix(mix: str) -> dict[str, int]:
+    weights = {}
+    for part in mix.split(","):
+        file_type, _, weight = part.partition("=")
+        if file_type not in SIZE_RANGES:
+            raise SystemExit(f"Unknown file type in --mix: {file_type} (expected one of {', '.join(SIZE_RANGES)})")
+        weights[file_type] = int(weight or 1)
+    return weights
+
+def make_text(rng: random.Random, size: int, words: list[str], weights: list[float]) -> bytes:
+    """A Markdown note with headings and paragraphs of Zipf-distributed words."""
+    parts = [f"# {' '.join(rng.choices(words[:2000], k=4)).title()}\n"]
+    length = len(parts[0])
+    while length < size:
+        if rng.random() < 0.1:
+            part = f"\n## {' '.join(rng.choices(words[:2000], k=3)).title()}\n"
+        else:
+            part = "\n" + " ".join(rng.choices(words, weights, k=rng.randint(30, 120))) + ".\n"
+        parts.append(part)
+        length += len(part)
+    return "".join(parts).encode("utf-8")
+
+def make_clip(rng: random.Random, size: int, words: list[str], weights: list[float]) -> bytes:
+    """A web clipping: an article wrapped in navigation menus, banners, images and linked text."""
+    site = f"https://{rng.choice(words[:300])}.example.com"
+    menu = "".join(f"- [{word.title()}]({site}/{word})\n" for word in rng.sample(words[:100], 6))
+    parts = [
+        f"---\ntitle: {' '.join(rng.choices(words[:2000], k=5)).title()}\nsource: {site}/post?utm_source=rss&utm_medium=feed\n---\n",
+        f"[Skip to main content](#main)\n\n{menu}\nWe use cookies to improve your experience. Accept all cookies\n\n",
+    ]
+    length = sum(len(part) for part in parts)
+    while length < size:
+        roll = rng.random()
+        if roll < 0.1:
+            part = f"\n![{rng.choice(words)}]({site}/images/{rng.randbytes(12).hex()}.png?w=1200&h=800)\n"
+        elif roll < 0.15:
+            part = "\nShare on Twitter | Share on Facebook | Share on LinkedIn\n\nRead more\n"
+        else:
+            sentence = rng.choices(words, weights, k=rng.randint(30, 120))
+            for i in rng.sample(range(len(sentence)), min(3, len(sentence))):
+                sentence[i] = f"[**{sentence[i]}**]({site}/{rng.randbytes(8).hex()}?ref=inline)"
+            part = "\n" + "  ".join(sentence) + ".\n"
+        parts.append(part)
+        length += len(part)
+    parts.append(f"\n{menu}\nSubscribe to our newsletter\n\n© 2024 {site}. All rights reserved.\n")
+    return "".join(parts).encode("utf-8")
+
+def make_csv(rng: random.Random, size: int, words: list[str]) -> bytes:
+    lines = ["id,name,category,amount,date,notes"]
+    length = len(lines[0])
+    row = 0
+    while length < size:
+        row += 1
+        line = (f"{row},{rng.choice(words[:500])},{rng.choice(words[:12])},{rng.uniform(0, 1000):.2f},"
+                f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d},{'' if rng.random() < 0.2 else rng.choice(words)}")
+        lines.append(line)
+        length += len(line) + 1
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+def _pdf_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+def make_pdf(rng: random.Random, size: int, words: list[str], weights: list[float]) -> bytes:
+    """A minimal valid PDF with pages of Helvetica text, written directly without a PDF library."""
+    pages = []
+    length = 0
+    while length < size or not pages:
+        lines = [" ".join(rng.choices(words, weights, k=12)) for _ in range(45)]
+        stream = "BT /F1 10 Tf 50 780 Td 14 TL " + " ".join(f"({_pdf_escape(line)}) '" for line in lines) + " ET"
+        pages.append(stream.encode("latin-1"))
+        length += len(pages[-1]) + 200
+
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for stream in pages:
+        kids.append(len(objects) + 1)
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects) + 2} 0 R >>".encode())
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(f'{kid} 0 R' for kid in kids)}] /Count {len(kids)} >>".encode()
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref_offset = len(output)
+    output += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    output += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    output += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref_offset)
+    return bytes(output)
+
+def make_png(rng: random.Random, size: int) -> bytes:
+    """A noisy RGB PNG of roughly `size` bytes (noise barely compresses), written with zlib."""
+    side = max(8, int((size / 3) ** 0.5))
+    rows = b"".join(b"\x00" + rng.randbytes(side * 3) for _ in range(side))
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    header = struct.pack(">IIBBBBB", side, side, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(rows, 1)) + chunk(b"IEND", b"")
+
+def make_inbox(inbox: str, files: int, mix: dict[str, int], size_scale: float, seed: int) -> dict[str, int]:
+    """Writes the synthetic inbox and returns the number of bytes written per file type."""
+    rng = random.Random(seed)
+    words, weights = make_vocabulary()
+    written = dict.fromkeys(mix, 0)
+    extensions = {"text": "md", "clip": "md", "csv": "csv", "pdf": "pdf", "image": "png"}
+    for number in range(files):
+        file_type = rng.choices(list(mix), list(mix.values()))[0]
+        low, high = SIZE_RANGES[file_type]
+        size = int(low * (high / low) ** rng.random() * size_scale)
+        if file_type == "text":
+            data = make_text(rng, size, words, weights)
+        elif file_type == "clip":
+            data = make_clip(rng, size, words, weights)
+        elif file_type == "csv":
+            data = make_csv(rng, size, words)
+        elif file_type == "pdf":
+            data = make_pdf(rng, size, words, weights)
+        else:
+            data = make_png(rng, size)
+        with open(os.path.join(inbox, f"{file_type}-{number:05d}.{extensions[file_type]}"), "wb") as f:
+            f.write(data)
+        written[file_type] += len(data)
+    return written
+
+def run_worker(vault: str, sequential: bool):
+    """Runs the pipeline inside the vault and prints the measurements as JSON. Runs in a child process."""
+    os.chdir(vault) # config.py locates the vault from the working directory
+    sys.path.insert(0, REPO_ROOT)
+    from pkm_gardener import orchestrator
+    from pkm_gardener.utils.prompts import prompt_stats
+    from pkm_gardener.utils.tracing import tracer
+
+    tracer.enabled = True
+    orchestrator.PIPELINE_CONCURRENT = not sequential
+    devnull = open(os.devnull, "w")
+    stdout, sys.stdout = sys.stdout, devnull # The pipeline's progress output would dominate the timing
+    try:
+        start = time.perf_counter()
+        finished = orchestrator.run_pipeline()
+        elapsed = time.perf_counter() - start
+    finally:
+        sys.stdout = stdout
+        devnull.close()
+
+    statuses = {}
+    for job in finished:
+        statuses[job.status] = statuses.get(job.status, 0) + 1
+    # ru_maxrss is in kilobytes on Linux; children covers the PDF extraction process pool
+    peak_rss_mb = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                      resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss) / 1024
+    print(json.dumps({
+        "files": len(finished),
+        "seconds": elapsed,
+        "files_per_second": len(finished) / elapsed if elapsed else 0.0,
+        "peak_rss_mb": peak_rss_mb,
+        "statuses": statuses,
+        "prompt_requests": prompt_stats.requests,
+        "prompt_tokens": prompt_stats.prompt_tokens,
+        "stages": tracer.stage_stats(),
+    }))
+
+def merge_runs(runs: list, elapsed: float) -> dict:
+    """Combines the measurements of the worker processes of one run."""
+    if len(runs) == 1:
+        return runs[0]
+    files = sum(run["files"] for run in runs)
+    statuses = {}
+    for run in runs:
+        for status, count in run["statuses"].items():
+            statuses[status] = statuses.get(status, 0) + count
+    return {
+        "files": files,
+        "seconds": elapsed,
+        "files_per_second": files / elapsed if elapsed else 0.0,
+        "peak_rss_mb": sum(run["peak_rss_mb"] for run in runs),
+        "statuses": statuses,
+        "prompt_requests": sum(run["prompt_requests"] for run in runs),
+        "prompt_tokens": sum(run["prompt_tokens"] for run in runs),
+        "stages": max(runs, key=lambda run: run["files"])["stages"],
+        "workers": [run["files"] for run in runs],
+    }
+
+def git_revision() -> str:
+    try:
+        revision = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                                  capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=REPO_ROOT,
+                               capture_output=True, text=True, check=True).stdout.strip()
+        return f"{revision}-dirty" if dirty else revision
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def previous_result(configuration: dict) -> dict | None:
+    """The most recent saved result with the same configuration."""
+    for path in sorted(glob.glob(os.path.join(RESULTS_DIR, "*.json")), reverse=True):
+        with open(path, encoding="utf-8") as f:
+            result = json.load(f)
+        if result.get("configuration") == configuration:
+            return result
+    return None
+
+def _change(new: float, old: float) -> str:
+    return f"{(new - old) / old:+.0%}" if old else "n/a"
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--mix", default="text=60,csv=15,pdf=15,image=10", help="Relative weights of each file type.")
+    parser.add_argument("--size-scale", type=float, default=1.0, help="Multiplies every file size.")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="Seconds per fake LLM call.")
+    parser.add_argument("--llm-latency-per-1k-tokens", type=float, default=0.0, help="Extra seconds per 1,000 prompt tokens of a fake LLM call.")
+    parser.add_argument("--sequential", action="store_true", help="Use the sequential pipeline instead of the concurrent one.")
+    parser.add_argument("--processes", type=int, default=1, help="Gardener processes sharing the inbox.")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--no-save", action="store_true", help="Do not save the results.")
+    parser.add_argument("--worker", metavar="VAULT", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker, args.sequential)
+        return
+
+    configuration = {
+        "files": args.files, "mix": parse_mix(args.mix), "size_scale": args.size_scale,
+        "llm_latency": args.llm_latency, "llm_latency_per_1k_tokens": args.llm_latency_per_1k_tokens,
+        "sequential": args.sequential, "seed": args.seed,
+        "processes": args.processes,
+    }
+    env = dict(os.environ, PKM_LLM_BACKEND="fake", PKM_FAKE_LLM_LATENCY=str(args.llm_latency),
+               PKM_FAKE_LLM_LATENCY_PER_1K_TOKENS=str(args.llm_latency_per_1k_tokens))
+    env.pop("PKM_ROOT", None)
+
+    runs = []
+    for repetition in range(1, args.repeat + 1):
+        with tempfile.TemporaryDirectory() as vault:
+            for folder in (".obsidian", "00_Inbox", "01_Projects/Bench", "02_Areas/Bench", "03_Resources/Bench"):
+                os.makedirs(os.path.join(vault, folder))
+            written = make_inbox(os.path.join(vault, "00_Inbox"), args.files, configuration["mix"], args.size_scale, args.seed)
+            command = [sys.executable, os.path.abspath(__file__), "--worker", vault]
+            if args.sequential:
+                command.append("--sequential")
+            start = time.perf_counter()
+            workers = [subprocess.Popen(command, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+                       for _ in range(args.processes)]
+            outputs = [worker.communicate() for worker in workers]
+            elapsed = time.perf_counter() - start
+            for worker, (_, stderr) in zip(workers, outputs):
+                if worker.returncode != 0:
+                    raise SystemExit(f"Benchmark run failed:\n{stderr}")
+            run = merge_runs([json.loads(stdout.strip().splitlines()[-1]) for stdout, _ in outputs], elapsed)
+            if run["files"] != args.files:
+                raise SystemExit(f"The workers finished {run['files']} jobs for {args.files} files: a file was processed twice or lost")
+            runs.append(run)
+            tokens_per_prompt = run["prompt_tokens"] / run["prompt_requests"] if run["prompt_requests"] else 0
+            print(f"Run {repetition}/{args.repeat}: {run['files_per_second']:.1f} files/s, "
+                  f"{run['seconds']:.2f} s, peak RSS {run['peak_rss_mb']:.0f} MB, "
+                  f"{tokens_per_prompt:.0f} tokens per metadata prompt, statuses {run['statuses']}")
+
+    median_run = sorted(runs, key=lambda run: run["files_per_second"])[len(runs) // 2]
+    result = {
+        "revision": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "configuration": configuration,
+        "inbox_bytes": written,
+        "files_per_second": statistics.median(run["files_per_second"] for run in runs),
+        "peak_rss_mb": max(run["peak_rss_mb"] for run in runs),
+        "stages": median_run["stages"],
+        "runs": runs,
+    }
+
+    print(f"\nMedian: {result['files_per_second']:.1f} files/s, peak RSS {result['peak_rss_mb']:.0f} MB "
+          f"({sum(written.values()) / 1e6:.1f} MB inbox: {', '.join(f'{k} {v / 1e6:.1f} MB' for k, v in written.items())})")
+    previous = previous_result(configuration)
+    print(f"{'stage':<12} {'count':>6} {'p50 ms':>9} {'p95 ms':>9} {'total s':>8}" + ("  vs previous p50" if previous else ""))
+    for name, stats in result["stages"].items():
+        line = f"{name:<12} {stats['count']:>6} {stats['p50_ms']:>9.1f} {stats['p95_ms']:>9.1f} {stats['total_s']:>8.2f}"
+        if previous and name in previous["stages"]:
+            line += f"  {_change(stats['p50_ms'], previous['stages'][name]['p50_ms'])}"
+        print(line)
+    if previous:
+        print(f"Compared with {previous['revision']} ({previous['timestamp']}): "
+              f"throughput {_change(result['files_per_second'], previous['files_per_second'])}, "
+              f"peak RSS {_change(result['peak_rss_mb'], previous['peak_rss_mb'])}.")
+
+    if not args.no_save:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        path = os.path.join(RESULTS_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{result['revision']}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+        print(f"Saved {os.path.relpath(path, REPO_ROOT)}")
+
+if __name__ == "__main__":
+    main()
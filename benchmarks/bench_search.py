@@ -0,0 +1,99 @@
+"""
+Benchmarks the full-text search index: build time and query latency over a synthetic vault.
+
+Usage: python benchmarks/bench_search.py [--notes 50000] [--queries 200]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+SYLLABLES = "ka lo mi ne ru sa ti vo ze ba de fi gu ho ja ke".split()
+VOCABULARY_SIZE = 20000
+
+def make_vocabulary() -> tuple[list[str], list[float]]:
+    """
+    Builds a synthetic vocabulary with Zipf-distributed frequencies, like natural language:
+    a few very common words and a long tail of rare ones.
+    """
+    words = []
+    for i in range(VOCABULARY_SIZE):
+        word, n = "", i + len(SYLLABLES)
+        while n:
+            n, digit = divmod(n, len(SYLLABLES))
+            word += SYLLABLES[digit]
+        words.append(word)
+    weights = [1 / rank for rank in range(1, VOCABULARY_SIZE + 1)]
+    return words, weights
+
+def make_note(rng: random.Random, number: int, words: list[str], weights: list[float]):
+    topic_words = rng.sample(words[:5000], 6)
+    body_words = rng.choices(words, weights, k=rng.randint(80, 400)) + topic_words * 3
+    rng.shuffle(body_words)
+    return {
+        "path": f"03_Resources/Bench/note-{number:06d}.md",
+        "title": " ".join(topic_words[:3]).title(),
+        "tags": topic_words[:4],
+        "body": " ".join(body_words),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--notes", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as vault:
+        # config.py locates the vault from the working directory
+        os.makedirs(os.path.join(vault, ".obsidian"))
+        os.chdir(vault)
+        sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        from pkm_gardener.core_modules.search_index import SearchIndex
+        from pkm_gardener.core_modules.vault_index import NoteRecord
+
+        rng = random.Random(args.seed)
+        words, weights = make_vocabulary()
+        index = SearchIndex(os.path.join(vault, "bench_search.sqlite3"))
+
+        def notes():
+            for number in range(args.notes):
+                note = make_note(rng, number, words, weights)
+                record = NoteRecord(
+                    path=note["path"], title=note["title"], frontmatter={"tags": note["tags"], "type": "document"},
+                    tags=note["tags"], content_hash="", summary="",
+                )
+                yield record, note["body"]
+
+        start = time.perf_counter()
+        index.replace_all(notes())
+        build_seconds = time.perf_counter() - start
+        size_mb = os.path.getsize(index.db_path) / (1024 * 1024)
+
+        latencies = []
+        for _ in range(args.queries):
+            # Mostly common-to-mid frequency terms, the realistic worst case for ranking
+            query = " ".join(rng.sample(words[:3000], rng.randint(1, 3)))
+            start = time.perf_counter()
+            index.search(query, limit=10)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+        record = NoteRecord(path="03_Resources/Bench/new.md", title="New", frontmatter={}, tags=[], content_hash="")
+        single_update_start = time.perf_counter()
+        index.update(record, " ".join(rng.choices(words, weights, k=200)))
+        update_ms = (time.perf_counter() - single_update_start) * 1000
+
+        latencies.sort()
+        print(f"Indexed {args.notes} notes in {build_seconds:.1f} s ({size_mb:.1f} MB on disk).")
+        print(f"Single-note update: {update_ms:.2f} ms.")
+        print(
+            f"{args.queries} queries: p50 {statistics.median(latencies):.2f} ms, "
+            f"p95 {latencies[int(len(latencies) * 0.95) - 1]:.2f} ms, max {latencies[-1]:.2f} ms."
+        )
+        os.chdir(os.path.dirname(vault)) # Leave the vault so it can be removed
+
+if __name__ == "__main__":
+    main()
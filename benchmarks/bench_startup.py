@@ -0,0 +1,92 @@
+"""
+Checks the startup budget: an empty-inbox run must finish well under the budget, and must
+not import the heavy libraries that only processing files needs.
+
+Usage: python benchmarks/bench_startup.py [--runs 10] [--budget-ms 200]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Loaded on demand by the processors, the classifiers and the LLM backend, never at startup
+HEAVY_MODULES = ("numpy", "pandas", "fitz", "PIL", "google.generativeai", "yaml", "multiprocessing")
+
+_REPORT_LOADED_MODULES = (
+    "import sys, runpy; sys.argv = ['pkm_gardener']; runpy.run_module('pkm_gardener', run_name='__main__'); "
+    f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules), file=sys.stderr)"
+)
+
+def make_vault(vault: str):
+    for folder in (".obsidian", "00_Inbox", "01_Projects", "02_Areas", "03_Resources"):
+        os.makedirs(os.path.join(vault, folder))
+
+def slowest_imports(importtime_output: str, count: int) -> list[tuple[int, str]]:
+    """
+    Parses `python -X importtime` output into the imports with the highest cumulative time,
+    down to the modules imported directly by top-level ones.
+    """
+    imports = []
+    for line in importtime_output.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2 # Nesting is shown as two spaces per level
+        if depth <= 1:
+            imports.append((int(cumulative), name.strip()))
+    return sorted(imports, reverse=True)[:count]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--budget-ms", type=float, default=200.0)
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [REPO_ROOT, env.get("PYTHONPATH")]))
+    env.pop("PKM_ROOT", None) # The vault is found from the working directory, as in a cron run
+
+    with tempfile.TemporaryDirectory() as vault:
+        make_vault(vault)
+        command = [sys.executable, "-m", "pkm_gardener"]
+        subprocess.run(command, cwd=vault, env=env, capture_output=True, check=True) # Warm up bytecode caches
+
+        baseline, timings = [], []
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, "-c", "pass"], cwd=vault, env=env, check=True)
+            baseline.append((time.perf_counter() - start) * 1000)
+            start = time.perf_counter()
+            subprocess.run(command, cwd=vault, env=env, capture_output=True, check=True)
+            timings.append((time.perf_counter() - start) * 1000)
+
+        importtime = subprocess.run(
+            [sys.executable, "-X", "importtime", "-m", "pkm_gardener"],
+            cwd=vault, env=env, capture_output=True, text=True, check=True,
+        ).stderr
+        loaded = subprocess.run(
+            [sys.executable, "-c", _REPORT_LOADED_MODULES],
+            cwd=vault, env=env, capture_output=True, text=True, check=True,
+        ).stderr.strip().splitlines()[-1:]
+
+    median = statistics.median(timings)
+    print(f"Empty-inbox run: median {median:.0f} ms over {args.runs} runs "
+          f"(interpreter alone: {statistics.median(baseline):.0f} ms, budget {args.budget_ms:.0f} ms).")
+    print("Slowest imports (cumulative):")
+    for microseconds, name in slowest_imports(importtime, 8):
+        print(f"  {microseconds / 1000:7.1f} ms  {name}")
+
+    heavy = [module for module in ",".join(loaded).split(",") if module]
+    if heavy:
+        print(f"FAIL: heavy modules imported at startup: {', '.join(heavy)}")
+    if median > args.budget_ms:
+        print(f"FAIL: over the {args.budget_ms:.0f} ms budget.")
+    sys.exit(1 if heavy or median > args.budget_ms else 0)
+
+if __name__ == "__main__":
+    main()
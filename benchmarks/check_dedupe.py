@@ -0,0 +1,117 @@
+"""
+Checks that a note routed into the vault is still recognized as a duplicate when it is
+dropped in the inbox again, with real pipeline runs and the fake LLM backend.
+
+The vault holds notes linking to a shared hub, and every inbox note links to it too, so the
+router appends a "Related notes" section to each routed note. After a first run, two copies
+of every routed note go back into the inbox: the original inbox file, byte for byte, and the
+routed note itself. The check fails unless the second run reports every copy as an exact
+copy of its note, or if the first run adds no link section to any note (nothing would be checked).
+
+Usage: python benchmarks/check_dedupe.py [--files 20]
+"""
+import argparse
+import os
+import random
+import subprocess
+import sys
+import tempfile
+
+from bench_search import make_vocabulary
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FOLDER = "03_Resources/Check"
+HUB = "Check-Hub"
+VAULT_NOTES = 5
+BODY_WORDS = 60 # Short notes, where the appended links weigh most in a near-duplicate score
+
+def _note_text(rng: random.Random, words: list[str], title: str) -> str:
+    # Random words keep the notes far apart, so none is taken for a near-duplicate of another
+    body = " ".join(rng.choice(words) for _ in range(BODY_WORDS))
+    return f"# {title}\n\nSee [[{HUB}]].\n\n{body}\n"
+
+def make_vault(vault: str, files: int, seed: int):
+    """Creates a vault with a few notes linking to the hub, and an inbox of `files` notes linking to it too."""
+    for folder in (".obsidian", "00_Inbox", FOLDER):
+        os.makedirs(os.path.join(vault, folder))
+    rng = random.Random(seed)
+    words, _ = make_vocabulary()
+    for number in range(VAULT_NOTES):
+        with open(os.path.join(vault, FOLDER, f"existing-{number}.md"), "w", encoding="utf-8") as f:
+            f.write(_note_text(rng, words, f"Existing {number}"))
+    for number in range(files):
+        with open(os.path.join(vault, "00_Inbox", f"note-{number:05d}.md"), "w", encoding="utf-8") as f:
+            f.write(_note_text(rng, words, f"Note {number}"))
+
+def run_worker(vault: str) -> int:
+    """Routes the inbox, drops copies of the routed notes back in and routes it again. Runs in a child process."""
+    os.chdir(vault) # config.py locates the vault from the working directory
+    sys.path.insert(0, REPO_ROOT)
+    from pkm_gardener import config
+    config.DEDUPE_ACTION = "skip" # Leaves the copies in the inbox, untouched
+    from pkm_gardener import orchestrator
+
+    inbox = os.path.join(vault, "00_Inbox")
+    originals = {}
+    for name in os.listdir(inbox):
+        with open(os.path.join(inbox, name), "rb") as f:
+            originals[name] = f.read()
+
+    routed = [job for job in orchestrator.run_pipeline() if job.status == "success" and job.final_filepath]
+    expected = {}
+    with_sections = 0
+    for number, job in enumerate(routed):
+        with open(job.final_filepath, "rb") as f:
+            note = f.read()
+        with_sections += b"\n## Related notes\n" in note or b"\n## Backlinks\n" in note
+        note_path = os.path.relpath(job.final_filepath, config.PKM_ROOT)
+        for name, data in ((f"original-copy-{number:05d}.md", originals[job.original_filename]),
+                           (f"routed-copy-{number:05d}.md", note)):
+            with open(os.path.join(inbox, name), "wb") as f:
+                f.write(data)
+            expected[name] = note_path
+
+    problems = []
+    if not routed:
+        problems.append("the first run routed no note")
+    elif not with_sections:
+        problems.append("the first run added no link section to any note; nothing was checked")
+    reported = {job.original_filename: job for job in orchestrator.run_pipeline()}
+    for name, note_path in sorted(expected.items()):
+        job = reported.get(name)
+        if job is None:
+            problems.append(f"{name} was not processed")
+        elif job.status != "duplicate":
+            problems.append(f"{name} was not reported as a duplicate of {note_path} (status: {job.status})")
+        elif job.error_message != f"Duplicate of {note_path} (exact copy)":
+            problems.append(f"{name} was not reported as an exact copy of {note_path}: {job.error_message}")
+
+    for problem in problems:
+        print(f"FAIL: {problem}", file=sys.stderr)
+    if not problems:
+        print(f"ok: {len(expected)} copies of {len(routed)} routed notes ({with_sections} with link sections)"
+              f" reported as exact copies", file=sys.stderr)
+    return 1 if problems else 0
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--files", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--worker", metavar="VAULT", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        sys.exit(run_worker(args.worker))
+
+    env = dict(os.environ, PKM_LLM_BACKEND="fake")
+    env.pop("PKM_ROOT", None)
+    with tempfile.TemporaryDirectory() as vault:
+        make_vault(vault, args.files, args.seed)
+        command = [sys.executable, os.path.abspath(__file__), "--worker", vault]
+        result = subprocess.run(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    print(result.stderr.strip())
+    sys.exit(result.returncode)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Checks that the pipeline fails, instead of hanging, when ingesting the jobs raises, in both the
+concurrent and the sequential mode, with real runs and the fake LLM backend.
+
+Each run gets a job generator that yields part of the inbox and then raises. It fails if the
+run does not finish within --timeout seconds, if it does not re-raise the ingest error once
+the jobs already ingested are done, or if an inbox file is afterwards neither filed in the
+vault nor back in the inbox.
+
+Usage: python benchmarks/check_pipeline_errors.py [--files 12] [--fail-after 5] [--timeout 120]
+"""
+import argparse
+import os
+import random
+import subprocess
+import sys
+import tempfile
+
+from bench_search import make_vocabulary
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PARA_FOLDERS = ("01_Projects", "02_Areas", "03_Resources")
+INGEST_ERROR = "check: ingesting the next file failed"
+
+def make_vault(vault: str, files: int, seed: int):
+    """Creates a vault whose inbox holds `files` distinct notes."""
+    for folder in (".obsidian", "00_Inbox") + PARA_FOLDERS:
+        os.makedirs(os.path.join(vault, folder))
+    rng = random.Random(seed)
+    words, _ = make_vocabulary()
+    for number in range(files):
+        body = " ".join(rng.choice(words) for _ in range(120))
+        with open(os.path.join(vault, "00_Inbox", f"note-{number:05d}.md"), "w", encoding="utf-8") as f:
+            f.write(f"# Note {number}\n\n{body}\n")
+
+def _vault_notes(vault: str) -> int:
+    return sum(1 for folder in PARA_FOLDERS for _, _, filenames in os.walk(os.path.join(vault, folder))
+               for name in filenames if name.endswith(".md") and name != "_index.md")
+
+def _inbox_files(inbox: str) -> list[str]:
+    """Every file left under the inbox, including the leased ones, except the workers' lease files."""
+    return [os.path.relpath(os.path.join(dirpath, name), inbox)
+            for dirpath, _, filenames in os.walk(inbox) for name in filenames if name != ".lease"]
+
+def run_worker(vault: str, concurrent: bool, fail_after: int) -> int:
+    """Runs the pipeline on a job generator that raises part-way. Runs in a child process."""
+    os.chdir(vault) # config.py locates the vault from the working directory
+    sys.path.insert(0, REPO_ROOT)
+    from pkm_gardener import orchestrator
+    from pkm_gardener.core_modules import ingestor
+    orchestrator.PIPELINE_CONCURRENT = concurrent
+
+    inbox = os.path.join(vault, "00_Inbox")
+    names = sorted(os.listdir(inbox))
+
+    def failing_jobs():
+        for number, name in enumerate(names):
+            if number == fail_after:
+                raise RuntimeError(INGEST_ERROR)
+            yield ingestor.make_job(os.path.join(inbox, name))
+
+    problems = []
+    try:
+        orchestrator.run_pipeline(failing_jobs())
+        problems.append("the run did not raise the ingest error")
+    except RuntimeError as e:
+        if str(e) != INGEST_ERROR:
+            problems.append(f"the run raised another error: {e}")
+    filed, left = _vault_notes(vault), _inbox_files(inbox)
+    if filed + len(left) != len(names):
+        problems.append(f"{len(names)} inbox files, but {filed} filed and {len(left)} left in the inbox: {left}")
+    left_leased = [path for path in left if os.path.dirname(path)]
+    if left_leased:
+        problems.append(f"files left in a lease directory: {left_leased}")
+
+    for problem in problems:
+        print(f"FAIL: {problem}", file=sys.stderr)
+    return 1 if problems else 0
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--files", type=int, default=12)
+    parser.add_argument("--fail-after", type=int, default=5, help="Files ingested before the job generator raises.")
+    parser.add_argument("--timeout", type=float, default=120, help="Seconds a run may take before it counts as hung.")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--worker", metavar="VAULT", help=argparse.SUPPRESS)
+    parser.add_argument("--sequential", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        sys.exit(run_worker(args.worker, not args.sequential, args.fail_after))
+
+    env = dict(os.environ, PKM_LLM_BACKEND="fake")
+    env.pop("PKM_ROOT", None)
+    failed = False
+    for mode in ("concurrent", "sequential"):
+        with tempfile.TemporaryDirectory() as vault:
+            make_vault(vault, args.files, args.seed)
+            command = [sys.executable, os.path.abspath(__file__), "--worker", vault, "--fail-after", str(args.fail_after)]
+            if mode == "sequential":
+                command.append("--sequential")
+            try:
+                result = subprocess.run(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                                        text=True, timeout=args.timeout)
+            except subprocess.TimeoutExpired:
+                failed = True
+                print(f"FAIL: {mode}: the run hung (no result after {args.timeout:.0f} s)")
+                continue
+        if result.returncode != 0:
+            failed = True
+            print(f"FAIL: {mode}:\n{result.stderr.strip()}")
+        else:
+            print(f"ok: {mode}: the ingest error was raised after {args.fail_after} of {args.files} files")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""
+Checks that several gardener processes can share one inbox: the claim, lease and reclaim
+protocol and the recovery of interrupted moves, with real processes and the fake LLM backend.
+
+Two scenarios run in fresh temporary vaults:
+- concurrent: --processes workers start together on the same inbox;
+- crash: one worker is killed half-way through the inbox, and once its lease has expired
+  --processes workers start together, reclaiming its files and recovering its moves.
+
+Each fails if a worker exits with an error, or if afterwards any inbox file was filed twice
+or not at all, a file is left in the inbox, a move is left in the journal or an empty
+placeholder note is left in the vault.
+
+Usage: python benchmarks/check_shared_inbox.py [--files 40] [--processes 3] [--rounds 3]
+"""
+import argparse
+import os
+import random
+import re
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench_search import make_vocabulary
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PARA_FOLDERS = ("01_Projects/Check", "02_Areas/Check", "03_Resources/Check")
+_MARKER = re.compile(r'check-marker-\d{5}')
+
+# Short leases, so the crash scenario does not wait minutes for the killed worker's to expire
+LEASE_HEARTBEAT_SECONDS = 0.5
+LEASE_EXPIRY_SECONDS = 3.0
+
+def make_vault(vault: str, files: int, seed: int) -> set[str]:
+    """Creates a vault whose inbox holds `files` notes, each with a unique marker. Returns the markers."""
+    for folder in (".obsidian", "00_Inbox") + PARA_FOLDERS:
+        os.makedirs(os.path.join(vault, folder))
+    rng = random.Random(seed)
+    words, _ = make_vocabulary()
+    markers = set()
+    for number in range(files):
+        marker = f"check-marker-{number:05d}"
+        # Random words keep the notes far apart, so none is taken for a near-duplicate of another
+        body = " ".join(rng.choice(words) for _ in range(120))
+        with open(os.path.join(vault, "00_Inbox", f"note-{number:05d}.md"), "w", encoding="utf-8") as f:
+            f.write(f"# Note {number}\n\n{marker}\n\n{body}\n")
+        markers.add(marker)
+    return markers
+
+def run_worker(vault: str):
+    """Runs the pipeline inside the vault with short leases. Runs in a child process."""
+    os.chdir(vault) # config.py locates the vault from the working directory
+    sys.path.insert(0, REPO_ROOT)
+    from pkm_gardener import config
+    config.LEASE_HEARTBEAT_SECONDS = LEASE_HEARTBEAT_SECONDS
+    config.LEASE_EXPIRY_SECONDS = LEASE_EXPIRY_SECONDS
+    from pkm_gardener import orchestrator
+    orchestrator.run_pipeline()
+
+def start_workers(vault: str, count: int, env: dict) -> list[subprocess.Popen]:
+    command = [sys.executable, os.path.abspath(__file__), "--worker", vault]
+    return [subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+            for _ in range(count)]
+
+def wait_for_workers(workers: list[subprocess.Popen]) -> list[str]:
+    """Waits for the workers; returns a problem for each one that did not exit cleanly."""
+    problems = []
+    for worker in workers:
+        _, stderr = worker.communicate()
+        if worker.returncode != 0:
+            problems.append(f"worker {worker.pid} exited with {worker.returncode}:\n{stderr.strip()}")
+    return problems
+
+def filed_notes(vault: str) -> list[str]:
+    notes = []
+    for folder in ("01_Projects", "02_Areas", "03_Resources"):
+        for dirpath, _, filenames in os.walk(os.path.join(vault, folder)):
+            notes.extend(os.path.join(dirpath, name) for name in filenames if name.endswith(".md") and name != "_index.md")
+    return notes
+
+def verify(vault: str, markers: set[str]) -> list[str]:
+    """The problems left in the vault once every worker has finished."""
+    problems = []
+    filed = {marker: [] for marker in markers}
+    for note_path in filed_notes(vault):
+        with open(note_path, encoding="utf-8") as f:
+            text = f.read()
+        if not text:
+            problems.append(f"empty placeholder note: {os.path.relpath(note_path, vault)}")
+        for marker in set(_MARKER.findall(text)):
+            filed[marker].append(os.path.relpath(note_path, vault))
+    for marker, notes in sorted(filed.items()):
+        if not notes:
+            problems.append(f"{marker} was not filed")
+        elif len(notes) > 1:
+            problems.append(f"{marker} was filed {len(notes)} times: {', '.join(sorted(notes))}")
+
+    for dirpath, _, filenames in os.walk(os.path.join(vault, "00_Inbox")):
+        for name in filenames:
+            if name != ".lease":
+                problems.append(f"left in the inbox: {os.path.relpath(os.path.join(dirpath, name), vault)}")
+
+    journal_path = os.path.join(vault, ".pkm_cache", "route_journal.sqlite3")
+    if os.path.exists(journal_path):
+        with sqlite3.connect(journal_path) as conn:
+            for destination, state in conn.execute("SELECT destination, state FROM moves"):
+                problems.append(f"move left in the journal: {destination} ({state})")
+    return problems
+
+def check_concurrent(vault: str, args, env: dict) -> list[str]:
+    markers = make_vault(vault, args.files, args.seed)
+    problems = wait_for_workers(start_workers(vault, args.processes, env))
+    return problems + verify(vault, markers)
+
+def check_crash(vault: str, args, env: dict) -> list[str]:
+    markers = make_vault(vault, args.files, args.seed)
+    (victim,) = start_workers(vault, 1, env)
+    # Kill the worker once it has filed part of the inbox, so it dies with files claimed and moves in flight
+    deadline = time.monotonic() + 60
+    while len(filed_notes(vault)) < args.files // 4 and victim.poll() is None and time.monotonic() < deadline:
+        time.sleep(0.05)
+    if victim.poll() is not None:
+        return [f"the worker to kill finished first (exit {victim.returncode}); use more --files"]
+    victim.kill()
+    victim.wait()
+    time.sleep(LEASE_EXPIRY_SECONDS + 1)
+    problems = wait_for_workers(start_workers(vault, args.processes, env))
+    return problems + verify(vault, markers)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--files", type=int, default=40)
+    parser.add_argument("--processes", type=int, default=3)
+    parser.add_argument("--rounds", type=int, default=3, help="Times each scenario is run, with a different inbox.")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Seconds per fake LLM call.")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--worker", metavar="VAULT", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker)
+        return
+
+    env = dict(os.environ, PKM_LLM_BACKEND="fake", PKM_FAKE_LLM_LATENCY=str(args.llm_latency))
+    env.pop("PKM_ROOT", None)
+
+    failed = False
+    for name, check in (("concurrent", check_concurrent), ("crash", check_crash)):
+        for round_number in range(1, args.rounds + 1):
+            with tempfile.TemporaryDirectory() as vault:
+                start = time.perf_counter()
+                problems = check(vault, args, env)
+                elapsed = time.perf_counter() - start
+            args.seed += 1
+            if problems:
+                failed = True
+                print(f"FAIL: {name} round {round_number} ({elapsed:.1f} s):")
+                for problem in problems:
+                    print(f"  {problem}")
+            else:
+                print(f"ok: {name} round {round_number}: {args.files} files, {args.processes} processes ({elapsed:.1f} s)")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
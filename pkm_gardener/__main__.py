@@ -0,0 +1,4 @@
+from pkm_gardener.main import main
+
+if __name__ == "__main__":
+    main()
@@ -3,12 +3,15 @@ import os
 # --- Paths ---
 def find_pkm_root():
     """
-    Finds the root of the PKM vault by searching upwards from the current directory
-    for a `.obsidian` folder.
+    Finds the root of the PKM vault: the `PKM_ROOT` environment variable if set, otherwise
+    the first folder containing `.obsidian`, searching upwards from the current directory.
+    Each step is a single stat, so this stays cheap even next to very large folders.
     """
+    if os.getenv("PKM_ROOT"):
+        return os.path.abspath(os.environ["PKM_ROOT"])
     current_dir = os.getcwd()
     while True:
-        if ".obsidian" in os.listdir(current_dir):
+        if os.path.isdir(os.path.join(current_dir, ".obsidian")):
             return current_dir
         parent_dir = os.path.dirname(current_dir)
         if parent_dir == current_dir:
@@ -16,7 +19,9 @@ def find_pkm_root():
             raise FileNotFoundError("Could not find PKM root. No '.obsidian' directory found in any parent folder.")
         current_dir = parent_dir
 
-MAX_DOCUMENT_SIZE_FOR_PROCESSING = 1000
+# Documents bigger than this are described by name and size instead of being read.
+# Long content is no longer discarded: it is chunked and summarized (see MAX_CONTENT_TOKENS).
+MAX_DOCUMENT_SIZE_FOR_PROCESSING = 50 * 1024 * 1024
 PKM_ROOT = find_pkm_root()
 INBOX_PATH = os.path.join(PKM_ROOT, "00_Inbox")
 RESOURCES_PATH = os.path.join(PKM_ROOT, "03_Resources")
@@ -35,10 +40,174 @@ if not GEMINI_API_KEY:
     except (ImportError, AttributeError):
         pass # Will be handled below
 
-if not GEMINI_API_KEY:
-    raise ValueError("GEMINI_API_KEY is not set. Please set it as an environment variable or in `pkm_gardener/api.py`.")
+# A missing key is reported when the Gemini backend is created (see `utils/llm_client.py`).
 
 GEMINI_MODEL_NAME = "gemini-pro"
 
+# --- LLM Client Settings ---
+LLM_BACKEND = os.getenv("PKM_LLM_BACKEND", "gemini") # "gemini", or "fake" for a deterministic offline model
+FAKE_LLM_LATENCY = float(os.getenv("PKM_FAKE_LLM_LATENCY", "0")) # Simulated seconds per fake LLM call
+FAKE_LLM_LATENCY_PER_1K_TOKENS = float(os.getenv("PKM_FAKE_LLM_LATENCY_PER_1K_TOKENS", "0")) # Plus this per 1,000 prompt tokens
+LLM_REQUESTS_PER_MINUTE = 60
+LLM_TOKENS_PER_MINUTE = 1_000_000
+LLM_REQUEST_TIMEOUT = 60.0 # Seconds per call
+LLM_MAX_RETRIES = 4 # Retries on rate limits, timeouts and server errors
+LLM_RETRY_BASE_DELAY = 1.0 # Backoff before the first retry; doubles each attempt (with jitter)
+LLM_RETRY_MAX_DELAY = 30.0
+
 # --- Processing Settings ---
 DRY_RUN = False # Set to True to simulate file operations without actually moving/modifying files
+
+# --- Concurrency Settings ---
+# When enabled, jobs flow through a staged pipeline (ingest -> extract -> LLM -> index/route)
+# with a bounded pool of worker threads per stage. Set to False to process jobs one at a time.
+PIPELINE_CONCURRENT = True
+EXTRACT_WORKERS = 4 # Text/vision/document extraction
+LLM_WORKERS = 8 # Concurrent Gemini requests
+ROUTE_WORKERS = 2 # Index + route; writes into the same folder are always serialized
+STAGE_QUEUE_SIZE = 32 # Max jobs waiting between two stages
+
+# --- PDF Extraction Settings ---
+# "full" extracts every page; "sample" extracts only the first/last pages plus a few evenly
+# spaced ones, which is enough for classification-only runs on very long PDFs.
+PDF_EXTRACTION_MODE = "full"
+PDF_WORKERS = os.cpu_count() or 1 # Processes extracting page ranges in parallel
+PDF_PARALLEL_MIN_PAGES = 32 # Smaller PDFs are extracted in-process
+PDF_SAMPLE_HEAD_PAGES = 5
+PDF_SAMPLE_TAIL_PAGES = 2
+PDF_SAMPLE_SPREAD_PAGES = 8
+
+# --- Image Settings ---
+# Images are auto-oriented, downscaled and re-encoded in a process pool before they are sent to
+# the vision model. Descriptions are cached by perceptual hash, so an image that only differs
+# from one already described by re-compression or resizing is not described again.
+IMAGE_MAX_DIMENSION = 1536 # Longest side, in pixels, of the image sent to the model
+IMAGE_FORMAT = "WEBP" # Or "JPEG"
+IMAGE_QUALITY = 80
+IMAGE_WORKERS = min(4, os.cpu_count() or 1)
+IMAGE_HASH_MAX_DISTANCE = 4 # Max differing bits (of 64) for two images to count as the same
+IMAGE_CACHE_MAX_ENTRIES = 10000
+
+# --- CSV Profiling Settings ---
+# CSV files are streamed in chunks of rows and summarized with per-column statistics and
+# a random sample of rows, in bounded memory.
+CSV_CHUNK_ROWS = 1000 # Small chunks stay cache-friendly and keep garbage collection cheap
+CSV_SAMPLE_ROWS = 5 # Rows shown to the LLM, sampled uniformly from the whole file
+CSV_MAX_DISTINCT = 1000 # Distinct values counted per column before reporting "1000+"
+CSV_PROFILE_MAX_ROWS = 5000000 # Rows past this are only line-counted; None profiles every row
+CSV_SNIFF_BYTES = 16 * 1024 # Text read to guess the delimiter and header
+
+# --- Chunking Settings ---
+# Content estimated above MAX_CONTENT_TOKENS is split into chunks of CHUNK_TOKENS on page,
+# heading and paragraph boundaries; the chunks are summarized concurrently and the joined
+# summaries are sent in the metadata request instead.
+MAX_CONTENT_TOKENS = 8000
+CHUNK_TOKENS = 4000
+CHUNK_SUMMARY_WORKERS = 4
+
+# --- Prompt Settings ---
+# Content is normalized before it is sent (markup, link targets, navigation menus, cookie and
+# share banners and repeated whitespace removed), then cut to its key passages past
+# PROMPT_CONTENT_TOKENS. Content past MAX_CONTENT_TOKENS is summarized by chunks first.
+PROMPT_NORMALIZE_CONTENT = True
+PROMPT_CONTENT_TOKENS = 3000
+
+# --- LLM Batching Settings ---
+# In the concurrent pipeline, small documents are packed into a single LLM request.
+LLM_BATCHING_ENABLED = True
+LLM_BATCH_MAX_DOC_CHARS = 2000 # Documents longer than this are always sent on their own
+LLM_BATCH_CHAR_BUDGET = 12000 # Max characters of content per batched request
+LLM_BATCH_MAX_DOCS = 8 # Max documents per batched request
+LLM_BATCH_WAIT_SECONDS = 0.5 # Send a partial batch once no new job has arrived for this long
+
+# --- Ingestion Settings ---
+SNIFF_HEADER_BYTES = 4096 # Bytes read from each inbox file to detect its type
+# Upper bound on the size of the inbox files in flight at once in the concurrent pipeline.
+# A single file larger than the budget is still processed, but on its own.
+MAX_RESIDENT_BYTES = 256 * 1024 * 1024
+
+# --- Frontmatter Settings ---
+FRONTMATTER_MAX_BYTES = 64 * 1024 # Longer frontmatter blocks are ignored by header-only reads
+FRONTMATTER_READ_WORKERS = 8 # Threads reading note headers in bulk
+
+# --- Inbox Leasing Settings ---
+# Several gardener processes (or hosts syncing the vault) can share one inbox: each claims files
+# by renaming them into its own 00_Inbox/.processing/<worker>/ directory, kept alive by a heartbeat.
+# Files of a worker whose heartbeat stopped are returned to the inbox; failed files go to 00_Inbox/_failed/.
+LEASE_HEARTBEAT_SECONDS = 30
+LEASE_EXPIRY_SECONDS = 300 # Keep well above the heartbeat, allowing for clock skew between hosts
+
+# --- Watch Mode Settings ---
+WATCH_POLL_INTERVAL = 2.0 # Seconds between inbox scans
+WATCH_SETTLE_SECONDS = 3.0 # A file must keep the same size and mtime this long before it is processed
+
+# --- Deduplication Settings ---
+# Inbox files that duplicate a note already in the vault, exactly or nearly (estimated with
+# MinHash over word shingles and found with LSH banding), never reach the LLM.
+DEDUPE_ENABLED = True
+DEDUPE_ACTION = "skip" # "skip" (leave in the inbox), "link" (file next to the original) or "merge" (fold into the original)
+DEDUPE_FILE_TYPES = ("text", "csv")
+DEDUPE_NEAR_THRESHOLD = 0.8 # Minimum estimated Jaccard similarity of word shingles
+DEDUPE_SHINGLE_SIZE = 5 # Words per shingle
+DEDUPE_NUM_PERMUTATIONS = 128
+DEDUPE_BANDS = 16 # LSH bands; must divide DEDUPE_NUM_PERMUTATIONS
+DEDUPE_WORKERS = 2
+
+# --- Folder Pre-routing Settings ---
+# A local TF-IDF classifier, learned from the notes already in each folder, scores incoming
+# notes against every folder. When confident it picks the folder itself; otherwise only the
+# top-k folders are offered to the LLM.
+FOLDER_PREROUTING_ENABLED = True
+FOLDER_CLASSIFIER_FEATURES = 2 ** 16 # Size of the hashed feature space
+FOLDER_CONFIDENCE_THRESHOLD = 0.35 # Minimum cosine similarity to assign a folder locally
+FOLDER_CONFIDENCE_MARGIN = 0.1 # ...and minimum lead over the second best folder
+FOLDER_MIN_NOTES = 3 # Folders with fewer notes are never assigned locally
+FOLDER_CANDIDATES_TOP_K = 5
+
+# --- Folder Taxonomy Settings ---
+# Destination folders are discovered recursively under the PARA roots; the scan is cached
+# per directory mtime in .pkm_cache/folder_taxonomy.json, so unchanged directories cost one stat.
+FOLDER_TAXONOMY_MAX_DEPTH = 4 # Subfolder levels below each PARA root
+FOLDER_TOP_TAGS = 3 # Tags shown per folder in the prompt
+FOLDER_PROMPT_MAX_FOLDERS = 150 # Larger vaults list only the folders with the most notes
+
+# --- Re-gardening Settings ---
+# `regarden` regenerates the frontmatter of notes already filed in the vault, in place, for the
+# notes whose body, prompt version or model changed since their last pass. Progress is saved
+# after every note, so an interrupted or budget-capped run continues where it stopped.
+REGARDEN_WORKERS = 8 # Notes regenerated concurrently
+REGARDEN_MAX_LLM_REQUESTS = 500 # LLM requests per run (None for no cap); the rest wait for the next run
+REGARDEN_KEEP_KEYS = ("status", "priority") # Curated by hand: existing values are never replaced
+
+# --- Attachment Settings ---
+# Binary files are not rewritten as notes: the original is moved as it is into ATTACHMENTS_PATH
+# (a hard link, or a kernel-side copy across filesystems), and a small stub note with the
+# frontmatter, summary and an ![[embed]] of it is filed in the suggested folder instead.
+ATTACHMENTS_PATH = os.path.join(PKM_ROOT, "Attachments") # Outside the PARA folders, so it is never suggested
+ATTACHMENT_FILE_TYPES = ("image", "pdf", "document") # Files of other types are attachments only if they are not UTF-8 text
+
+# --- Link Graph Settings ---
+# The [[wiki links]] between notes are kept in a graph updated as notes are routed. New notes
+# get "Related notes" (by shared link neighbours and tags) and "Backlinks" sections appended.
+LINK_SECTIONS_ENABLED = True
+RELATED_NOTES_COUNT = 5
+LINK_GRAPH_WORKERS = 8 # Threads reading notes when building the graph from the vault
+
+# --- Search Settings ---
+SEARCH_INDEX_WORKERS = 8 # Threads reading notes when rebuilding the search index
+SEARCH_RESULT_LIMIT = 10
+
+# --- LLM Cache Settings ---
+# Successful LLM suggestions are cached on disk, keyed by content, folder list, model and prompt version.
+CACHE_DIR = os.path.join(PKM_ROOT, ".pkm_cache")
+LLM_CACHE_ENABLED = True # Set to False (or pass --no-cache) to bypass the cache
+LLM_CACHE_MAX_ENTRIES = 10000
+LLM_CACHE_MAX_AGE_DAYS = 30
+
+# --- Tracing Settings ---
+# Per-job stage spans are appended to a JSONL trace, and metrics are written in the Prometheus
+# textfile format (e.g. for node_exporter's textfile collector). Enable with PKM_TRACE=1 or --trace.
+TRACING_ENABLED = os.getenv("PKM_TRACE", "") == "1"
+TRACE_PATH = os.path.join(CACHE_DIR, "trace.jsonl")
+TRACE_MAX_BYTES = 64 * 1024 * 1024 # Rotated to trace.jsonl.1 at the start of a run once larger
+METRICS_PATH = os.path.join(CACHE_DIR, "pkm_gardener.prom")
@@ -0,0 +1,254 @@
+import bz2
+import csv
+import gzip
+import io
+import itertools
+import lzma
+import math
+import random
+import re
+import zipfile
+from contextlib import ExitStack
+from dataclasses import dataclass, field
+
+from pkm_gardener.config import (
+    CSV_CHUNK_ROWS, CSV_SAMPLE_ROWS, CSV_MAX_DISTINCT, CSV_PROFILE_MAX_ROWS, CSV_SNIFF_BYTES,
+)
+
+# Values counted as missing, besides the empty string
+_NULL_VALUES = frozenset({"", "NA", "N/A", "n/a", "NaN", "nan", "null", "NULL", "None", "none", "-"})
+_DATE_PATTERN = re.compile(r'\d{4}-\d{2}-\d{2}(?:[T ]\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?(?:Z|[+-]\d{2}:?\d{2})?)?')
+_MAX_CELL_CHARS = 40
+
+_COMPRESSION_MAGIC = (
+    (b'\x1f\x8b', "gzip"),
+    (b'BZh', "bzip2"),
+    (b'\xfd7zXZ\x00', "xz"),
+    (b'PK\x03\x04', "zip"),
+)
+
+@dataclass
+class ColumnProfile:
+    name: str
+    kind: str | None = None # 'integer', 'float', 'date' or 'text'; None while no value has been seen
+    nulls: int = 0
+    minimum: object = None
+    maximum: object = None
+    example: str | None = None
+    distinct: set | None = field(default_factory=set) # None once more than CSV_MAX_DISTINCT values were seen
+
+@dataclass
+class CsvProfile:
+    columns: list[ColumnProfile]
+    rows: int # Rows profiled
+    estimated_rows: int # Including the rows past CSV_PROFILE_MAX_ROWS, which are only line-counted
+    delimiter: str
+    has_header: bool
+    compression: str | None
+    sample: list[list[str]]
+
+def _widen(kind: str | None, other: str) -> str:
+    """Combines the types of two chunks of the same column."""
+    if kind is None or kind == other:
+        return other
+    if {kind, other} == {"integer", "float"}:
+        return "float"
+    return "text"
+
+def _chunk_kind(values: list[str]) -> tuple[str, object, object]:
+    """Infers the type of a chunk of non-null values, and their range when it is ordered."""
+    for kind, convert in (("integer", int), ("float", float)):
+        try:
+            numbers = list(map(convert, values))
+        except ValueError:
+            continue
+        return kind, min(numbers), max(numbers)
+    if all(map(_DATE_PATTERN.fullmatch, values)):
+        return "date", min(values), max(values)
+    return "text", None, None
+
+def _update_column(column: ColumnProfile, values: tuple[str, ...]):
+    """Folds one chunk of a column's values into its profile."""
+    if _NULL_VALUES.isdisjoint(values):
+        present = values
+    else:
+        present = [value for value in values if value not in _NULL_VALUES]
+    column.nulls += len(values) - len(present)
+    if not present:
+        return
+    if column.example is None:
+        column.example = present[0]
+    if column.distinct is not None:
+        column.distinct.update(present)
+        if len(column.distinct) > CSV_MAX_DISTINCT:
+            column.distinct = None
+
+    kind, low, high = _chunk_kind(present)
+    column.kind = _widen(column.kind, kind)
+    if column.kind == "text":
+        column.minimum = column.maximum = None
+    else:
+        # Integer bounds remain valid when a column widens to float
+        column.minimum = low if column.minimum is None else min(column.minimum, low)
+        column.maximum = high if column.maximum is None else max(column.maximum, high)
+
+class _Reservoir:
+    """
+    A uniform random sample of k rows from a stream (Vitter's Algorithm L), which skips
+    ahead between replacements instead of drawing a random number for every row.
+    Seeded, so the same file always yields the same sample (and the same LLM cache key).
+    """
+
+    def __init__(self, k: int, seed: int = 0):
+        self.k = k
+        self.rows = [] # (row number, row)
+        self._random = random.Random(seed)
+        self._weight = math.exp(math.log(self._random.random()) / k) if k else 0.0
+        self._next = k + self._skip()
+
+    def _skip(self) -> int:
+        if not self.k:
+            return math.inf
+        return int(math.log(self._random.random()) / math.log(1 - self._weight))
+
+    def offer(self, start: int, chunk: list[list[str]]):
+        """Considers a chunk of rows whose first row is row number `start`."""
+        for number in range(start, min(start + len(chunk), self.k)):
+            self.rows.append((number, chunk[number - start]))
+        while self._next < start + len(chunk):
+            self.rows[self._random.randrange(self.k)] = (self._next, chunk[self._next - start])
+            self._weight *= math.exp(math.log(self._random.random()) / self.k)
+            self._next += self._skip() + 1
+
+    def sample(self) -> list[list[str]]:
+        return [row for _, row in sorted(self.rows, key=lambda item: item[0])]
+
+def _open_text(source: str | bytes, stack: ExitStack) -> tuple[io.TextIOBase, str | None]:
+    """Opens a CSV file path or raw bytes as text, transparently decompressing it."""
+    raw = stack.enter_context(open(source, 'rb') if isinstance(source, str) else io.BytesIO(source))
+    magic = raw.read(6)
+    raw.seek(0)
+    compression = next((name for prefix, name in _COMPRESSION_MAGIC if magic.startswith(prefix)), None)
+    if compression == "gzip":
+        raw = stack.enter_context(gzip.GzipFile(fileobj=raw))
+    elif compression == "bzip2":
+        raw = stack.enter_context(bz2.BZ2File(raw))
+    elif compression == "xz":
+        raw = stack.enter_context(lzma.LZMAFile(raw))
+    elif compression == "zip":
+        archive = stack.enter_context(zipfile.ZipFile(raw))
+        members = [info for info in archive.infolist() if not info.is_dir()]
+        if not members:
+            raise ValueError("Zip archive contains no files.")
+        raw = stack.enter_context(archive.open(members[0]))
+    return io.TextIOWrapper(raw, encoding='utf-8', errors='replace', newline=''), compression
+
+def _sniff(sample: str, default_delimiter: str) -> tuple[str, bool]:
+    """Guesses the delimiter and whether the first row is a header."""
+    sniffer = csv.Sniffer()
+    try:
+        delimiter = sniffer.sniff(sample, delimiters=",\t;|").delimiter
+    except csv.Error:
+        delimiter = default_delimiter
+    try:
+        has_header = sniffer.has_header(sample)
+    except csv.Error:
+        has_header = True
+    return delimiter, has_header
+
+def profile_csv(source: str | bytes, name: str = "") -> CsvProfile:
+    """
+    Profiles a CSV or TSV file (a path or raw bytes, optionally gzip, bzip2, xz or zip
+    compressed) in a single streaming pass over chunks of rows, in bounded memory.
+    Past CSV_PROFILE_MAX_ROWS rows, the rest of the file is only line-counted.
+    """
+    name = name or (source if isinstance(source, str) else "")
+    default_delimiter = "\t" if ".tsv" in name.lower() else ","
+
+    with ExitStack() as stack:
+        stream, compression = _open_text(source, stack)
+        sample_lines, sample_size = [], 0
+        for line in stream:
+            sample_lines.append(line)
+            sample_size += len(line)
+            if sample_size >= CSV_SNIFF_BYTES:
+                break
+        delimiter, has_header = _sniff("".join(sample_lines), default_delimiter)
+
+        reader = csv.reader(itertools.chain(sample_lines, stream), delimiter=delimiter)
+        first_row = next(reader, [])
+        if has_header:
+            columns = [ColumnProfile(column_name.strip() or f"column_{i}") for i, column_name in enumerate(first_row, start=1)]
+            pending = []
+        else:
+            columns = [ColumnProfile(f"column_{i}") for i in range(1, len(first_row) + 1)]
+            pending = [first_row] if first_row else []
+
+        reservoir = _Reservoir(CSV_SAMPLE_ROWS)
+        rows = 0
+        width = len(columns)
+        limit = CSV_PROFILE_MAX_ROWS or math.inf
+        while rows < limit:
+            chunk = pending + list(itertools.islice(reader, int(min(CSV_CHUNK_ROWS, limit - rows))))
+            pending = []
+            if not chunk:
+                break
+            if set(map(len, chunk)) != {width}:
+                # Ragged rows: pad or trim to the header's width so columns stay aligned
+                chunk = [(row + [""] * (width - len(row)))[:width] for row in chunk]
+            reservoir.offer(rows, chunk)
+            for column, values in zip(columns, zip(*chunk)):
+                _update_column(column, values)
+            rows += len(chunk)
+
+        estimated_rows = rows
+        if rows >= limit:
+            # Fast line count for the remainder; rows with quoted newlines make this an estimate
+            for block in iter(lambda: stream.read(1 << 20), ""):
+                estimated_rows += block.count("\n")
+
+    return CsvProfile(columns, rows, estimated_rows, delimiter, has_header, compression, reservoir.sample())
+
+def _cell(value: str) -> str:
+    value = " ".join(value.split())
+    return value if len(value) <= _MAX_CELL_CHARS else value[:_MAX_CELL_CHARS - 3] + "..."
+
+def _describe_column(column: ColumnProfile, rows: int) -> str:
+    parts = [column.kind or "empty"]
+    if rows:
+        parts.append(f"{column.nulls / rows:.0%} null")
+    parts.append(f"{CSV_MAX_DISTINCT}+ distinct" if column.distinct is None else f"{len(column.distinct)} distinct")
+    if column.minimum is not None:
+        parts.append(f"range {column.minimum} to {column.maximum}")
+    elif column.example is not None:
+        parts.append(f'e.g. "{_cell(column.example)}"')
+    return f"- {column.name}: {', '.join(parts)}"
+
+def format_profile(profile: CsvProfile) -> str:
+    """Renders a profile as the compact text given to the LLM. Its length does not grow with the file."""
+    delimiter = "tab" if profile.delimiter == "\t" else f"'{profile.delimiter}'"
+    details = [f"delimiter {delimiter}"]
+    if profile.compression:
+        details.append(f"{profile.compression}-compressed")
+    if not profile.has_header:
+        details.append("no header row")
+    row_count = f"{profile.rows}" if profile.estimated_rows == profile.rows else f"about {profile.estimated_rows}"
+
+    lines = [f"CSV file with {row_count} rows and {len(profile.columns)} columns ({', '.join(details)})."]
+    if profile.estimated_rows != profile.rows:
+        lines.append(f"Statistics cover the first {profile.rows} rows.")
+    lines.append("Columns:")
+    lines.extend(_describe_column(column, profile.rows) for column in profile.columns)
+    if profile.sample:
+        lines.append(f"Sample rows ({len(profile.sample)}, chosen at random):")
+        output = io.StringIO()
+        writer = csv.writer(output, delimiter=profile.delimiter, lineterminator="\n")
+        if profile.has_header:
+            writer.writerow(column.name for column in profile.columns)
+        writer.writerows([_cell(value) for value in row] for row in profile.sample)
+        lines.append(output.getvalue().rstrip("\n"))
+    return "\n".join(lines)
+
+def summarize_csv(source: str | bytes, name: str = "") -> str:
+    """Profiles a CSV file and returns the summary given to the LLM."""
+    return format_profile(profile_csv(source, name))
@@ -0,0 +1,123 @@
+import os
+import re
+import threading
+
+from pkm_gardener.config import PKM_ROOT, DRY_RUN, DEDUPE_ACTION, DEDUPE_FILE_TYPES
+from pkm_gardener.core_modules import indexer, router
+from pkm_gardener.core_modules.duplicate_index import (
+    DuplicateIndex, DuplicateMatch, duplicate_index, normalized_body, rebuild_duplicate_index,
+)
+from pkm_gardener.core_modules.vault_index import vault_index
+from pkm_gardener.types import ProcessingJob
+from pkm_gardener.utils.filename import write_file_atomic
+from pkm_gardener.utils.frontmatter import read_frontmatter, split_frontmatter
+
+class DuplicateChecker:
+    """
+    Finds duplicates of inbox files among the notes in the vault and among the files already
+    seen in the same run, which have not been routed yet and so are not in the vault index.
+    """
+
+    def __init__(self):
+        if duplicate_index.is_empty():
+            rebuild_duplicate_index()
+        self._in_flight = DuplicateIndex(":memory:")
+        self._in_flight_lock = threading.Lock()
+
+    def check(self, job: ProcessingJob) -> DuplicateMatch | None:
+        if job.file_type not in DEDUPE_FILE_TYPES:
+            return None
+        body = normalized_body(job.content_text(errors='replace'))
+        if not body:
+            return None
+
+        for match in duplicate_index.find(body):
+            if os.path.exists(os.path.join(PKM_ROOT, match.path)):
+                return match
+            duplicate_index.remove(match.path) # The note was deleted from the vault since
+
+        # Checking and registering under one lock keeps two copies in the same run from both passing
+        with self._in_flight_lock:
+            matches = self._in_flight.find(body)
+            if matches:
+                matches[0].in_vault = False
+                return matches[0]
+            self._in_flight.add(os.path.relpath(job.original_filepath, PKM_ROOT), body)
+        return None
+
+def _new_paragraphs(existing_text: str, new_text: str) -> list[str]:
+    """
+    The parts of `new_text` missing from `existing_text`, compared whitespace-insensitively:
+    whole paragraphs when they are new, otherwise just their new sentences.
+    """
+    existing = " ".join(split_frontmatter(existing_text)[1].split())
+    additions = []
+    for paragraph in re.split(r'\n\s*\n', split_frontmatter(new_text)[1]):
+        paragraph = " ".join(paragraph.split())
+        if not paragraph or paragraph in existing:
+            continue
+        sentences = re.split(r'(?<=[.!?])\s+', paragraph)
+        missing = [sentence for sentence in sentences if sentence not in existing]
+        additions.append(paragraph if len(missing) == len(sentences) else " ".join(missing))
+    return additions
+
+def _link(job: ProcessingJob, note_path: str):
+    """Files the copy next to the existing note, reusing its metadata instead of asking the LLM."""
+    record = vault_index.get(os.path.relpath(note_path, PKM_ROOT))
+    metadata = read_frontmatter(note_path)
+    name = os.path.splitext(os.path.basename(note_path))[0]
+    metadata['duplicate_of'] = f"[[{name}]]"
+    job.metadata = metadata
+    job.suggested_filename = os.path.basename(note_path)
+    job.suggested_folder_path = os.path.dirname(note_path)
+    job.summary = record.summary if record else str(metadata.get('summary') or "")
+    job.status = "success"
+    router.file_note(job)
+    if job.status == "success":
+        indexer.update_index(job)
+
+def _merge(job: ProcessingJob, note_path: str, exact: bool):
+    """Appends the copy's new paragraphs to the existing note and removes the copy from the inbox."""
+    if not exact:
+        with open(note_path, 'r', encoding='utf-8', errors='ignore') as f:
+            existing_text = f.read()
+        additions = _new_paragraphs(existing_text, job.content_text(errors='replace'))
+        if additions:
+            print(f"Action: Merging {len(additions)} new paragraph(s) from '{job.original_filename}' into '{note_path}'")
+            if DRY_RUN:
+                print("[DRY RUN] No file operations performed.")
+                return
+            write_file_atomic(note_path, existing_text.rstrip('\n') + "\n\n" + "\n\n".join(additions) + "\n")
+            record = vault_index.get(os.path.relpath(note_path, PKM_ROOT))
+            job.final_filepath = note_path
+            job.summary = record.summary if record else ""
+            indexer.update_index(job)
+    if DRY_RUN:
+        print(f"[DRY RUN] Would remove duplicate '{job.original_filename}' from the inbox.")
+        return
+    os.remove(job.original_filepath)
+
+def resolve_duplicate(job: ProcessingJob, match: DuplicateMatch, lock_for_folder) -> ProcessingJob:
+    """
+    Applies DEDUPE_ACTION to a duplicate job, without calling the LLM:
+    "skip" leaves the file in the inbox, "link" files it next to the existing note with a
+    `duplicate_of` link, and "merge" folds its new paragraphs into the existing note.
+    Duplicates of files from the same run are always skipped, as there is no note to link to yet.
+    `lock_for_folder` returns the lock that serializes writes into a folder.
+    """
+    kind = "exact copy" if match.exact else f"{match.similarity:.0%} similar"
+    job.error_message = f"Duplicate of {match.path} ({kind})"
+    print(f"Duplicate: '{job.original_filename}' matches '{match.path}' ({kind})")
+
+    note_path = os.path.join(PKM_ROOT, match.path)
+    if DEDUPE_ACTION != "skip" and match.in_vault:
+        with lock_for_folder(os.path.dirname(note_path)):
+            if DEDUPE_ACTION == "link":
+                _link(job, note_path)
+            elif DEDUPE_ACTION == "merge":
+                _merge(job, note_path, match.exact)
+        if job.status == "failure":
+            return job
+
+    job.status = "duplicate"
+    return job
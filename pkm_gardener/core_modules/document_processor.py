@@ -1,53 +1,42 @@
-import os
-import pandas as pd
-import io
-
 from pkm_gardener.types import ProcessingJob
-from pkm_gardener.utils.llm import get_llm_suggestions
-from pkm_gardener.utils.frontmatter import validate_and_normalize_metadata
-from pkm_gardener.config import PKM_ROOT
+from pkm_gardener.core_modules.suggester import apply_suggestions
+from pkm_gardener.core_modules.csv_profiler import summarize_csv
 from pkm_gardener.config import MAX_DOCUMENT_SIZE_FOR_PROCESSING
 
-def get_csv_summary(csv_bytes: bytes) -> str:
+# Share of undecodable characters above which a document is treated as binary
+BINARY_REPLACEMENT_RATIO = 0.1
+
+def get_csv_summary(csv_source: str | bytes, name: str = "") -> str:
+    """
+    Generates a summary of a CSV file (a file path or raw bytes): row count, per-column
+    type, null share, cardinality and range, and a few sampled rows. The file is streamed,
+    so memory use and the summary's length stay the same however large the file is.
+    """
+    return summarize_csv(csv_source, name)
+
+def extract(job: ProcessingJob) -> str:
     """
-    Generates a summary of a CSV file.
+    Extracts the text to send to the LLM from a document file (e.g., CSV).
     """
-    df = pd.read_csv(io.BytesIO(csv_bytes))
-    summary = f"CSV file with {df.shape[0]} rows and {df.shape[1]} columns. "
-    summary += f"Columns: {', '.join(df.columns)}. "
-    summary += f"First 5 rows:\n{df.head().to_string()}"
-    return summary
+    if job.file_type == "csv":
+        return get_csv_summary(job.content_source(), job.original_filename)
+    description = f"Document '{job.original_filename}' of type {job.file_type} ({job.content_size} bytes)."
+    # For other document types, use the full text; long text is chunked and summarized by the LLM utility
+    if job.content_size >= MAX_DOCUMENT_SIZE_FOR_PROCESSING: # Simple size check
+        return description
+    text = job.content_text(errors='replace')
+    if text.count('\ufffd') > len(text) * BINARY_REPLACEMENT_RATIO:
+        # Mostly undecodable: a binary format we cannot read as text
+        return description
+    return text
 
 def process(job: ProcessingJob, destination_folders_relative: list) -> ProcessingJob:
     """
     Processes a document file (e.g., CSV).
     """
-    content_for_llm = ""
     try:
-        if job.file_type == "csv":
-            content_for_llm = get_csv_summary(job.content)
-        else:
-            # For other document types, just use the raw content if it's not too large
-            if len(job.content) < MAX_DOCUMENT_SIZE_FOR_PROCESSING: # Simple size check
-                content_for_llm = job.content.decode('utf-8', errors='ignore')
-            else:
-                content_for_llm = f"Document of type {job.file_type} is too large to process."
-
-        (
-            parsed_metadata,
-            title,
-            suggested_filename,
-            suggested_folder_relative,
-            summary,
-        ) = get_llm_suggestions(content_for_llm, destination_folders_relative)
-
-        job.metadata = validate_and_normalize_metadata(parsed_metadata)
-        job.metadata['title'] = title
-
-        job.suggested_filename = suggested_filename
-        job.suggested_folder_path = os.path.join(PKM_ROOT, suggested_folder_relative)
-        job.summary = summary
-        job.status = "success"
+        content_for_llm = extract(job)
+        apply_suggestions(job, content_for_llm, destination_folders_relative)
 
     except Exception as e:
         job.status = "failure"
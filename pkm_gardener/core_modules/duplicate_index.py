@@ -0,0 +1,193 @@
+import functools
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+from pkm_gardener.config import (
+    PKM_ROOT, CACHE_DIR, DEDUPE_SHINGLE_SIZE, DEDUPE_NUM_PERMUTATIONS, DEDUPE_BANDS, DEDUPE_NEAR_THRESHOLD,
+)
+from pkm_gardener.core_modules.link_graph import strip_link_sections
+from pkm_gardener.core_modules.vault_index import iter_vault_notes
+from pkm_gardener.utils.frontmatter import split_frontmatter
+
+if TYPE_CHECKING:
+    import numpy as np
+
+_TOKEN = re.compile(r'\w+', re.UNICODE)
+_SHINGLE_BLOCK = 4096 # Shingles hashed at once, bounding memory for very long documents
+
+# Universal hashing (a * x + b) mod p over 32-bit shingle hashes. p is the smallest prime
+# above 2**32, so with a, b < 2**32 every intermediate value fits in an unsigned 64-bit int.
+_PRIME = 4294967311
+
+@dataclass
+class DuplicateMatch:
+    path: str # The matching note, relative to PKM_ROOT (or an inbox path for in-run duplicates)
+    similarity: float # Estimated Jaccard similarity; 1.0 for exact duplicates
+    exact: bool
+    in_vault: bool = True # False when the match is another inbox file from the same run
+
+def normalized_body(text: str) -> str:
+    """
+    The part of a note that is compared: its body without frontmatter or generated link
+    sections, whitespace-collapsed.
+    """
+    return " ".join(strip_link_sections(split_frontmatter(text)[1]).split())
+
+def exact_hash(body: str) -> str:
+    return hashlib.sha256(body.encode('utf-8', errors='ignore')).hexdigest()
+
+@functools.cache
+def _permutations() -> tuple["np.ndarray", "np.ndarray"]:
+    """The (a, b) coefficients of the hash permutations. numpy is only imported once they are needed."""
+    import numpy as np
+    rng = np.random.default_rng(0x5EED) # Fixed seed: signatures must be comparable across runs
+    return (rng.integers(1, 2 ** 32, size=DEDUPE_NUM_PERMUTATIONS, dtype=np.uint64),
+            rng.integers(0, 2 ** 32, size=DEDUPE_NUM_PERMUTATIONS, dtype=np.uint64))
+
+def minhash_signature(body: str) -> "np.ndarray":
+    """
+    Computes the MinHash signature of the body's word shingles: for every permutation,
+    the minimum permuted hash over all shingles.
+    """
+    import numpy as np
+    perm_a, perm_b = _permutations()
+    tokens = _TOKEN.findall(body.lower())
+    size = DEDUPE_SHINGLE_SIZE
+    shingles = {" ".join(tokens[i:i + size]) for i in range(max(1, len(tokens) - size + 1))}
+    hashes = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(s.encode('utf-8'), digest_size=4).digest(), 'little') for s in shingles),
+        dtype=np.uint64, count=len(shingles),
+    )
+    signature = np.full(DEDUPE_NUM_PERMUTATIONS, np.iinfo(np.uint32).max, dtype=np.uint64)
+    for start in range(0, len(hashes), _SHINGLE_BLOCK):
+        block = hashes[start:start + _SHINGLE_BLOCK, None]
+        permuted = (block * perm_a + perm_b) % np.uint64(_PRIME)
+        np.minimum(signature, permuted.min(axis=0), out=signature)
+    return signature.astype(np.uint32)
+
+def band_keys(signature: "np.ndarray") -> list[str]:
+    """Splits a signature into LSH bands; notes sharing any band key are candidate duplicates."""
+    rows = len(signature) // DEDUPE_BANDS
+    return [
+        f"{band}:{hashlib.blake2b(signature[band * rows:(band + 1) * rows].tobytes(), digest_size=8).hexdigest()}"
+        for band in range(DEDUPE_BANDS)
+    ]
+
+class DuplicateIndex:
+    """
+    Exact body hashes and MinHash signatures of notes, stored in SQLite with an LSH band
+    table, so a lookup only compares signatures of notes that share at least one band.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            if self.db_path != ":memory:":
+                os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._conn.executescript(
+                "CREATE TABLE IF NOT EXISTS signatures ("
+                " path TEXT PRIMARY KEY,"
+                " exact_hash TEXT NOT NULL,"
+                " signature BLOB NOT NULL);"
+                "CREATE INDEX IF NOT EXISTS signatures_hash ON signatures (exact_hash);"
+                "CREATE TABLE IF NOT EXISTS bands ("
+                " band_key TEXT NOT NULL,"
+                " path TEXT NOT NULL,"
+                " PRIMARY KEY (band_key, path));"
+                "CREATE INDEX IF NOT EXISTS bands_path ON bands (path);"
+            )
+        return self._conn
+
+    def _remove(self, conn: sqlite3.Connection, path: str):
+        conn.execute("DELETE FROM signatures WHERE path = ?", (path,))
+        conn.execute("DELETE FROM bands WHERE path = ?", (path,))
+
+    def _add(self, conn: sqlite3.Connection, path: str, body: str):
+        self._remove(conn, path)
+        signature = minhash_signature(body)
+        conn.execute(
+            "INSERT INTO signatures (path, exact_hash, signature) VALUES (?, ?, ?)",
+            (path, exact_hash(body), signature.tobytes()),
+        )
+        conn.executemany("INSERT OR IGNORE INTO bands (band_key, path) VALUES (?, ?)",
+                         [(key, path) for key in band_keys(signature)])
+
+    def add(self, path: str, body: str):
+        """Adds or replaces a note. `body` must already be normalized."""
+        with self._lock:
+            conn = self._connect()
+            self._add(conn, path, body)
+            conn.commit()
+
+    def remove(self, path: str):
+        with self._lock:
+            conn = self._connect()
+            self._remove(conn, path)
+            conn.commit()
+
+    def is_empty(self) -> bool:
+        with self._lock:
+            return self._connect().execute("SELECT 1 FROM signatures LIMIT 1").fetchone() is None
+
+    def replace_all(self, notes):
+        """Rebuilds the index from (path, normalized body) pairs in a single transaction."""
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM signatures")
+            conn.execute("DELETE FROM bands")
+            for path, body in notes:
+                self._add(conn, path, body)
+            conn.commit()
+
+    def find(self, body: str, threshold: float = DEDUPE_NEAR_THRESHOLD) -> list[DuplicateMatch]:
+        """Returns the indexed notes that duplicate `body`, exact matches first, then most similar first."""
+        import numpy as np
+        body_hash = exact_hash(body)
+        signature = minhash_signature(body)
+        keys = band_keys(signature)
+        with self._lock:
+            conn = self._connect()
+            exact_paths = [row[0] for row in conn.execute(
+                "SELECT path FROM signatures WHERE exact_hash = ? ORDER BY path", (body_hash,))]
+            placeholders = ", ".join("?" * len(keys))
+            candidates = conn.execute(
+                f"SELECT path, signature FROM signatures WHERE path IN"
+                f" (SELECT DISTINCT path FROM bands WHERE band_key IN ({placeholders}))",
+                keys,
+            ).fetchall()
+
+        matches = [DuplicateMatch(path, 1.0, True) for path in exact_paths]
+        near = []
+        for path, blob in candidates:
+            if path in exact_paths:
+                continue
+            similarity = float(np.mean(np.frombuffer(blob, dtype=np.uint32) == signature))
+            if similarity >= threshold:
+                near.append(DuplicateMatch(path, similarity, False))
+        return matches + sorted(near, key=lambda match: match.similarity, reverse=True)
+
+duplicate_index = DuplicateIndex(os.path.join(CACHE_DIR, "duplicate_index.sqlite3"))
+
+def _read_normalized(note_path: str) -> tuple[str, str]:
+    with open(note_path, 'r', encoding='utf-8', errors='ignore') as f:
+        return os.path.relpath(note_path, PKM_ROOT), normalized_body(f.read())
+
+def rebuild_duplicate_index() -> int:
+    """Re-signs every note in the vault. Returns the note count."""
+    note_paths = list(iter_vault_notes())
+    duplicate_index.replace_all(_read_normalized(note_path) for note_path in note_paths)
+    return len(note_paths)
+
+def index_note(note_path: str, body: str):
+    """Records a routed note's signature. `body` is the note body as read back from disk, without its link sections."""
+    duplicate_index.add(os.path.relpath(note_path, PKM_ROOT), " ".join(body.split()))
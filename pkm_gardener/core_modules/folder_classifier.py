@@ -0,0 +1,173 @@
+import os
+import re
+import threading
+import zlib
+from typing import TYPE_CHECKING
+
+from pkm_gardener.config import (
+    CACHE_DIR, FOLDER_CLASSIFIER_FEATURES, FOLDER_CONFIDENCE_THRESHOLD, FOLDER_CONFIDENCE_MARGIN,
+    FOLDER_MIN_NOTES, FOLDER_CANDIDATES_TOP_K,
+)
+from pkm_gardener.core_modules.link_graph import strip_link_sections
+from pkm_gardener.core_modules.vault_index import iter_vault_notes, read_note
+from pkm_gardener.utils.filename import temp_path_for
+
+if TYPE_CHECKING:
+    import numpy as np
+
+_TOKEN = re.compile(r'\w{2,}', re.UNICODE)
+
+def _features(text: str, dimensions: int) -> "np.ndarray":
+    """
+    Hashes the text's tokens into a fixed-size vector of log-scaled term frequencies,
+    L2-normalized. crc32 is used because Python's built-in hash is randomized per process.
+    """
+    import numpy as np
+    tokens = _TOKEN.findall(text.lower())
+    if not tokens:
+        return np.zeros(dimensions, dtype=np.float32)
+    indices = np.fromiter((zlib.crc32(token.encode('utf-8')) % dimensions for token in tokens), dtype=np.int64, count=len(tokens))
+    vector = np.log1p(np.bincount(indices, minlength=dimensions).astype(np.float32))
+    return vector / np.linalg.norm(vector)
+
+class FolderClassifier:
+    """
+    A local TF-IDF nearest-centroid classifier over the vault's folders. Each folder keeps the
+    sum of its notes' hashed feature vectors; an incoming note is scored by cosine similarity
+    against every folder centroid, with IDF weights taken from the whole vault.
+    The model (and numpy) is only loaded when a note is first ranked or added.
+    """
+
+    def __init__(self, model_path: str, dimensions: int = FOLDER_CLASSIFIER_FEATURES):
+        self.model_path = model_path
+        self.dimensions = dimensions
+        self.folders = []
+        self.sums = None
+        self.counts = None
+        self.document_frequency = None
+        self.dirty = False
+        self._loaded = False
+        self._lock = threading.RLock()
+
+    def _reset(self):
+        import numpy as np
+        self.folders = []
+        self.sums = np.zeros((0, self.dimensions), dtype=np.float32)
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.document_frequency = np.zeros(self.dimensions, dtype=np.int64)
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        import numpy as np
+        self._loaded = True
+        if os.path.exists(self.model_path):
+            with np.load(self.model_path, allow_pickle=False) as data:
+                if int(data["dimensions"]) == self.dimensions:
+                    self.folders = [str(folder) for folder in data["folders"]]
+                    self.sums = data["sums"]
+                    self.counts = data["counts"]
+                    self.document_frequency = data["document_frequency"]
+                    return
+        # No usable saved model yet: learn from the notes already in the vault
+        self._fit_vault()
+
+    def _folder_row(self, folder: str) -> int:
+        import numpy as np
+        if folder not in self.folders:
+            self.folders.append(folder)
+            self.sums = np.vstack([self.sums, np.zeros((1, self.dimensions), dtype=np.float32)])
+            self.counts = np.append(self.counts, 0)
+        return self.folders.index(folder)
+
+    def _add(self, folder: str, text: str):
+        vector = _features(text, self.dimensions)
+        row = self._folder_row(folder)
+        self.sums[row] += vector
+        self.counts[row] += 1
+        self.document_frequency += vector > 0
+        self.dirty = True
+
+    def _fit_vault(self):
+        self._reset()
+        for note_path in iter_vault_notes():
+            record, body = read_note(note_path)
+            self._add(record.folder, note_text(record.title, record.tags, strip_link_sections(body)))
+        self.dirty = True
+
+    def rebuild(self):
+        """Re-learns every folder centroid from the notes in the vault and saves the model."""
+        with self._lock:
+            self._loaded = True
+            self._fit_vault()
+            self.save()
+
+    def add_note(self, folder: str, text: str):
+        """Updates the folder's centroid with a newly routed note."""
+        with self._lock:
+            self._ensure_loaded()
+            self._add(folder, text)
+
+    def rank_folders(self, text: str, candidate_folders: list) -> list[tuple[str, float]]:
+        """Scores the candidate folders against the text, best first. Unknown folders score 0."""
+        import numpy as np
+        with self._lock:
+            self._ensure_loaded()
+            scores = dict.fromkeys(candidate_folders, 0.0)
+            if not self.folders:
+                return list(scores.items())
+            total_documents = int(self.counts.sum())
+            idf = np.log((1 + total_documents) / (1 + self.document_frequency)).astype(np.float32) + 1
+            query = _features(text, self.dimensions) * idf
+            query_norm = np.linalg.norm(query)
+            if query_norm == 0:
+                return list(scores.items())
+            centroids = self.sums * idf
+            norms = np.linalg.norm(centroids, axis=1)
+            norms[norms == 0] = 1
+            similarities = centroids @ (query / query_norm) / norms
+            for row, folder in enumerate(self.folders):
+                if folder in scores and self.counts[row] >= FOLDER_MIN_NOTES:
+                    scores[folder] = float(similarities[row])
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+    def save(self):
+        """Persists the model if it changed since it was loaded or last saved."""
+        import numpy as np
+        with self._lock:
+            if not self.dirty:
+                return
+            os.makedirs(os.path.dirname(self.model_path), exist_ok=True)
+            temp_path = temp_path_for(self.model_path, ".npz") # numpy appends ".npz" to names without it
+            np.savez_compressed(
+                temp_path,
+                dimensions=np.int64(self.dimensions),
+                folders=np.array(self.folders, dtype=str),
+                sums=self.sums,
+                counts=self.counts,
+                document_frequency=self.document_frequency,
+            )
+            os.replace(temp_path, self.model_path)
+            self.dirty = False
+
+folder_classifier = FolderClassifier(os.path.join(CACHE_DIR, "folder_classifier.npz"))
+
+def note_text(title: str, tags: list, body: str) -> str:
+    """The text a note is classified on: its title and tags, then its body."""
+    return f"{title}\n{' '.join(str(tag) for tag in tags)}\n{body}"
+
+def preroute(content: str, destination_folders_relative: list) -> tuple[str | None, list]:
+    """
+    Decides the destination folder locally when the classifier is confident.
+    Returns (assigned_folder, candidate_folders): the folder is None when the LLM should
+    choose, and the candidates are the top-k folders to offer it in the prompt.
+    """
+    ranking = folder_classifier.rank_folders(content, destination_folders_relative)
+    if not ranking or ranking[0][1] <= 0:
+        return None, destination_folders_relative
+
+    best_folder, best_score = ranking[0]
+    runner_up_score = ranking[1][1] if len(ranking) > 1 else 0.0
+    if best_score >= FOLDER_CONFIDENCE_THRESHOLD and best_score - runner_up_score >= FOLDER_CONFIDENCE_MARGIN:
+        return best_folder, [best_folder]
+    return None, [folder for folder, _ in ranking[:FOLDER_CANDIDATES_TOP_K]]
@@ -0,0 +1,193 @@
+import json
+import os
+import re
+import threading
+from collections import Counter
+from dataclasses import dataclass, field
+
+from pkm_gardener.config import (
+    PKM_ROOT, CACHE_DIR, RESOURCES_PATH, AREAS_PATH, PROJECTS_PATH,
+    FOLDER_TAXONOMY_MAX_DEPTH, FOLDER_TOP_TAGS, FOLDER_PROMPT_MAX_FOLDERS,
+)
+from pkm_gardener.core_modules.vault_index import INDEX_FILENAME
+from pkm_gardener.utils.filename import temp_path_for
+from pkm_gardener.utils.frontmatter import iter_frontmatter
+
+# Bump when the cached entry layout changes
+_CACHE_VERSION = 2
+
+@dataclass
+class FolderStats:
+    notes: int # Notes directly in the folder
+    top_tags: list[str] = field(default_factory=list) # Most used tags of those notes, most used first
+
+def _is_note(name: str) -> bool:
+    return name.endswith('.md') and name != INDEX_FILENAME and not name.startswith('.')
+
+def _folder_key(folder: str) -> str:
+    """Compares folder paths ignoring case and punctuation, e.g. `AI-ML` and `ai_ml`."""
+    return "/".join(re.sub(r'[^a-z0-9]', '', part.lower()) for part in folder.replace("\\", "/").split("/"))
+
+class FolderTaxonomy:
+    """
+    The tree of destination folders under the PARA roots, discovered recursively with
+    `os.scandir`. Each directory's subfolders, note count and top tags are cached on disk
+    with its mtime, which changes whenever an entry is added, removed or renamed in it, so a
+    re-scan only lists the directories that changed and costs one stat for the others.
+    """
+
+    def __init__(self, cache_path: str, roots: tuple[str, ...] = (RESOURCES_PATH, AREAS_PATH, PROJECTS_PATH)):
+        self.cache_path = cache_path
+        self.roots = roots
+        self._entries = None # Relative folder -> [mtime_ns, subfolder names, note count, top tags (None until read)]
+        self._folders = []
+        self._stats = None
+        self.generation = 0 # Incremented by every scan, which also drops the stats
+        self._lock = threading.Lock()
+
+    def _load(self):
+        self._entries = {}
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+            if cached.get("version") == _CACHE_VERSION:
+                self._entries = cached["entries"]
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+        temp_path = temp_path_for(self.cache_path)
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({"version": _CACHE_VERSION, "entries": self._entries}, f)
+        os.replace(temp_path, self.cache_path)
+
+    def _scan_directory(self, path: str, folder: str, entries: dict) -> bool:
+        """Refreshes the entry of one directory; returns False if it no longer exists."""
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except OSError:
+            return False
+        cached = self._entries.get(folder)
+        if cached is not None and cached[0] == mtime_ns:
+            entries[folder] = cached
+            return True
+        subfolders, notes = [], 0
+        with os.scandir(path) as iterator:
+            for entry in iterator:
+                if entry.name.startswith('.'):
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    subfolders.append(entry.name)
+                elif _is_note(entry.name):
+                    notes += 1
+        entries[folder] = [mtime_ns, sorted(subfolders), notes, None]
+        return True
+
+    def scan(self) -> list[str]:
+        """
+        Re-scans the tree and returns every destination folder relative to PKM_ROOT: each
+        PARA root followed by its subfolders, up to FOLDER_TAXONOMY_MAX_DEPTH levels deep.
+        """
+        with self._lock:
+            if self._entries is None:
+                self._load()
+            entries, folders = {}, []
+            for root in self.roots:
+                pending = [(os.path.relpath(root, PKM_ROOT), 0)]
+                while pending:
+                    folder, depth = pending.pop()
+                    if not self._scan_directory(os.path.join(PKM_ROOT, folder), folder, entries):
+                        continue
+                    folders.append(folder)
+                    if depth < FOLDER_TAXONOMY_MAX_DEPTH:
+                        pending.extend((os.path.join(folder, name), depth + 1) for name in reversed(entries[folder][1]))
+            if entries != self._entries:
+                self._entries = entries
+                self._save()
+            self._folders = folders
+            self._stats = None
+            self.generation += 1
+            return list(folders)
+
+    def folders(self) -> list[str]:
+        """The folders found by the last scan, scanning first if there was none."""
+        with self._lock:
+            if self._entries is not None:
+                return list(self._folders)
+        return self.scan()
+
+    def _read_top_tags(self, folders: list[str]):
+        """
+        Counts the tags of the notes in folders whose top tags are not cached, reading only
+        the notes' frontmatter, on a thread pool, and caches them with the folders' entries.
+        This also counts the notes filed by hand, which the vault index does not know about.
+        """
+        note_folders = {}
+        for folder in folders:
+            try:
+                with os.scandir(os.path.join(PKM_ROOT, folder)) as iterator:
+                    note_folders.update((entry.path, folder) for entry in iterator
+                                        if _is_note(entry.name) and entry.is_file())
+            except OSError:
+                pass # Removed since the scan; the next scan drops it
+        counts = {folder: Counter() for folder in folders}
+        for note_path, metadata in iter_frontmatter(sorted(note_folders)):
+            tags = metadata.get('tags')
+            if isinstance(tags, list):
+                counts[note_folders[note_path]].update(str(tag) for tag in tags)
+        for folder in folders:
+            ranked = sorted(counts[folder].items(), key=lambda item: (-item[1], item[0]))
+            self._entries[folder][3] = [tag for tag, _ in ranked[:FOLDER_TOP_TAGS]]
+        self._save()
+
+    def stats(self) -> dict[str, FolderStats]:
+        """Note count and top tags of every folder found by the last scan."""
+        folders = self.folders()
+        with self._lock:
+            if self._stats is None:
+                unread = [folder for folder in folders if self._entries[folder][3] is None]
+                if unread:
+                    self._read_top_tags(unread)
+                self._stats = {
+                    folder: FolderStats(self._entries[folder][2], self._entries[folder][3])
+                    for folder in folders
+                }
+            return self._stats
+
+    def canonical(self, folder: str) -> str:
+        """
+        Maps a suggested folder onto an existing one that differs only in case or punctuation
+        (e.g. `03_Resources/ai-ml` -> `03_Resources/AI_ML`), so near-miss suggestions reuse the
+        existing folder instead of creating a sibling. Other folders are returned unchanged.
+        """
+        key = _folder_key(folder.strip().strip("/"))
+        for existing in self.folders():
+            if _folder_key(existing) == key:
+                return existing
+        return folder
+
+folder_taxonomy = FolderTaxonomy(os.path.join(CACHE_DIR, "folder_taxonomy.json"))
+
+def describe_folders(folders: list[str]) -> str:
+    """
+    Renders a folder list for the prompt, one folder per line with its note count and top
+    tags, so the LLM can see which folders are established. Past FOLDER_PROMPT_MAX_FOLDERS,
+    only the folders holding the most notes are listed (the PARA roots always are).
+    """
+    stats = folder_taxonomy.stats()
+    if len(folders) > FOLDER_PROMPT_MAX_FOLDERS:
+        roots = {os.path.relpath(root, PKM_ROOT) for root in folder_taxonomy.roots}
+        ranked = sorted(folders, key=lambda folder: (folder not in roots, -(stats[folder].notes if folder in stats else 0)))
+        kept = set(ranked[:FOLDER_PROMPT_MAX_FOLDERS])
+        folders = [folder for folder in folders if folder in kept]
+    lines = []
+    for folder in folders:
+        folder_stats = stats.get(folder)
+        if folder_stats is None or not folder_stats.notes:
+            lines.append(folder)
+        elif folder_stats.top_tags:
+            lines.append(f"{folder} ({folder_stats.notes} notes; {', '.join(folder_stats.top_tags)})")
+        else:
+            lines.append(f"{folder} ({folder_stats.notes} notes)")
+    return "\n".join(lines)
@@ -0,0 +1,198 @@
+import atexit
+import io
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+
+from pkm_gardener.config import (
+    CACHE_DIR, IMAGE_MAX_DIMENSION, IMAGE_FORMAT, IMAGE_QUALITY, IMAGE_WORKERS,
+    IMAGE_HASH_MAX_DISTANCE, IMAGE_CACHE_MAX_ENTRIES,
+)
+from pkm_gardener.utils.tracing import tracer
+
+_MIME_TYPES = {"JPEG": "image/jpeg", "PNG": "image/png", "WEBP": "image/webp"}
+
+@dataclass
+class PreparedImage:
+    """An image ready to send to the vision model, with its perceptual hash."""
+    data: bytes
+    mime_type: str
+    phash: int
+    width: int
+    height: int
+    original_bytes: int
+
+def _dct_matrix(n: int):
+    import numpy as np
+    k = np.arange(n).reshape(-1, 1)
+    return np.cos(np.pi * (2 * np.arange(n) + 1) * k / (2 * n))
+
+def perceptual_hash(image) -> int:
+    """
+    The 64-bit DCT perceptual hash of a Pillow image: the image is reduced to 32x32 grayscale,
+    and each bit says whether one of the 8x8 lowest frequencies is above their median.
+    Re-compressed or resized copies of an image hash to the same or nearly the same bits.
+    """
+    import numpy as np
+    from PIL import Image
+    pixels = np.asarray(image.convert("L").resize((32, 32), Image.Resampling.LANCZOS), dtype=np.float64)
+    matrix = _dct_matrix(32)
+    low = (matrix @ pixels @ matrix.T)[:8, :8].flatten()
+    bits = low > np.median(low[1:]) # The DC term (overall brightness) would skew the median
+    return int("".join("1" if bit else "0" for bit in bits), 2)
+
+def hamming_distance(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+def _prepare(source: str | bytes, max_dimension: int, image_format: str, quality: int) -> PreparedImage:
+    """Orients, downscales, re-encodes and hashes an image. Runs inside the worker processes."""
+    from PIL import Image, ImageOps
+    original_bytes = len(source) if isinstance(source, bytes) else os.path.getsize(source)
+    with Image.open(io.BytesIO(source) if isinstance(source, bytes) else source) as image:
+        original_format = image.format
+        original_size = image.size
+        transposed = image.getexif().get(0x0112, 1) != 1 # EXIF orientation other than "normal"
+        image.draft("RGB", (max_dimension, max_dimension)) # JPEGs decode straight at a reduced scale
+        oriented = ImageOps.exif_transpose(image)
+        oriented.thumbnail((max_dimension, max_dimension), Image.Resampling.LANCZOS)
+        phash = perceptual_hash(oriented)
+
+        has_alpha = oriented.mode in ("RGBA", "LA", "PA") or "transparency" in oriented.info
+        if image_format == "JPEG" or not has_alpha:
+            if has_alpha:
+                background = Image.new("RGB", oriented.size, "white")
+                background.paste(oriented, mask=oriented.convert("RGBA").getchannel("A"))
+                oriented = background
+            elif oriented.mode not in ("RGB", "L"):
+                oriented = oriented.convert("RGB")
+        elif oriented.mode != "RGBA":
+            oriented = oriented.convert("RGBA")
+        buffer = io.BytesIO()
+        oriented.save(buffer, format=image_format, quality=quality)
+        data = buffer.getvalue()
+
+        # An already compact image that needed no changes is sent as it is
+        unchanged = oriented.size == original_size and not transposed
+        if unchanged and original_format in _MIME_TYPES and original_bytes <= len(data):
+            if isinstance(source, str):
+                with open(source, 'rb') as f:
+                    data = f.read()
+            else:
+                data = source
+            image_format = original_format
+        return PreparedImage(data, _MIME_TYPES[image_format], phash, *oriented.size, original_bytes)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def _get_pool():
+    """
+    Returns the shared process pool, starting it on first use. Its workers are spawned, not
+    forked, as the pipeline has threads running by then.
+    """
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor # Pulls in multiprocessing, so only once images are processed
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=IMAGE_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+            atexit.register(_pool.shutdown)
+        return _pool
+
+def prepare_image(source: str | bytes) -> PreparedImage:
+    """
+    Prepares an image (a file path or raw bytes) for the vision model in the process pool,
+    so the Pillow work of one image overlaps the model calls of others.
+    """
+    arguments = (source, IMAGE_MAX_DIMENSION, IMAGE_FORMAT, IMAGE_QUALITY)
+    if IMAGE_WORKERS <= 1:
+        prepared = _prepare(*arguments)
+    else:
+        prepared = _get_pool().submit(_prepare, *arguments).result()
+    tracer.add("image_bytes_read", prepared.original_bytes)
+    tracer.add("image_bytes_sent", len(prepared.data))
+    return prepared
+
+class ImageDescriptionCache:
+    """
+    Vision model descriptions, stored in SQLite and keyed by perceptual hash and model. A
+    lookup returns the description of the closest stored hash within `max_distance` bits.
+    The hashes are scanned in memory: 10,000 entries take about a millisecond.
+    """
+
+    def __init__(self, db_path: str, max_entries: int = IMAGE_CACHE_MAX_ENTRIES, max_distance: int = IMAGE_HASH_MAX_DISTANCE, enabled: bool = True):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.max_distance = max_distance
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._conn = None
+        self._entries = None # (phash, model, description), loaded on first use
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS image_descriptions ("
+                " phash TEXT NOT NULL,"
+                " model TEXT NOT NULL,"
+                " description TEXT NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " PRIMARY KEY (phash, model))"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def _load(self) -> list:
+        if self._entries is None:
+            # Hashes are stored as hex text: SQLite integers are signed 64-bit
+            rows = self._connect().execute("SELECT phash, model, description FROM image_descriptions").fetchall()
+            self._entries = [(int(phash, 16), model, description) for phash, model, description in rows]
+        return self._entries
+
+    def get(self, phash: int, model: str) -> str | None:
+        if not self.enabled:
+            return None
+        with self._lock:
+            best, best_distance = None, self.max_distance + 1
+            for other, other_model, description in self._load():
+                if other_model == model:
+                    distance = hamming_distance(phash, other)
+                    if distance < best_distance:
+                        best, best_distance = description, distance
+        tracer.add("image_cache_hits" if best is not None else "image_cache_misses")
+        return best
+
+    def put(self, phash: int, model: str, description: str):
+        if not self.enabled:
+            return
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO image_descriptions (phash, model, description, created_at) VALUES (?, ?, ?, ?)",
+                (f"{phash:016x}", model, description, time.time()),
+            )
+            (count,) = conn.execute("SELECT COUNT(*) FROM image_descriptions").fetchone()
+            if count > self.max_entries:
+                conn.execute(
+                    "DELETE FROM image_descriptions WHERE rowid IN ("
+                    " SELECT rowid FROM image_descriptions ORDER BY created_at ASC LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+                self._entries = None
+            elif self._entries is not None:
+                self._entries = [entry for entry in self._entries if entry[:2] != (phash, model)]
+                self._entries.append((phash, model, description))
+            conn.commit()
+
+    def clear(self):
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM image_descriptions")
+            conn.commit()
+            self._entries = None
+
+image_cache = ImageDescriptionCache(os.path.join(CACHE_DIR, "image_descriptions.sqlite3"))
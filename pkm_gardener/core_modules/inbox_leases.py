@@ -0,0 +1,184 @@
+import json
+import os
+import threading
+import time
+
+from pkm_gardener.config import INBOX_PATH, DRY_RUN, LEASE_HEARTBEAT_SECONDS, LEASE_EXPIRY_SECONDS
+from pkm_gardener.types import ContentHandle, ProcessingJob
+
+PROCESSING_DIRNAME = ".processing" # Hidden, so inbox scans skip it
+FAILED_DIRNAME = "_failed"
+_LEASE_FILENAME = ".lease"
+
+def _worker_id() -> str:
+    import socket
+    return f"{socket.gethostname()}-{os.getpid()}-{os.urandom(3).hex()}"
+
+def _move_into(path: str, directory: str) -> str:
+    """
+    Moves a file into a directory under a free name (file.md, file-1.md, ...) and returns its
+    new path. The file is hard-linked into place, which fails rather than replace an existing
+    file and never exposes a partial or placeholder file to another worker scanning the inbox.
+    """
+    name, ext = os.path.splitext(os.path.basename(path))
+    destination = os.path.join(directory, name + ext)
+    i = 0
+    while True:
+        try:
+            os.link(path, destination)
+            break
+        except FileExistsError:
+            i += 1
+            destination = os.path.join(directory, f"{name}-{i}{ext}")
+        except OSError:
+            # No hard links on this filesystem: fall back to a checked rename
+            if os.path.exists(destination):
+                i += 1
+                destination = os.path.join(directory, f"{name}-{i}{ext}")
+                continue
+            os.rename(path, destination)
+            return destination
+    os.remove(path)
+    return destination
+
+class InboxLease:
+    """
+    Lets several gardener processes, on one host or on hosts sharing a synced vault, work on
+    the same inbox without processing a file twice. A worker claims a file by renaming it
+    into its own `00_Inbox/.processing/<worker id>/` directory; the rename is atomic, so only
+    one worker can win it. While the worker runs, a heartbeat thread keeps touching the
+    directory's `.lease` file. A directory whose lease has not been touched for
+    LEASE_EXPIRY_SECONDS belongs to a worker that died, and its files go back to the inbox.
+    Once processed, failed files move to `00_Inbox/_failed/` with their error next to them.
+    """
+
+    def __init__(self, inbox_path: str = INBOX_PATH):
+        self.inbox_path = inbox_path
+        self.root = os.path.join(inbox_path, PROCESSING_DIRNAME)
+        self.worker_id = _worker_id()
+        self.directory = os.path.join(self.root, self.worker_id)
+        self._stop = threading.Event()
+        self._heartbeat = None
+
+    def _touch(self):
+        with open(os.path.join(self.directory, _LEASE_FILENAME), 'w', encoding='utf-8') as f:
+            json.dump({"worker": self.worker_id, "pid": os.getpid(), "heartbeat": time.time()}, f)
+
+    def _start(self):
+        """Creates the worker's directory and starts the heartbeat, on the first claim."""
+        os.makedirs(self.directory, exist_ok=True)
+        self._touch()
+
+        def heartbeat():
+            while not self._stop.wait(LEASE_HEARTBEAT_SECONDS):
+                try:
+                    self._touch()
+                except OSError as e:
+                    print(f"Warning: could not renew the inbox lease: {e}")
+
+        self._heartbeat = threading.Thread(target=heartbeat, name="lease-heartbeat", daemon=True)
+        self._heartbeat.start()
+
+    def claim(self, job: ProcessingJob) -> bool:
+        """
+        Moves the job's file into this worker's directory and points the job at it.
+        Returns False if another worker claimed the file first.
+        """
+        if DRY_RUN:
+            return True
+        if self._heartbeat is None:
+            self._start()
+        claimed_path = os.path.join(self.directory, job.original_filename)
+        try:
+            os.rename(job.original_filepath, claimed_path)
+        except FileNotFoundError:
+            return False
+        job.original_filepath = claimed_path
+        if isinstance(job.content, ContentHandle):
+            job.content = ContentHandle(claimed_path, job.content.size)
+        return True
+
+    def release(self, job: ProcessingJob):
+        """
+        Hands back a processed job's file: failed files move to `_failed` with an `.error.txt`
+        next to them, and files still present after any other outcome (e.g. skipped
+        duplicates) go back to the inbox. Routed files were already removed by the router.
+        """
+        if DRY_RUN or os.path.dirname(job.original_filepath) != self.directory:
+            return
+        if not os.path.exists(job.original_filepath):
+            return
+        if job.status == "failure":
+            failed_dir = os.path.join(self.inbox_path, FAILED_DIRNAME)
+            os.makedirs(failed_dir, exist_ok=True)
+            failed_path = _move_into(job.original_filepath, failed_dir)
+            with open(f"{failed_path}.error.txt", 'w', encoding='utf-8') as f:
+                f.write(f"file: {job.original_filename}\n"
+                        f"failed_at: {time.strftime('%Y-%m-%dT%H:%M:%S')}\n"
+                        f"worker: {self.worker_id}\n"
+                        f"error: {job.error_message}\n")
+            print(f"Moved '{job.original_filename}' to {FAILED_DIRNAME}/{os.path.basename(failed_path)}")
+        else:
+            _move_into(job.original_filepath, self.inbox_path)
+
+    def close(self):
+        """Stops the heartbeat and removes the worker's directory, returning any file left in it."""
+        if self._heartbeat is None:
+            return
+        self._stop.set()
+        self._heartbeat.join()
+        if os.path.isdir(self.directory): # Unless another worker took it over after a stall
+            self._return_files(self.directory)
+
+    def _return_files(self, directory: str):
+        for name in os.listdir(directory):
+            if name != _LEASE_FILENAME:
+                _move_into(os.path.join(directory, name), self.inbox_path)
+        lease_path = os.path.join(directory, _LEASE_FILENAME)
+        if os.path.exists(lease_path):
+            os.remove(lease_path)
+        os.rmdir(directory)
+
+    def _is_expired(self, directory: str, now: float) -> bool:
+        try:
+            heartbeat = os.path.getmtime(os.path.join(directory, _LEASE_FILENAME))
+        except FileNotFoundError:
+            try:
+                heartbeat = os.path.getmtime(directory) # Died before its first heartbeat
+            except FileNotFoundError:
+                return False # Already reclaimed or closed
+        return now - heartbeat >= LEASE_EXPIRY_SECONDS
+
+    def is_held(self, path: str) -> bool:
+        """Whether a file is claimed by another worker that is still alive."""
+        directory = os.path.dirname(path)
+        if os.path.dirname(directory) != self.root or directory == self.directory:
+            return False
+        return not self._is_expired(directory, time.time())
+
+    def reclaim_stale(self) -> int:
+        """
+        Returns the files of workers whose lease expired to the inbox. The stale directory is
+        first renamed to a name of this worker's, so two workers never reclaim it both.
+        Returns the number of files reclaimed.
+        """
+        if DRY_RUN or not os.path.isdir(self.root):
+            return 0
+        reclaimed = 0
+        now = time.time()
+        for name in os.listdir(self.root):
+            directory = os.path.join(self.root, name)
+            if directory == self.directory or not os.path.isdir(directory):
+                continue
+            if not self._is_expired(directory, now):
+                continue
+            taken_over = os.path.join(self.root, f"{name}.reclaimed-by-{self.worker_id}")
+            try:
+                os.rename(directory, taken_over)
+            except OSError:
+                continue # Another worker got there first
+            files = [entry for entry in os.listdir(taken_over) if entry != _LEASE_FILENAME]
+            self._return_files(taken_over)
+            reclaimed += len(files)
+            print(f"Reclaimed {len(files)} file(s) from the expired lease of worker {name}")
+        return reclaimed
@@ -0,0 +1,78 @@
+import os
+import sqlite3
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+
+@dataclass
+class FileRecord:
+    path: str
+    size: int
+    mtime_ns: int
+    content_hash: str
+    status: str
+    error_message: Optional[str] = None
+
+
+class InboxState:
+    """
+    A persisted table of the inbox files the gardener has already handled, keyed by path.
+    Used by watch mode to enqueue only new or changed files and to leave failed files
+    alone until they are edited.
+    """
+
+    def __init__(self, db_path: str):
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._conn = sqlite3.connect(db_path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS inbox_state ("
+            " path TEXT PRIMARY KEY,"
+            " size INTEGER NOT NULL,"
+            " mtime_ns INTEGER NOT NULL,"
+            " content_hash TEXT NOT NULL,"
+            " status TEXT NOT NULL,"
+            " error_message TEXT,"
+            " updated_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, path: str) -> FileRecord | None:
+        row = self._conn.execute(
+            "SELECT path, size, mtime_ns, content_hash, status, error_message FROM inbox_state WHERE path = ?",
+            (path,),
+        ).fetchone()
+        return FileRecord(*row) if row else None
+
+    def record(self, record: FileRecord):
+        """Stores the outcome of processing a file."""
+        self._conn.execute(
+            "INSERT OR REPLACE INTO inbox_state"
+            " (path, size, mtime_ns, content_hash, status, error_message, updated_at)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (record.path, record.size, record.mtime_ns, record.content_hash,
+             record.status, record.error_message, time.time()),
+        )
+        self._conn.commit()
+
+    def touch(self, path: str, size: int, mtime_ns: int):
+        """Updates the stat fingerprint of a file whose content turned out to be unchanged."""
+        self._conn.execute(
+            "UPDATE inbox_state SET size = ?, mtime_ns = ?, updated_at = ? WHERE path = ?",
+            (size, mtime_ns, time.time(), path),
+        )
+        self._conn.commit()
+
+    def prune(self, present_paths: set):
+        """
+        Forgets files that are no longer in the inbox, so that a new file dropped
+        under the same name later is treated as new.
+        """
+        stored = [row[0] for row in self._conn.execute("SELECT path FROM inbox_state")]
+        gone = [(path,) for path in stored if path not in present_paths]
+        if gone:
+            self._conn.executemany("DELETE FROM inbox_state WHERE path = ?", gone)
+            self._conn.commit()
+
+    def close(self):
+        self._conn.close()
@@ -1,15 +1,92 @@
-from pkm_gardener.types import ProcessingJob
 import os
 
+from pkm_gardener.types import ProcessingJob
+from pkm_gardener.config import DRY_RUN, ATTACHMENTS_PATH
+from pkm_gardener.core_modules.vault_index import vault_index, read_note
+from pkm_gardener.core_modules.search_index import search_index
+from pkm_gardener.core_modules.folder_classifier import folder_classifier, note_text
+from pkm_gardener.core_modules.duplicate_index import index_note
+from pkm_gardener.core_modules.link_graph import link_graph, strip_link_sections
+from pkm_gardener.utils.filename import remove_if_exists
+from pkm_gardener.core_modules.route_journal import route_journal, roll_back, roll_back_reservation, is_written, RESERVING
+
+def _index_note(note_path: str, summary: str):
+    record, body = read_note(note_path, summary=summary)
+    vault_index.upsert(record)
+    route_journal.mark_dirty(record.folder)
+    # The generated link sections are not the note's content: a copy of the note dropped in the
+    # inbox again must still match it, and their links must not leak into the search text or centroids
+    content = strip_link_sections(body)
+    search_index.update(record, content)
+    index_note(note_path, content)
+    folder_classifier.add_note(record.folder, note_text(record.title, record.tags, content))
+    link_graph.update_note(record.path, body)
+
 def update_index(job: ProcessingJob):
     """
-    Updates a central index file with information about the processed note.
-    For simplicity, this example appends to a markdown file.
+    Records a routed note in the vault, search and duplicate indexes, the folder
+    classifier and the link graph, and marks its folder's `_index.md` for regeneration by `flush_folder_indexes`.
+    Must run after `router.file_note`, once the note's final path is known.
+    """
+    if DRY_RUN or not job.final_filepath:
+        return
+
+    _index_note(job.final_filepath, job.summary or "")
+    route_journal.indexed(job.final_filepath)
+
+def refresh_note(note_path: str, summary: str):
+    """
+    Re-indexes a note whose frontmatter was rewritten in place, with an unchanged body: the
+    vault and search indexes are updated and its folder's `_index.md` marked for regeneration.
     """
-    index_file_path = os.path.join(job.suggested_folder_path, "_index.md") # Example index file
+    if DRY_RUN:
+        return
+    record, body = read_note(note_path, summary=summary)
+    vault_index.upsert(record)
+    route_journal.mark_dirty(record.folder)
+    search_index.update(record, strip_link_sections(body))
 
-    # Ensure the directory exists
-    os.makedirs(os.path.dirname(index_file_path), exist_ok=True)
+def flush_folder_indexes() -> int:
+    """Regenerates the `_index.md` of every folder that received notes since the last flush."""
+    if DRY_RUN:
+        return 0
+    folders = route_journal.dirty_folders()
+    for folder in folders:
+        vault_index.write_folder_index(folder)
+        route_journal.clean(folder)
+    return len(folders)
 
-    with open(index_file_path, 'a', encoding='utf-8') as f:
-        f.write(f"- [[{job.suggested_filename}]] (Priority: {job.metadata.get('priority', 'N/A')}, Type: {job.metadata.get('type', 'N/A')}) - {job.summary}\n")
+def recover_interrupted_moves(in_progress=None) -> int:
+    """
+    Finishes or rolls back the moves a previous run left half-done (see `route_journal`).
+    A note that was completely written is kept, its inbox original removed and the note
+    indexed; an unwritten one has its placeholder removed, leaving the original in the inbox.
+    An attachment is kept once the stub note embedding it is written, and removed otherwise
+    while its original is still in the inbox.
+    `in_progress(source)` tells apart the moves still being made by another live worker,
+    which are left alone. Returns the number of moves recovered.
+    """
+    if DRY_RUN:
+        return 0
+    moves = [move for move in route_journal.pending() if not (in_progress and in_progress(move[1]))]
+    stubbed = {source for destination, source, _, state, _ in moves
+               if os.path.dirname(destination) != ATTACHMENTS_PATH and is_written(destination, state)}
+    for destination, source, summary, state, started_at in moves:
+        if state == RESERVING:
+            roll_back_reservation(destination, started_at)
+            print(f"Recovery: rolled back the interrupted move of '{os.path.basename(source)}'")
+        elif os.path.dirname(destination) == ATTACHMENTS_PATH:
+            roll_back(destination)
+            if source not in stubbed and os.path.exists(source) and os.path.exists(destination):
+                remove_if_exists(destination)
+                print(f"Recovery: removed the unfinished attachment copy of '{os.path.basename(source)}'")
+        elif not is_written(destination, state):
+            roll_back(destination)
+            print(f"Recovery: rolled back the interrupted move of '{os.path.basename(source)}'")
+        elif os.path.exists(destination):
+            remove_if_exists(source)
+            _index_note(destination, summary)
+            print(f"Recovery: finished moving '{os.path.basename(source)}' to '{destination}'")
+        route_journal.complete(destination)
+    flush_folder_indexes()
+    return len(moves)
@@ -1,42 +1,51 @@
 import os
+from typing import Iterator
+
 import filetype
-from pkm_gardener.config import INBOX_PATH
-from pkm_gardener.types import ProcessingJob
+from pkm_gardener.config import INBOX_PATH, SNIFF_HEADER_BYTES
+from pkm_gardener.types import ContentHandle, ProcessingJob
+from pkm_gardener.utils.tracing import tracer
+
+def looks_like_text(header: bytes) -> bool:
+    """Checks whether a header decodes as UTF-8, tolerating a multi-byte character cut off at the end."""
+    try:
+        header.decode('utf-8')
+        return True
+    except UnicodeDecodeError as e:
+        return e.reason == 'unexpected end of data' and e.start >= len(header) - 3
 
-def get_file_type(file_path: str) -> str:
+def get_file_type(file_path: str, header: bytes | None = None) -> str:
     """
-    Determines the file type using the filetype library, with a fallback for text.
+    Determines the file type from the file's first bytes using the filetype library,
+    with fallbacks for text and by file extension.
     """
-    kind = filetype.guess(file_path)
+    if header is None:
+        with open(file_path, 'rb') as f:
+            header = f.read(SNIFF_HEADER_BYTES)
+
+    # Compressed tables are recognized by their double extension, before the archive signature
+    stem, ext = os.path.splitext(file_path.lower())
+    if ext in ['.gz', '.bz2', '.xz', '.zip'] and os.path.splitext(stem)[1] in ['.csv', '.tsv']:
+        return "csv"
+
+    kind = filetype.guess(header)
     if kind is None:
-        # Fallback for plain text files that filetype might not recognize
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                f.read(1024)  # Try to read some of the file
-            # Check for specific text types like CSV
-            if file_path.endswith('.csv'):
-        # Check for specific text types like CSV before reading the file
-        if file_path.endswith('.csv'):
+        ext = os.path.splitext(file_path)[1].lower()
+        # Check for specific text types like CSV before looking at the content
+        if ext in ['.csv', '.tsv']:
             return "csv"
         # Fallback for plain text files that filetype might not recognize
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                f.read(1024)  # Try to read some of the file
+        if looks_like_text(header):
             return "text"
-        except UnicodeDecodeError:
-            return "document"  # It's some other binary format
         # Fallback: use file extension to determine file type
-        ext = os.path.splitext(file_path)[1].lower()
-        if ext == '.csv':
-            return "csv"
-        elif ext in ['.txt', '.md', '.rst']:
+        if ext in ['.txt', '.md', '.rst']:
             return "text"
         elif ext in ['.pdf']:
             return "pdf"
         elif ext in ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff']:
             return "image"
         else:
-            return "document"
+            return "document"  # It's some other binary format
 
     mime_type = kind.mime
     if mime_type.startswith("image"):
@@ -50,32 +59,44 @@ def get_file_type(file_path: str) -> str:
     else:
         return "document"
 
-def find_new_files() -> list[ProcessingJob]:
+def make_job(file_path: str) -> ProcessingJob | None:
     """
-    Scans the inbox and creates processing jobs for new files.
+    Creates a processing job for a single file, reading only a small header to sniff its type.
+    Returns None if the file cannot be read.
+    """
+    file_name = os.path.basename(file_path)
+    with tracer.span("ingest", file=file_name) as span:
+        try:
+            size = os.stat(file_path).st_size
+            with open(file_path, 'rb') as f:
+                header = f.read(SNIFF_HEADER_BYTES)
+        except OSError as e:
+            print(f"Error reading file {file_name}: {e}")
+            return None
+
+        file_type = get_file_type(file_path, header)
+        span.set(bytes=size, file_type=file_type)
+        return ProcessingJob(
+            original_filepath=file_path,
+            original_filename=file_name,
+            content=ContentHandle(file_path, size),
+            file_type=file_type,
+        )
+
+def find_new_files() -> Iterator[ProcessingJob]:
+    """
+    Scans the inbox and lazily yields processing jobs for new files.
+    Each file is opened once, to read a small header for type sniffing; its content
+    is only loaded later, on demand, through the job's ContentHandle.
     """
-    jobs = []
     if not os.path.exists(INBOX_PATH):
         os.makedirs(INBOX_PATH)
 
-    for file_name in os.listdir(INBOX_PATH):
-        if file_name.startswith('.'):
-            continue
-        file_path = os.path.join(INBOX_PATH, file_name)
-        if os.path.isfile(file_path):
-            file_type = get_file_type(file_path)
-
-            try:
-                with open(file_path, 'rb') as f:
-                    content = f.read()
-            except Exception as e:
-                print(f"Error reading file {file_name}: {e}")
+    with os.scandir(INBOX_PATH) as entries:
+        for entry in entries:
+            if entry.name.startswith('.') or not entry.is_file():
                 continue
 
-            jobs.append(ProcessingJob(
-                original_filepath=file_path,
-                original_filename=file_name,
-                content=content,
-                file_type=file_type
-            ))
-    return jobs
+            job = make_job(entry.path)
+            if job is not None:
+                yield job
@@ -0,0 +1,226 @@
+import math
+import os
+import re
+import threading
+from array import array
+from typing import Iterable
+
+from pkm_gardener.config import PKM_ROOT, CACHE_DIR, LINK_GRAPH_WORKERS, RELATED_NOTES_COUNT
+from pkm_gardener.core_modules.vault_index import iter_vault_notes, vault_index
+from pkm_gardener.utils.filename import temp_path_for
+
+# [[target]], [[target|alias]], [[target#heading]] and ![[embeds]]; the target is group 1
+_WIKI_LINK = re.compile(r'\[\[([^\[\]|#^\n]+)(?:[#^][^\[\]|\n]*)?(?:\|[^\[\]\n]*)?\]\]')
+
+# The sections added by `link_sections`, with their list of links
+_LINK_SECTION = re.compile(r'^## (?:Related notes|Backlinks)\n(?:- \[\[[^\]\n]+\]\]\n?)*', re.MULTILINE)
+
+# Weight of a shared tag (Jaccard overlap) against a graph neighbour, when ranking related notes
+_TAG_WEIGHT = 1.0
+
+def note_name(path_or_link: str) -> str:
+    """The key a note is linked by: its basename without `.md`, case-insensitively, as Obsidian resolves links."""
+    name = os.path.basename(path_or_link.strip().replace("\\", "/"))
+    if name.lower().endswith('.md'):
+        name = name[:-3]
+    return name.lower()
+
+def _link_text(path: str) -> str:
+    """A note's name as written in a link: its basename without `.md`, keeping its case."""
+    return os.path.splitext(os.path.basename(path))[0]
+
+def parse_links(body: str) -> list[str]:
+    """The distinct note names a body links to, in order of first appearance."""
+    return list(dict.fromkeys(note_name(target) for target in _WIKI_LINK.findall(body) if target.strip()))
+
+class LinkGraph:
+    """
+    The graph of `[[wiki links]]` between notes. Every note (and every link target that does
+    not exist yet) gets an integer id; each node keeps its outgoing and incoming edges in
+    `array('i')` lists, so adding a note costs time proportional to its own links only.
+    Saved as a compact edge list (CSR offsets and targets) and loaded on first use.
+    """
+
+    def __init__(self, model_path: str):
+        self.model_path = model_path
+        self.dirty = False
+        self._loaded = False
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self._names = [] # id -> link name
+        self._paths = [] # id -> note path relative to PKM_ROOT, "" for a link target with no note yet
+        self._by_name = {}
+        self._by_path = {}
+        self._out = []
+        self._in = []
+
+    def _new_node(self, name: str) -> int:
+        node = len(self._names)
+        self._names.append(name)
+        self._paths.append("")
+        self._out.append(array('i'))
+        self._in.append(array('i'))
+        self._by_name.setdefault(name, node) # With duplicate names, links resolve to the first note
+        return node
+
+    def _node(self, name: str) -> int:
+        node = self._by_name.get(name)
+        return self._new_node(name) if node is None else node
+
+    def _note_node(self, path: str) -> int:
+        """The node of a note, taking over the dangling node of its name if links already point to it."""
+        node = self._by_path.get(path)
+        if node is not None:
+            return node
+        name = note_name(path)
+        node = self._by_name.get(name)
+        if node is None or self._paths[node]:
+            node = self._new_node(name)
+        self._paths[node] = path
+        self._by_path[path] = node
+        return node
+
+    def _set_links(self, path: str, names: Iterable[str]):
+        node = self._note_node(path)
+        for target in self._out[node]:
+            self._in[target].remove(node)
+        targets = array('i', (self._node(name) for name in names))
+        self._out[node] = targets
+        for target in targets:
+            self._in[target].append(node)
+        self.dirty = True
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        if os.path.exists(self.model_path):
+            import numpy as np
+            with np.load(self.model_path, allow_pickle=False) as data:
+                names = [str(name) for name in data["names"]]
+                paths = [str(path) for path in data["paths"]]
+                offsets = data["offsets"]
+                targets = data["targets"].astype(np.int32)
+            self._names, self._paths = names, paths
+            self._by_name = {}
+            for node, name in enumerate(names):
+                self._by_name.setdefault(name, node)
+            self._by_path = {path: node for node, path in enumerate(paths) if path}
+            self._out = [array('i', targets[offsets[node]:offsets[node + 1]].tobytes()) for node in range(len(names))]
+            self._in = [array('i') for _ in names]
+            for node, edges in enumerate(self._out):
+                for target in edges:
+                    self._in[target].append(node)
+            return
+        # No saved graph yet: build it from the notes already in the vault
+        self._fit_vault()
+
+    def _fit_vault(self):
+        from concurrent.futures import ThreadPoolExecutor
+        self._reset()
+
+        def read_links(note_path: str) -> tuple[str, list[str]]:
+            with open(note_path, 'r', encoding='utf-8', errors='ignore') as f:
+                return note_path, parse_links(f.read())
+
+        with ThreadPoolExecutor(max_workers=LINK_GRAPH_WORKERS) as executor:
+            notes = list(executor.map(read_links, iter_vault_notes()))
+        # Register every note before adding edges, so links resolve to notes rather than dangling names
+        for note_path, _ in notes:
+            self._note_node(os.path.relpath(note_path, PKM_ROOT))
+        for note_path, names in notes:
+            self._set_links(os.path.relpath(note_path, PKM_ROOT), names)
+        self.dirty = True
+
+    def rebuild(self) -> int:
+        """Re-parses the links of every note in the vault and saves the graph. Returns the note count."""
+        with self._lock:
+            self._loaded = True
+            self._fit_vault()
+            self.save()
+            return len(self._by_path)
+
+    def update_note(self, path: str, body: str):
+        """Adds or replaces a note's outgoing links (path relative to PKM_ROOT)."""
+        with self._lock:
+            self._ensure_loaded()
+            self._set_links(path, parse_links(body))
+
+    def backlinks(self, name: str) -> list[str]:
+        """Paths of the notes linking to a note name, sorted."""
+        with self._lock:
+            self._ensure_loaded()
+            node = self._by_name.get(note_name(name))
+            if node is None:
+                return []
+            return sorted({self._paths[source] for source in self._in[node] if self._paths[source]})
+
+    def related_notes(self, links: list[str], tags: list[str], exclude: Iterable[str] = (), limit: int = RELATED_NOTES_COUNT) -> list[str]:
+        """
+        Ranks existing notes by proximity to a note with the given outgoing links and tags:
+        notes sharing link neighbours with it (each shared neighbour weighted by
+        1 / log(2 + degree), as in Adamic-Adar), plus the Jaccard overlap of their tags.
+        Notes it already links to, and `exclude`, are left out. Returns paths, best first.
+        """
+        scores = {}
+        with self._lock:
+            self._ensure_loaded()
+            linked = {self._by_name[name] for name in links if name in self._by_name}
+            for neighbour in linked:
+                edges = self._out[neighbour] + self._in[neighbour]
+                weight = 1 / math.log(2 + len(edges))
+                for other in edges:
+                    if other not in linked and self._paths[other]:
+                        scores[self._paths[other]] = scores.get(self._paths[other], 0.0) + weight
+            linked_paths = {self._paths[node] for node in linked if self._paths[node]}
+
+        for path, shared, total in vault_index.tag_overlap(tags):
+            scores[path] = scores.get(path, 0.0) + _TAG_WEIGHT * shared / (len(set(tags)) + total - shared)
+        excluded = linked_paths | set(exclude)
+        ranked = sorted((item for item in scores.items() if item[0] not in excluded), key=lambda item: (-item[1], item[0]))
+        return [path for path, _ in ranked[:limit]]
+
+    def save(self):
+        """Persists the graph if it changed since it was loaded or last saved."""
+        with self._lock:
+            if not self.dirty:
+                return
+            import numpy as np
+            os.makedirs(os.path.dirname(self.model_path), exist_ok=True)
+            offsets = np.zeros(len(self._out) + 1, dtype=np.int64)
+            np.cumsum([len(edges) for edges in self._out], out=offsets[1:])
+            targets = np.frombuffer(b"".join(edges.tobytes() for edges in self._out), dtype=np.int32)
+            temp_path = temp_path_for(self.model_path, ".npz") # numpy appends ".npz" to names without it
+            np.savez_compressed(
+                temp_path,
+                names=np.array(self._names, dtype=str),
+                paths=np.array(self._paths, dtype=str),
+                offsets=offsets,
+                targets=targets,
+            )
+            os.replace(temp_path, self.model_path)
+            self.dirty = False
+
+link_graph = LinkGraph(os.path.join(CACHE_DIR, "link_graph.npz"))
+
+def link_sections(note_path: str, body: str, tags: list) -> str:
+    """
+    The "Related notes" and "Backlinks" sections appended to a newly routed note: the notes
+    closest to it by links and tags, and the existing notes that already link to its name.
+    Returns "" when there is nothing to add.
+    """
+    path = os.path.relpath(note_path, PKM_ROOT)
+    backlinks = link_graph.backlinks(note_name(path))
+    related = link_graph.related_notes(parse_links(body), [str(tag) for tag in tags], exclude=[path, *backlinks])
+    sections = []
+    if related:
+        sections.append("## Related notes\n" + "".join(f"- [[{_link_text(other)}]]\n" for other in related))
+    if backlinks:
+        sections.append("## Backlinks\n" + "".join(f"- [[{_link_text(other)}]]\n" for other in backlinks))
+    return "\n" + "\n".join(sections) if sections else ""
+
+def strip_link_sections(body: str) -> str:
+    """A note body without the sections `link_sections` appended to it, e.g. to re-classify it."""
+    return _LINK_SECTION.sub("", body).rstrip() + "\n"
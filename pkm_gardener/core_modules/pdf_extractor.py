@@ -0,0 +1,128 @@
+import atexit
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import fitz # PyMuPDF
+
+from pkm_gardener.config import (
+    CACHE_DIR, PDF_EXTRACTION_MODE, PDF_WORKERS, PDF_PARALLEL_MIN_PAGES,
+    PDF_SAMPLE_HEAD_PAGES, PDF_SAMPLE_TAIL_PAGES, PDF_SAMPLE_SPREAD_PAGES,
+)
+from pkm_gardener.utils.hashing import file_sha256
+from pkm_gardener.utils.tracing import tracer
+
+def sample_page_numbers(page_count: int, head: int, tail: int, spread: int) -> list[int]:
+    """
+    Picks the pages read in sampling mode: the first `head` pages, the last `tail` pages,
+    and `spread` pages evenly spaced in between. Returns sorted, zero-based page numbers.
+    """
+    pages = set(range(min(head, page_count)))
+    pages.update(range(max(0, page_count - tail), page_count))
+    if spread > 0 and page_count > head + tail:
+        step = (page_count - head - tail) / (spread + 1)
+        pages.update(head + int(step * i) for i in range(1, spread + 1))
+    return sorted(pages)
+
+def _extract_pages(pdf_path: str, page_numbers: list[int]) -> list[str]:
+    """Extracts the text of the given pages. Runs inside the worker processes."""
+    with fitz.open(pdf_path, filetype="pdf") as doc:
+        return [doc[number].get_text() for number in page_numbers]
+
+class ExtractionCache:
+    """Extracted page texts, stored in SQLite and keyed by file hash and extraction mode."""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS pdf_pages (key TEXT PRIMARY KEY, pages TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def get(self, key: str) -> list[str] | None:
+        with self._lock:
+            row = self._connect().execute("SELECT pages FROM pdf_pages WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, key: str, pages: list[str]):
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO pdf_pages (key, pages, created_at) VALUES (?, ?, ?)",
+                (key, json.dumps(pages), time.time()),
+            )
+            conn.commit()
+
+extraction_cache = ExtractionCache(os.path.join(CACHE_DIR, "pdf_text_cache.sqlite3"))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def _get_pool():
+    """
+    Returns the shared process pool, starting it on first use. Its workers are spawned, not
+    forked, as the pipeline has threads running by then.
+    """
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor # Pulls in multiprocessing, so only for large PDFs
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=PDF_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+            atexit.register(_pool.shutdown)
+        return _pool
+
+def _cache_key(pdf_path: str, mode: str) -> str:
+    key = f"{file_sha256(pdf_path)}:{mode}"
+    if mode == "sample":
+        key += f":{PDF_SAMPLE_HEAD_PAGES}:{PDF_SAMPLE_TAIL_PAGES}:{PDF_SAMPLE_SPREAD_PAGES}"
+    return key
+
+def extract_pdf_pages(pdf_path: str, mode: str = PDF_EXTRACTION_MODE) -> list[str]:
+    """
+    Extracts the text of a PDF as a list of page texts.
+    In "sample" mode only the first, last and evenly spaced pages are read, which is enough
+    to classify a long document. Large PDFs are split into page ranges extracted in parallel
+    by a process pool, and results are cached by file hash so re-runs skip PyMuPDF entirely.
+    """
+    cache_key = _cache_key(pdf_path, mode)
+    cached = extraction_cache.get(cache_key)
+    if cached is not None:
+        tracer.add("pdf_cache_hits")
+        return cached
+    tracer.add("pdf_cache_misses")
+
+    with fitz.open(pdf_path, filetype="pdf") as doc:
+        page_count = doc.page_count
+
+    if mode == "sample":
+        page_numbers = sample_page_numbers(page_count, PDF_SAMPLE_HEAD_PAGES, PDF_SAMPLE_TAIL_PAGES, PDF_SAMPLE_SPREAD_PAGES)
+    else:
+        page_numbers = list(range(page_count))
+
+    if len(page_numbers) < PDF_PARALLEL_MIN_PAGES or PDF_WORKERS <= 1:
+        pages = _extract_pages(pdf_path, page_numbers)
+    else:
+        range_size = -(-len(page_numbers) // PDF_WORKERS) # Ceiling division: one range per worker
+        ranges = [page_numbers[i:i + range_size] for i in range(0, len(page_numbers), range_size)]
+        pages = []
+        for range_pages in _get_pool().map(_extract_pages, [pdf_path] * len(ranges), ranges):
+            pages.extend(range_pages)
+
+    extraction_cache.put(cache_key, pages)
+    return pages
+
+def extract_pdf_pages_from_bytes(pdf_bytes: bytes) -> list[str]:
+    """Extracts every page of an in-memory PDF, in-process and without caching."""
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+        return [page.get_text() for page in doc]
@@ -0,0 +1,259 @@
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+
+from pkm_gardener.config import (
+    PKM_ROOT, CACHE_DIR, DRY_RUN, REGARDEN_WORKERS, REGARDEN_MAX_LLM_REQUESTS, REGARDEN_KEEP_KEYS,
+)
+from pkm_gardener.core_modules import indexer
+from pkm_gardener.core_modules.folder_taxonomy import folder_taxonomy
+from pkm_gardener.core_modules.link_graph import strip_link_sections
+from pkm_gardener.core_modules.vault_index import body_hash, iter_vault_notes, seed_from_vault
+from pkm_gardener.utils.filename import write_file_atomic
+from pkm_gardener.utils.frontmatter import construct_frontmatter_string, split_frontmatter, validate_and_normalize_metadata
+from pkm_gardener.utils.llm import PROMPT_TEMPLATE_VERSION, get_llm_suggestions
+from pkm_gardener.utils.llm_client import get_client
+
+@dataclass
+class NoteState:
+    path: str # Relative to PKM_ROOT
+    size: int
+    mtime_ns: int
+    content_hash: str # Of the body, without frontmatter
+    prompt_version: int
+    model: str
+    status: str # "success" or "failure"
+    suggested_folder: str = ""
+    error_message: str = ""
+
+class RegardenState:
+    """
+    The outcome of the last re-gardening pass over each note, stored in SQLite and written
+    after every note, so it doubles as the checkpoint an interrupted run resumes from.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS regarden_state ("
+                " path TEXT PRIMARY KEY,"
+                " size INTEGER NOT NULL,"
+                " mtime_ns INTEGER NOT NULL,"
+                " content_hash TEXT NOT NULL,"
+                " prompt_version INTEGER NOT NULL,"
+                " model TEXT NOT NULL,"
+                " status TEXT NOT NULL,"
+                " suggested_folder TEXT NOT NULL,"
+                " error_message TEXT NOT NULL,"
+                " updated_at REAL NOT NULL)"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def load(self) -> dict[str, NoteState]:
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT path, size, mtime_ns, content_hash, prompt_version, model, status, suggested_folder, error_message"
+                " FROM regarden_state"
+            ).fetchall()
+        return {row[0]: NoteState(*row) for row in rows}
+
+    def record(self, state: NoteState):
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO regarden_state"
+                " (path, size, mtime_ns, content_hash, prompt_version, model, status, suggested_folder, error_message, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (state.path, state.size, state.mtime_ns, state.content_hash, state.prompt_version, state.model,
+                 state.status, state.suggested_folder, state.error_message, time.time()),
+            )
+            conn.commit()
+
+    def prune(self, present_paths: set):
+        """Forgets notes that were deleted or moved since the last pass."""
+        with self._lock:
+            conn = self._connect()
+            gone = [(path,) for (path,) in conn.execute("SELECT path FROM regarden_state") if path not in present_paths]
+            if gone:
+                conn.executemany("DELETE FROM regarden_state WHERE path = ?", gone)
+                conn.commit()
+
+regarden_state = RegardenState(os.path.join(CACHE_DIR, "regarden_state.sqlite3"))
+
+def _is_current(state: NoteState | None, model: str) -> bool:
+    return (state is not None and state.status == "success"
+            and state.prompt_version == PROMPT_TEMPLATE_VERSION and state.model == model)
+
+def merge_metadata(existing: dict, generated: dict) -> dict:
+    """
+    The frontmatter written back to a note: the generated keys replace the existing ones,
+    except REGARDEN_KEEP_KEYS, which keep their existing value; keys the gardener does not
+    generate (aliases, dates, plugin fields...) are kept as they are.
+    """
+    merged = dict(existing)
+    for key, value in generated.items():
+        if key in REGARDEN_KEEP_KEYS and existing.get(key) not in (None, ""):
+            continue
+        merged[key] = value
+    return merged
+
+def regarden_note(note_path: str, destination_folders_relative: list, model: str) -> NoteState | None:
+    """
+    Regenerates one note's frontmatter and rewrites it in place, leaving the body byte for
+    byte as it was. Returns the note's new state, or None if the note changed on disk
+    while its metadata was generated (it is picked up by the next pass).
+    """
+    path = os.path.relpath(note_path, PKM_ROOT)
+    with open(note_path, 'r', encoding='utf-8', newline='') as f:
+        text = f.read()
+    existing, body = split_frontmatter(text)
+    content_hash = body_hash(body)
+
+    def failure(error_message: str) -> NoteState:
+        stat = os.stat(note_path)
+        return NoteState(path, stat.st_size, stat.st_mtime_ns, content_hash, PROMPT_TEMPLATE_VERSION, model, "failure", "", error_message)
+
+    if text.startswith('---') and not existing:
+        return failure("The frontmatter is not valid YAML; fix it by hand to re-garden this note.")
+    content = strip_link_sections(body)
+    if not content.strip():
+        return failure("The note has no body to generate metadata from.")
+
+    parsed_metadata, title, _, suggested_folder, summary, status = get_llm_suggestions(content, destination_folders_relative)
+    if status != "success":
+        return failure("LLM processing failed. Check logs for details.")
+    generated = validate_and_normalize_metadata(parsed_metadata)
+    generated['title'] = title
+    metadata = merge_metadata(existing, generated)
+    # Notes without frontmatter get the blank line the router writes after it
+    new_text = construct_frontmatter_string(metadata) + (body if existing else "\n" + body)
+
+    if DRY_RUN:
+        print(f"[DRY RUN] Would rewrite the frontmatter of '{path}'")
+        return None
+    with open(note_path, 'r', encoding='utf-8', newline='') as f:
+        if f.read() != text:
+            print(f"Skipped '{path}': it was edited while its metadata was generated")
+            return None
+    if new_text != text:
+        write_file_atomic(note_path, new_text)
+        indexer.refresh_note(note_path, summary)
+    stat = os.stat(note_path)
+    return NoteState(path, stat.st_size, stat.st_mtime_ns, content_hash, PROMPT_TEMPLATE_VERSION, model, "success",
+                     folder_taxonomy.canonical(suggested_folder))
+
+def regarden(force: bool = False, max_llm_requests: int | None = REGARDEN_MAX_LLM_REQUESTS, workers: int = REGARDEN_WORKERS) -> dict:
+    """
+    Walks the vault and regenerates the frontmatter of every note whose body, prompt version
+    or model changed since its last successful pass (every note with `force`). Notes are
+    processed concurrently, and each one's outcome is saved as soon as it is done, so an
+    interrupted run resumes where it stopped. Every note in flight is counted against
+    `max_llm_requests` before it is sent, so no note is started once the budget is used up;
+    the rest wait for the next run. Notes that are not valid UTF-8 are skipped.
+    Returns counts of the notes regenerated, unchanged, failed, skipped and left for the next run.
+    """
+    from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+    seed_from_vault()
+    client = get_client()
+    model = client.backend.model_id
+    states = regarden_state.load()
+    destination_folders_relative = folder_taxonomy.scan()
+    counts = dict.fromkeys(("regenerated", "unchanged", "failed", "skipped", "deferred"), 0)
+    present = set()
+    requests_at_start = client.requests
+
+    def stale(note_path: str) -> bool:
+        """Whether a note needs a pass; a note whose stat fingerprint is unchanged is not read."""
+        path = os.path.relpath(note_path, PKM_ROOT)
+        present.add(path)
+        state = states.get(path)
+        if force or not _is_current(state, model):
+            return True
+        stat = os.stat(note_path)
+        if (stat.st_size, stat.st_mtime_ns) == (state.size, state.mtime_ns):
+            return False
+        with open(note_path, 'r', encoding='utf-8', newline='') as f:
+            _, body = split_frontmatter(f.read())
+        if body_hash(body) != state.content_hash:
+            return True
+        # Only the frontmatter was edited: the pass still holds, under the new fingerprint
+        state.size, state.mtime_ns = stat.st_size, stat.st_mtime_ns
+        regarden_state.record(state)
+        return False
+
+    def skip(note_path: str):
+        counts["skipped"] += 1
+        print(f"Skipped '{os.path.relpath(note_path, PKM_ROOT)}': it is not valid UTF-8 text")
+
+    def finish(future, note_path: str):
+        try:
+            state = future.result()
+        except UnicodeDecodeError:
+            skip(note_path)
+            return
+        except Exception as e:
+            counts["failed"] += 1
+            print(f"Error re-gardening '{os.path.relpath(note_path, PKM_ROOT)}': {e}")
+            return
+        if state is None:
+            counts["deferred"] += 1
+            return
+        regarden_state.record(state)
+        if state.status == "success":
+            counts["regenerated"] += 1
+            print(f"Re-gardened '{state.path}'")
+        else:
+            counts["failed"] += 1
+            print(f"Could not re-garden '{state.path}': {state.error_message}")
+
+    def budget_left() -> float:
+        """The LLM requests left, counting one for every note in flight that may not have sent its request yet."""
+        if max_llm_requests is None:
+            return float("inf")
+        return max_llm_requests - (client.requests - requests_at_start) - len(running)
+
+    over_budget = False
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        running = {}
+        for note_path in sorted(iter_vault_notes()):
+            try:
+                if not stale(note_path):
+                    counts["unchanged"] += 1
+                    continue
+            except UnicodeDecodeError:
+                skip(note_path)
+                continue
+            if over_budget:
+                counts["deferred"] += 1
+                continue
+            # Keep a bounded window of notes in flight; once the notes in flight could use up the
+            # budget, wait for their requests to be counted before starting another note
+            while running and (len(running) >= workers * 2 or budget_left() <= 0):
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    finish(future, running.pop(future))
+            if budget_left() <= 0:
+                over_budget = True
+                counts["deferred"] += 1
+                continue
+            running[executor.submit(regarden_note, note_path, destination_folders_relative, model)] = note_path
+        for future in list(running):
+            finish(future, running.pop(future))
+
+    if not DRY_RUN:
+        regarden_state.prune(present)
+        indexer.flush_folder_indexes()
+    if over_budget:
+        print(f"LLM budget of {max_llm_requests} requests reached; {counts['deferred']} notes are left for the next run.")
+    return counts
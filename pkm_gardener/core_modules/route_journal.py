@@ -0,0 +1,156 @@
+import glob
+import os
+import sqlite3
+import threading
+import time
+
+from pkm_gardener.config import PKM_ROOT, CACHE_DIR
+from pkm_gardener.utils.filename import candidate_filenames, create_placeholder, remove_if_exists
+
+# A move goes through these states in order; its journal entry is deleted once the note is indexed.
+RESERVING = "reserving" # The destination name is being claimed; its placeholder may not exist yet
+RESERVED = "reserved" # The destination name is claimed by an empty placeholder
+WRITTEN = "written" # The note is complete at its destination; the inbox original may remain
+MOVED = "moved" # The inbox original is removed; the note may not be indexed yet
+
+class RouteJournal:
+    """
+    A write-ahead journal of the moves from the inbox into the vault, stored in SQLite.
+    Every move is recorded before each step, so a run interrupted half-way is finished or
+    rolled back by `indexer.recover_interrupted_moves` on the next start: complete notes are kept and indexed,
+    placeholders of unwritten ones are removed and their originals stay in the inbox.
+
+    It also tracks the folders whose `_index.md` is out of date, so the index files are
+    regenerated once per run (`dirty_folders`) instead of once per routed note.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._conn.execute("PRAGMA synchronous = FULL")
+            self._conn.executescript(
+                "CREATE TABLE IF NOT EXISTS moves ("
+                " destination TEXT PRIMARY KEY," # Relative to PKM_ROOT
+                " source TEXT NOT NULL,"
+                " summary TEXT NOT NULL,"
+                " state TEXT NOT NULL,"
+                " started_at REAL NOT NULL);"
+                "CREATE TABLE IF NOT EXISTS dirty_folders (folder TEXT PRIMARY KEY);"
+            )
+        return self._conn
+
+    def _execute(self, sql: str, params: tuple = ()):
+        with self._lock:
+            conn = self._connect()
+            conn.execute(sql, params)
+            conn.commit()
+
+    def _insert(self, source: str, destination: str, summary: str) -> bool:
+        """Records a move in the RESERVING state; False if another move already holds the destination."""
+        with self._lock:
+            conn = self._connect()
+            try:
+                conn.execute(
+                    "INSERT INTO moves (destination, source, summary, state, started_at) VALUES (?, ?, ?, ?, ?)",
+                    (os.path.relpath(destination, PKM_ROOT), source, summary, RESERVING, time.time()),
+                )
+            except sqlite3.IntegrityError:
+                return False
+            conn.commit()
+        return True
+
+    def reserve(self, source: str, destination: str, summary: str = "") -> str:
+        """
+        Starts a move by claiming a free name for it, `destination` or a numbered variant, with
+        an empty placeholder. Each candidate is journaled before its placeholder is created,
+        so a crash at any point leaves no placeholder recovery does not know about. Names held
+        by another unfinished move are skipped. Returns the reserved path.
+        """
+        for candidate in candidate_filenames(destination):
+            if not self._insert(source, candidate, summary):
+                continue
+            try:
+                created = create_placeholder(candidate)
+            except BaseException:
+                self.complete(candidate)
+                raise
+            if created:
+                self.advance(candidate, RESERVED)
+                return candidate
+            self.complete(candidate)
+
+    def advance(self, destination: str, state: str):
+        self._execute("UPDATE moves SET state = ? WHERE destination = ?", (state, os.path.relpath(destination, PKM_ROOT)))
+
+    def complete(self, destination: str):
+        """Forgets a move once it is finished or rolled back."""
+        self._execute("DELETE FROM moves WHERE destination = ?", (os.path.relpath(destination, PKM_ROOT),))
+
+    def indexed(self, destination: str):
+        """
+        Forgets a move once its note is indexed, unless the inbox original could not be
+        removed, in which case recovery still has to remove it.
+        """
+        self._execute("DELETE FROM moves WHERE destination = ? AND state = ?", (os.path.relpath(destination, PKM_ROOT), MOVED))
+
+    def pending(self) -> list[tuple[str, str, str, str, float]]:
+        """The unfinished moves as (absolute destination, source, summary, state, started_at), oldest first."""
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT destination, source, summary, state, started_at FROM moves ORDER BY started_at"
+            ).fetchall()
+        return [(os.path.join(PKM_ROOT, destination), *rest) for destination, *rest in rows]
+
+    def mark_dirty(self, folder: str):
+        """Records that a folder's `_index.md` must be regenerated (folder relative to PKM_ROOT)."""
+        self._execute("INSERT OR IGNORE INTO dirty_folders (folder) VALUES (?)", (folder,))
+
+    def dirty_folders(self) -> list[str]:
+        with self._lock:
+            rows = self._connect().execute("SELECT folder FROM dirty_folders ORDER BY folder").fetchall()
+        return [row[0] for row in rows]
+
+    def clean(self, folder: str):
+        self._execute("DELETE FROM dirty_folders WHERE folder = ?", (folder,))
+
+route_journal = RouteJournal(os.path.join(CACHE_DIR, "route_journal.sqlite3"))
+
+def is_written(destination: str, state: str) -> bool:
+    """
+    Whether a move's note is complete at its destination. Writes replace the placeholder
+    atomically, so a non-empty destination is complete even if the crash came before the
+    move was journaled as written; rolling it back would file its original a second time.
+    """
+    if state == RESERVING:
+        return False
+    return state != RESERVED or (os.path.exists(destination) and os.path.getsize(destination) > 0)
+
+def roll_back_reservation(destination: str, started_at: float):
+    """
+    Rolls back a move interrupted while claiming its name. The file at the destination is its
+    placeholder only if it is empty and no older than the move; otherwise it belongs to
+    someone else and is left alone. Two seconds of slack allow for coarse file timestamps.
+    """
+    try:
+        stat = os.stat(destination)
+    except FileNotFoundError:
+        return
+    if stat.st_size == 0 and stat.st_mtime >= started_at - 2:
+        remove_if_exists(destination)
+
+def roll_back(destination: str):
+    """Removes the placeholder and any temp file of a move whose note was never written."""
+    directory, filename = os.path.split(destination)
+    for temp_path in glob.glob(os.path.join(glob.escape(directory), f".{glob.escape(filename)}.*.tmp")):
+        remove_if_exists(temp_path)
+    try:
+        if os.path.getsize(destination) == 0:
+            remove_if_exists(destination)
+    except FileNotFoundError:
+        pass
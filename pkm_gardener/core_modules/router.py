@@ -1,11 +1,23 @@
 import os
-import shutil
-from pkm_gardener.types import ProcessingJob
-from pkm_gardener.config import DRY_RUN
-from pkm_gardener.utils.filename import sanitize_filename, resolve_filename_conflict
+from pkm_gardener.types import ContentHandle, ProcessingJob
+from pkm_gardener.config import DRY_RUN, LINK_SECTIONS_ENABLED, ATTACHMENTS_PATH, ATTACHMENT_FILE_TYPES, SNIFF_HEADER_BYTES
+from pkm_gardener.core_modules.ingestor import looks_like_text
+from pkm_gardener.core_modules.link_graph import link_sections
+from pkm_gardener.core_modules.route_journal import route_journal, roll_back, WRITTEN, MOVED
+from pkm_gardener.utils.filename import sanitize_filename, write_file_atomic, link_file_atomic, fsync_directory
 from pkm_gardener.utils.frontmatter import construct_frontmatter_string
 
 
+def is_attachment(job: ProcessingJob) -> bool:
+    """Whether a job's file is binary, and so is filed as an attachment with a stub note."""
+    if job.file_type in ATTACHMENT_FILE_TYPES:
+        return True
+    if isinstance(job.content, ContentHandle):
+        return not looks_like_text(job.content.read_header(SNIFF_HEADER_BYTES))
+    if isinstance(job.content, bytes):
+        return not looks_like_text(job.content[:SNIFF_HEADER_BYTES])
+    return False
+
 def file_note(job: ProcessingJob):
     """
     Constructs the final note content and moves the file to its destination.
@@ -27,16 +39,15 @@ def file_note(job: ProcessingJob):
     if not DRY_RUN:
         os.makedirs(job.suggested_folder_path, exist_ok=True)
 
-    # 3. Resolve any filename conflicts in the destination
-    final_filepath = resolve_filename_conflict(
-        os.path.join(job.suggested_folder_path, sanitized)
-    )
-    final_filename = os.path.basename(final_filepath)
-
-    # 4. Construct the final content of the note
+    # 3. Construct the final content of the note
     frontmatter_str = construct_frontmatter_string(job.metadata)
+    if is_attachment(job):
+        _file_attachment(job, sanitized, frontmatter_str)
+        return
     # Ensure content is a string for concatenation
-    if isinstance(job.content, bytes):
+    if isinstance(job.content, ContentHandle):
+        content_str = job.content_text(errors='strict')
+    elif isinstance(job.content, bytes):
         content_str = job.content.decode('utf-8')
     elif isinstance(job.content, str):
         content_str = job.content
@@ -52,21 +63,99 @@ def file_note(job: ProcessingJob):
         return
     final_content = f"{frontmatter_str}\n{content_str}"
 
-    print(f"Action: Routing '{job.original_filename}' to '{final_filepath}'")
+    destination = os.path.join(job.suggested_folder_path, sanitized)
+    if DRY_RUN:
+        print(f"Action: Routing '{job.original_filename}' to '{destination}'")
+        print("[DRY RUN] No file operations performed.")
+        return
+    _move(job, destination, final_content)
 
-    if not DRY_RUN:
-        try:
-            # 5. Write the new file to the destination
-            with open(final_filepath, "w", encoding="utf-8") as f:
-                f.write(final_content)
+def _file_attachment(job: ProcessingJob, sanitized: str, frontmatter_str: str):
+    """
+    Files a binary file without reading it: the original goes as it is into ATTACHMENTS_PATH,
+    under the suggested name with its own extension, and a stub note with the frontmatter,
+    summary and an embed of it is moved into the suggested folder like any other note. The
+    attachment is journaled too, and kept by recovery only once its stub note is written.
+    """
+    stem = os.path.splitext(sanitized)[0]
+    name, extension = os.path.splitext(job.original_filename.lower())
+    if extension in ('.gz', '.bz2', '.xz'):
+        extension = os.path.splitext(name)[1] + extension # Keeps e.g. ".csv.gz" whole
+    attachment = os.path.join(ATTACHMENTS_PATH, stem + extension)
+    destination = os.path.join(job.suggested_folder_path, stem + ".md")
+    if DRY_RUN:
+        print(f"Action: Routing '{job.original_filename}' to '{attachment}' with a stub note at '{destination}'")
+        print("[DRY RUN] No file operations performed.")
+        return
+
+    try:
+        os.makedirs(ATTACHMENTS_PATH, exist_ok=True)
+        attachment_path = route_journal.reserve(job.original_filepath, attachment)
+    except OSError as e:
+        job.status = "failure"
+        job.error_message = f"File routing failed: {e}"
+        print(f"Error reserving a filename in '{ATTACHMENTS_PATH}': {e}")
+        return
+    try:
+        # A hard link costs the same whatever the file's size; the original is unlinked by `_move`
+        link_file_atomic(job.original_filepath, attachment_path)
+    except Exception as e:
+        roll_back(attachment_path)
+        route_journal.complete(attachment_path)
+        job.status = "failure"
+        job.error_message = f"File routing failed: {e}"
+        print(f"Error during attachment write: {e}")
+        return
+    route_journal.advance(attachment_path, WRITTEN)
 
-            # 6. Remove the original file from the inbox
-            os.remove(job.original_filepath)
-            print(f"✓ Successfully moved and wrote '{final_filename}'")
+    embed = f"![[{os.path.basename(attachment_path)}]]\n"
+    _move(job, destination, f"{frontmatter_str}\n{job.summary}\n\n{embed}" if job.summary else f"{frontmatter_str}\n{embed}")
+    if job.status != "success" and os.path.exists(job.original_filepath):
+        os.remove(attachment_path)
+    route_journal.complete(attachment_path)
 
-        except Exception as e:
-            job.status = "failure"
-            job.error_message = f"File routing failed: {e}"
-            print(f"Error during file write/remove: {e}")
-    else:
-        print("[DRY RUN] No file operations performed.")
+def _move(job: ProcessingJob, destination: str, final_content: str):
+    """
+    Moves a note into the vault as a journaled transaction: reserve a free name, write the
+    note durably over the placeholder, then remove the inbox original. See `route_journal` for how an interrupted move is finished or rolled back.
+    """
+    # 4. Claim a free filename in the destination atomically, journaling the move
+    try:
+        final_filepath = route_journal.reserve(job.original_filepath, destination, job.summary or "")
+    except OSError as e:
+        job.status = "failure"
+        job.error_message = f"File routing failed: {e}"
+        print(f"Error reserving a filename in '{job.suggested_folder_path}': {e}")
+        return
+    final_filename = os.path.basename(final_filepath)
+    print(f"Action: Routing '{job.original_filename}' to '{final_filepath}'")
+
+    try:
+        if LINK_SECTIONS_ENABLED:
+            # Backlinks depend on the final name, so the sections are added once it is reserved;
+            # a failure here rolls back the placeholder like a failed write
+            final_content += link_sections(final_filepath, final_content, job.metadata.get('tags') or [])
+        # 5. Write the note over its placeholder
+        write_file_atomic(final_filepath, final_content)
+    except Exception as e:
+        roll_back(final_filepath)
+        route_journal.complete(final_filepath)
+        job.status = "failure"
+        job.error_message = f"File routing failed: {e}"
+        print(f"Error during file write: {e}")
+        return
+    route_journal.advance(final_filepath, WRITTEN)
+    job.final_filepath = final_filepath
+
+    try:
+        # 6. Remove the original file from the inbox
+        os.remove(job.original_filepath)
+        fsync_directory(os.path.dirname(job.original_filepath))
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        # The note is safely in the vault; removing the original is retried by the next run's recovery
+        print(f"Warning: could not remove '{job.original_filename}' from the inbox: {e}")
+        return
+    route_journal.advance(final_filepath, MOVED)
+    print(f"✓ Successfully moved and wrote '{final_filename}'")
@@ -0,0 +1,146 @@
+import os
+import re
+import sqlite3
+import threading
+from dataclasses import dataclass
+from typing import Iterable
+
+from pkm_gardener.config import CACHE_DIR, SEARCH_INDEX_WORKERS
+from pkm_gardener.core_modules.link_graph import strip_link_sections
+from pkm_gardener.core_modules.vault_index import NoteRecord, iter_vault_notes, read_note, vault_index
+
+# BM25 weights for the indexed columns: title, tags, other frontmatter fields, body
+_COLUMN_WEIGHTS = (5.0, 3.0, 1.5, 1.0)
+_QUERY_TOKEN = re.compile(r'\w+', re.UNICODE)
+_INSERT_BATCH_SIZE = 500
+
+@dataclass
+class SearchResult:
+    path: str
+    title: str
+    score: float
+    snippet: str
+
+def _frontmatter_text(record: NoteRecord) -> str:
+    """Flattens the frontmatter fields other than title and tags into searchable text."""
+    values = []
+    for key, value in record.frontmatter.items():
+        if key in ('title', 'tags'):
+            continue
+        if isinstance(value, list):
+            values.extend(str(item) for item in value)
+        elif value not in (None, ''):
+            values.append(str(value))
+    if record.summary:
+        values.append(record.summary)
+    return " ".join(values)
+
+def _match_expression(query: str, operator: str) -> str:
+    """Turns free text into an FTS5 expression, quoting every term so user input cannot break the syntax."""
+    terms = _QUERY_TOKEN.findall(query)
+    return f" {operator} ".join(f'"{term}"' for term in terms)
+
+class SearchIndex:
+    """
+    A full-text index over note bodies and frontmatter, ranked with BM25. Backed by an
+    SQLite FTS5 table (a compact on-disk inverted index) that is updated note by note.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._conn.executescript(
+                # Maps note paths to FTS row ids so single notes can be replaced without a scan
+                "CREATE TABLE IF NOT EXISTS search_docs (id INTEGER PRIMARY KEY, path TEXT NOT NULL UNIQUE);"
+                "CREATE VIRTUAL TABLE IF NOT EXISTS search_fts USING fts5("
+                " title, tags, frontmatter, body, tokenize = 'porter unicode61');"
+            )
+        return self._conn
+
+    def _delete(self, conn: sqlite3.Connection, path: str):
+        row = conn.execute("SELECT id FROM search_docs WHERE path = ?", (path,)).fetchone()
+        if row:
+            conn.execute("DELETE FROM search_fts WHERE rowid = ?", row)
+            conn.execute("DELETE FROM search_docs WHERE id = ?", row)
+
+    def _insert(self, conn: sqlite3.Connection, record: NoteRecord, body: str):
+        self._delete(conn, record.path)
+        cursor = conn.execute("INSERT INTO search_docs (path) VALUES (?)", (record.path,))
+        conn.execute(
+            "INSERT INTO search_fts (rowid, title, tags, frontmatter, body) VALUES (?, ?, ?, ?, ?)",
+            (cursor.lastrowid, record.title, " ".join(record.tags), _frontmatter_text(record), body),
+        )
+
+    def update(self, record: NoteRecord, body: str):
+        """Adds or replaces a single note."""
+        with self._lock:
+            conn = self._connect()
+            self._insert(conn, record, body)
+            conn.commit()
+
+    def remove(self, path: str):
+        with self._lock:
+            conn = self._connect()
+            self._delete(conn, path)
+            conn.commit()
+
+    def replace_all(self, notes: Iterable[tuple[NoteRecord, str]]):
+        """Rebuilds the index from (record, body) pairs, committing in batches, then compacts it."""
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM search_docs")
+            conn.execute("DELETE FROM search_fts")
+            for count, (record, body) in enumerate(notes, start=1):
+                self._insert(conn, record, body)
+                if count % _INSERT_BATCH_SIZE == 0:
+                    conn.commit()
+            conn.commit()
+            conn.execute("INSERT INTO search_fts (search_fts) VALUES ('optimize')")
+            conn.commit()
+
+    def search(self, query: str, limit: int = 10) -> list[SearchResult]:
+        """
+        Returns the best matching notes for a free-text query, best first. All terms must
+        match; if nothing does, any term may match.
+        """
+        weights = ", ".join(str(weight) for weight in _COLUMN_WEIGHTS)
+        sql = (
+            f"SELECT d.path, f.title, bm25(search_fts, {weights}) AS score,"
+            " snippet(search_fts, 3, '[', ']', '...', 12)"
+            " FROM search_fts f JOIN search_docs d ON d.id = f.rowid"
+            " WHERE search_fts MATCH ? ORDER BY score LIMIT ?"
+        )
+        with self._lock:
+            conn = self._connect()
+            for operator in ("AND", "OR"):
+                expression = _match_expression(query, operator)
+                if not expression:
+                    return []
+                rows = conn.execute(sql, (expression, limit)).fetchall()
+                if rows:
+                    break
+        # FTS5's bm25() is negative, lower being better; flip it so higher scores rank first
+        return [SearchResult(path, title, -score, snippet) for path, title, score, snippet in rows]
+
+search_index = SearchIndex(os.path.join(CACHE_DIR, "search_index.sqlite3"))
+
+def rebuild_search_index() -> int:
+    """Re-indexes every note in the vault, reading notes with a thread pool. Returns the note count."""
+    from concurrent.futures import ThreadPoolExecutor
+    summaries = {record.path: record.summary for record in vault_index.all_notes()}
+    note_paths = list(iter_vault_notes())
+
+    def read_with_summary(note_path: str) -> tuple[NoteRecord, str]:
+        record, body = read_note(note_path)
+        record.summary = summaries.get(record.path, record.summary)
+        return record, strip_link_sections(body)
+
+    with ThreadPoolExecutor(max_workers=SEARCH_INDEX_WORKERS) as executor:
+        search_index.replace_all(executor.map(read_with_summary, note_paths))
+    return len(note_paths)
@@ -0,0 +1,89 @@
+import os
+
+from pkm_gardener.types import ProcessingJob
+from pkm_gardener.utils.llm import get_llm_suggestions, get_llm_suggestions_batch
+from pkm_gardener.utils.frontmatter import validate_and_normalize_metadata
+from pkm_gardener.config import PKM_ROOT, FOLDER_PREROUTING_ENABLED
+from pkm_gardener.core_modules.folder_classifier import preroute
+from pkm_gardener.core_modules.folder_taxonomy import folder_taxonomy
+
+
+def populate_job(job: ProcessingJob, suggestions: tuple) -> ProcessingJob:
+    """
+    Populates the job object from an LLM suggestions tuple.
+    """
+    (
+        parsed_metadata,
+        title,
+        suggested_filename,
+        suggested_folder_relative,
+        summary,
+        llm_status
+    ) = suggestions
+
+    # Validate and normalize the metadata
+    job.metadata = validate_and_normalize_metadata(parsed_metadata)
+    job.metadata['title'] = title # Add title to metadata
+
+    # Reuse an existing folder when the suggestion only differs from it in case or punctuation
+    if llm_status == "success":
+        suggested_folder_relative = folder_taxonomy.canonical(suggested_folder_relative)
+
+    # Populate the job object with the new data
+    job.suggested_filename = suggested_filename
+    job.suggested_folder_path = os.path.join(PKM_ROOT, suggested_folder_relative)
+    job.summary = summary
+    job.status = llm_status # Set status based on LLM result
+
+    if llm_status == "failure":
+        job.error_message = "LLM processing failed. Check logs for details."
+
+    return job
+
+
+def _preroute(content_for_llm: str, destination_folders_relative: list) -> tuple[str | None, list]:
+    if not FOLDER_PREROUTING_ENABLED:
+        return None, destination_folders_relative
+    return preroute(content_for_llm, destination_folders_relative)
+
+
+def _with_folder(suggestions: tuple, assigned_folder: str | None) -> tuple:
+    """Replaces the LLM's folder with the locally assigned one, if any."""
+    if assigned_folder is None or suggestions[-1] != "success":
+        return suggestions
+    parsed_metadata, title, suggested_filename, _, summary, llm_status = suggestions
+    return parsed_metadata, title, suggested_filename, assigned_folder, summary, llm_status
+
+
+def apply_suggestions(job: ProcessingJob, content_for_llm: str, destination_folders_relative: list) -> ProcessingJob:
+    """
+    Gets suggestions from the LLM for the extracted content and populates the job object.
+    Shared by all processors so the extract and LLM stages can run independently.
+    The local folder classifier narrows the folders offered to the LLM, or picks one outright.
+    """
+    assigned_folder, candidate_folders = _preroute(content_for_llm, destination_folders_relative)
+    if assigned_folder is not None:
+        print(f"Folder assigned locally: {assigned_folder}")
+    suggestions = get_llm_suggestions(content_for_llm, candidate_folders)
+    return populate_job(job, _with_folder(suggestions, assigned_folder))
+
+
+def apply_suggestions_batch(jobs: list[ProcessingJob], destination_folders_relative: list) -> list[ProcessingJob]:
+    """
+    Gets suggestions for several already-extracted jobs with one batched LLM request.
+    The batch shares one folder list: the union of each job's candidate folders.
+    """
+    if len(jobs) == 1:
+        return [apply_suggestions(jobs[0], jobs[0].extracted_content, destination_folders_relative)]
+
+    assigned_folders, candidate_folders = [], []
+    for job in jobs:
+        assigned_folder, candidates = _preroute(job.extracted_content, destination_folders_relative)
+        assigned_folders.append(assigned_folder)
+        candidate_folders.extend(folder for folder in candidates if folder not in candidate_folders)
+
+    all_suggestions = get_llm_suggestions_batch([job.extracted_content for job in jobs], candidate_folders)
+    return [
+        populate_job(job, _with_folder(suggestions, assigned_folder))
+        for job, suggestions, assigned_folder in zip(jobs, all_suggestions, assigned_folders)
+    ]
@@ -0,0 +1,276 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Iterator, Optional
+
+from pkm_gardener.config import PKM_ROOT, CACHE_DIR, PROJECTS_PATH, AREAS_PATH, RESOURCES_PATH, DRY_RUN
+from pkm_gardener.utils.filename import temp_path_for
+from pkm_gardener.utils.frontmatter import split_frontmatter
+
+INDEX_FILENAME = "_index.md"
+
+# Matches the lines written by format_index_line, to recover summaries from existing index files
+_INDEX_LINE_PATTERN = re.compile(r'^- \[\[(?P<filename>[^\]]+)\]\] \(.*?\) - (?P<summary>.*)$')
+
+@dataclass
+class NoteRecord:
+    path: str # Relative to PKM_ROOT
+    title: str
+    frontmatter: dict
+    tags: list
+    content_hash: str # SHA-256 of the note body, without frontmatter
+    summary: str = ""
+    mtime: float = 0.0
+    folder: str = field(init=False)
+    filename: str = field(init=False)
+
+    def __post_init__(self):
+        self.folder, self.filename = os.path.split(self.path)
+
+def body_hash(body: str) -> str:
+    return hashlib.sha256(body.encode('utf-8', errors='ignore')).hexdigest()
+
+def read_note(note_path: str, summary: str = "") -> tuple[NoteRecord, str]:
+    """Reads a note from disk and returns its index record and its body."""
+    with open(note_path, 'r', encoding='utf-8', errors='ignore') as f:
+        text = f.read()
+    metadata, body = split_frontmatter(text)
+    tags = metadata.get('tags')
+    title = metadata.get('title') or os.path.splitext(os.path.basename(note_path))[0]
+    record = NoteRecord(
+        path=os.path.relpath(note_path, PKM_ROOT),
+        title=str(title),
+        frontmatter=metadata,
+        tags=[str(tag) for tag in tags] if isinstance(tags, list) else [],
+        content_hash=body_hash(body),
+        summary=summary or str(metadata.get('summary') or ""),
+        mtime=os.path.getmtime(note_path),
+    )
+    return record, body
+
+def read_note_record(note_path: str, summary: str = "") -> NoteRecord:
+    """Reads a note from disk and builds its index record."""
+    return read_note(note_path, summary)[0]
+
+def iter_vault_notes() -> Iterator[str]:
+    """Yields the absolute path of every Markdown note under the PARA folders."""
+    for root_path in (PROJECTS_PATH, AREAS_PATH, RESOURCES_PATH):
+        for dirpath, dirnames, filenames in os.walk(root_path):
+            dirnames[:] = [d for d in dirnames if not d.startswith('.')]
+            for filename in filenames:
+                if filename.endswith('.md') and filename != INDEX_FILENAME and not filename.startswith('.'):
+                    yield os.path.join(dirpath, filename)
+
+def format_index_line(record: NoteRecord) -> str:
+    priority = record.frontmatter.get('priority', 'N/A')
+    note_type = record.frontmatter.get('type', 'N/A')
+    return f"- [[{record.filename}]] (Priority: {priority}, Type: {note_type}) - {record.summary}\n"
+
+class VaultIndex:
+    """
+    A queryable SQLite index of every note in the vault: path, title, frontmatter, tags,
+    summary and body hash. The per-folder `_index.md` files are generated from it.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._conn.executescript(
+                "CREATE TABLE IF NOT EXISTS notes ("
+                " path TEXT PRIMARY KEY,"
+                " folder TEXT NOT NULL,"
+                " filename TEXT NOT NULL,"
+                " title TEXT NOT NULL,"
+                " frontmatter TEXT NOT NULL,"
+                " summary TEXT NOT NULL,"
+                " content_hash TEXT NOT NULL,"
+                " mtime REAL NOT NULL,"
+                " indexed_at REAL NOT NULL);"
+                "CREATE INDEX IF NOT EXISTS notes_folder ON notes (folder);"
+                "CREATE INDEX IF NOT EXISTS notes_hash ON notes (content_hash);"
+                "CREATE TABLE IF NOT EXISTS note_tags ("
+                " path TEXT NOT NULL,"
+                " tag TEXT NOT NULL,"
+                " PRIMARY KEY (path, tag));"
+                "CREATE INDEX IF NOT EXISTS note_tags_tag ON note_tags (tag);"
+            )
+        return self._conn
+
+    @staticmethod
+    def _row_to_record(row) -> NoteRecord:
+        path, title, frontmatter, summary, content_hash, mtime = row
+        metadata = json.loads(frontmatter)
+        tags = metadata.get('tags')
+        return NoteRecord(
+            path=path, title=title, frontmatter=metadata,
+            tags=[str(tag) for tag in tags] if isinstance(tags, list) else [],
+            content_hash=content_hash, summary=summary, mtime=mtime,
+        )
+
+    def _upsert(self, conn: sqlite3.Connection, record: NoteRecord):
+        conn.execute(
+            "INSERT OR REPLACE INTO notes"
+            " (path, folder, filename, title, frontmatter, summary, content_hash, mtime, indexed_at)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (record.path, record.folder, record.filename, record.title,
+             json.dumps(record.frontmatter, default=str), record.summary,
+             record.content_hash, record.mtime, time.time()),
+        )
+        conn.execute("DELETE FROM note_tags WHERE path = ?", (record.path,))
+        conn.executemany(
+            "INSERT OR IGNORE INTO note_tags (path, tag) VALUES (?, ?)",
+            [(record.path, tag) for tag in record.tags],
+        )
+
+    def upsert(self, record: NoteRecord):
+        """Adds or replaces a note, so re-processing a file never duplicates it."""
+        with self._lock:
+            conn = self._connect()
+            self._upsert(conn, record)
+            conn.commit()
+
+    def is_empty(self) -> bool:
+        with self._lock:
+            return self._connect().execute("SELECT 1 FROM notes LIMIT 1").fetchone() is None
+
+    def remove(self, path: str):
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM notes WHERE path = ?", (path,))
+            conn.execute("DELETE FROM note_tags WHERE path = ?", (path,))
+            conn.commit()
+
+    def replace_all(self, records: list[NoteRecord]):
+        """Replaces the whole index in a single transaction."""
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM notes")
+            conn.execute("DELETE FROM note_tags")
+            for record in records:
+                self._upsert(conn, record)
+            conn.commit()
+
+    def _query(self, sql: str, params: tuple = ()) -> list[NoteRecord]:
+        with self._lock:
+            rows = self._connect().execute(sql, params).fetchall()
+        return [self._row_to_record(row) for row in rows]
+
+    _COLUMNS = "path, title, frontmatter, summary, content_hash, mtime"
+
+    def get(self, path: str) -> Optional[NoteRecord]:
+        records = self._query(f"SELECT {self._COLUMNS} FROM notes WHERE path = ?", (path,))
+        return records[0] if records else None
+
+    def all_notes(self) -> list[NoteRecord]:
+        return self._query(f"SELECT {self._COLUMNS} FROM notes ORDER BY path")
+
+    def notes_in_folder(self, folder: str) -> list[NoteRecord]:
+        return self._query(f"SELECT {self._COLUMNS} FROM notes WHERE folder = ? ORDER BY filename", (folder,))
+
+    def find_by_hash(self, content_hash: str) -> list[NoteRecord]:
+        return self._query(f"SELECT {self._COLUMNS} FROM notes WHERE content_hash = ? ORDER BY path", (content_hash,))
+
+    def find_by_tag(self, tag: str) -> list[NoteRecord]:
+        return self._query(
+            f"SELECT {self._COLUMNS} FROM notes WHERE path IN (SELECT path FROM note_tags WHERE tag = ?) ORDER BY path",
+            (tag,),
+        )
+
+    def folders(self) -> list[str]:
+        with self._lock:
+            rows = self._connect().execute("SELECT DISTINCT folder FROM notes ORDER BY folder").fetchall()
+        return [row[0] for row in rows]
+
+    def tag_overlap(self, tags: list[str], limit: int = 200) -> list[tuple[str, int, int]]:
+        """
+        The notes sharing the most tags with `tags`, as (path, shared tags, total tags of the note),
+        most shared first.
+        """
+        tags = sorted(set(tags))
+        if not tags:
+            return []
+        placeholders = ", ".join("?" * len(tags))
+        with self._lock:
+            return self._connect().execute(
+                "SELECT shared.path, shared.count, (SELECT COUNT(*) FROM note_tags WHERE note_tags.path = shared.path)"
+                f" FROM (SELECT path, COUNT(*) AS count FROM note_tags WHERE tag IN ({placeholders}) GROUP BY path) AS shared"
+                " ORDER BY shared.count DESC, shared.path LIMIT ?",
+                (*tags, limit),
+            ).fetchall()
+
+    def write_folder_index(self, folder: str):
+        """Regenerates a folder's `_index.md` from the index, sorted by filename."""
+        records = self.notes_in_folder(folder)
+        index_file_path = os.path.join(PKM_ROOT, folder, INDEX_FILENAME)
+        if not records and not os.path.exists(index_file_path):
+            return
+        temp_path = temp_path_for(index_file_path)
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.writelines(format_index_line(record) for record in records)
+        os.replace(temp_path, index_file_path)
+
+vault_index = VaultIndex(os.path.join(CACHE_DIR, "vault_index.sqlite3"))
+
+def _read_legacy_summaries() -> dict:
+    """Recovers summaries from existing `_index.md` files, keyed by note path relative to PKM_ROOT."""
+    summaries = {}
+    for root_path in (PROJECTS_PATH, AREAS_PATH, RESOURCES_PATH):
+        for dirpath, dirnames, filenames in os.walk(root_path):
+            if INDEX_FILENAME not in filenames:
+                continue
+            folder = os.path.relpath(dirpath, PKM_ROOT)
+            with open(os.path.join(dirpath, INDEX_FILENAME), 'r', encoding='utf-8', errors='ignore') as f:
+                for line in f:
+                    match = _INDEX_LINE_PATTERN.match(line.rstrip('\n'))
+                    if match:
+                        summaries[os.path.join(folder, match.group('filename'))] = match.group('summary')
+    return summaries
+
+def rebuild_from_vault(workers: int | None = None) -> int:
+    """
+    Rebuilds the index from the notes on disk, parsing frontmatter in parallel, then
+    regenerates every folder's `_index.md`. Existing summaries are kept.
+    Returns the number of notes indexed.
+    """
+    from concurrent.futures import ProcessPoolExecutor # Pulls in multiprocessing, so only when rebuilding
+
+    summaries = _read_legacy_summaries()
+    summaries.update({record.path: record.summary for record in vault_index.all_notes() if record.summary})
+
+    previous_folders = set(vault_index.folders())
+    note_paths = list(iter_vault_notes())
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        records = list(executor.map(read_note_record, note_paths, chunksize=64))
+    for record in records:
+        record.summary = summaries.get(record.path, record.summary)
+
+    vault_index.replace_all(records)
+    if not DRY_RUN:
+        for folder in sorted({record.folder for record in records} | previous_folders):
+            vault_index.write_folder_index(folder)
+    return len(records)
+
+def seed_from_vault() -> int:
+    """
+    Builds the index from the notes on disk if it is empty, as on the first run over a vault
+    filed before the index existed. Otherwise the first `_index.md` regenerated in a folder
+    would drop the entries of its older notes, whose summaries only exist in that file.
+    Returns the number of notes indexed (0 if the index was already populated).
+    """
+    if not vault_index.is_empty() or next(iter_vault_notes(), None) is None:
+        return 0
+    count = rebuild_from_vault()
+    if count:
+        print(f"Vault index seeded from {count} existing notes.")
+    return count
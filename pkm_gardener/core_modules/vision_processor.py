@@ -1,65 +1,59 @@
-import os
-import fitz # PyMuPDF
-import io
-from PIL import Image
-import google.generativeai as genai
+import hashlib
 
 from pkm_gardener.types import ProcessingJob
-from pkm_gardener.utils.llm import get_llm_suggestions
-from pkm_gardener.utils.frontmatter import validate_and_normalize_metadata
-from pkm_gardener.config import PKM_ROOT, GEMINI_API_KEY, GEMINI_MODEL_NAME
+from pkm_gardener.core_modules import pdf_extractor
+from pkm_gardener.core_modules.image_preprocessor import prepare_image, image_cache
+from pkm_gardener.core_modules.suggester import apply_suggestions
+from pkm_gardener.utils.llm_client import get_client
 
-genai.configure(api_key=GEMINI_API_KEY)
-vision_model = genai.GenerativeModel(GEMINI_MODEL_NAME)
+IMAGE_DESCRIPTION_PROMPT = "Describe this image for a PKM system."
 
-def get_image_description(image_bytes: bytes) -> str:
+def get_image_description(image_source: str | bytes) -> str:
     """
-    Gets a description of an image using the Gemini Vision API.
+    Gets a description of an image (a file path or raw bytes) from the vision model.
+    The image is sent downscaled and re-encoded, and images that look the same as one
+    already described (by perceptual hash) reuse its description.
     """
-    image = Image.open(io.BytesIO(image_bytes))
-    response = vision_model.generate_content(["Describe this image for a PKM system.", image])
-    return response.text.strip()
+    prepared = prepare_image(image_source)
+    client = get_client()
+    # Descriptions are only reused for the same model and prompt
+    model = f"{client.backend.model_id}:{hashlib.sha256(IMAGE_DESCRIPTION_PROMPT.encode()).hexdigest()[:8]}"
+    description = image_cache.get(prepared.phash, model)
+    if description is None:
+        description = client.generate([IMAGE_DESCRIPTION_PROMPT, {"mime_type": prepared.mime_type, "data": prepared.data}])
+        image_cache.put(prepared.phash, model, description)
+    return description
+
+def get_pdf_text(pdf_source: str | bytes) -> str:
+    """
+    Extracts text from a PDF file (a file path or raw bytes).
+    Pages are separated by form feeds, so long PDFs can be chunked on page boundaries.
+    """
+    if isinstance(pdf_source, bytes):
+        pages = pdf_extractor.extract_pdf_pages_from_bytes(pdf_source)
+    else:
+        pages = pdf_extractor.extract_pdf_pages(pdf_source)
+    return "\f".join(pages)
 
-def get_pdf_text(pdf_bytes: bytes) -> str:
+def extract(job: ProcessingJob) -> str:
     """
-    Extracts text from a PDF file.
+    Extracts the text to send to the LLM from an image or PDF file.
     """
-    text = ""
-    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
-        for page in doc:
-            text += page.get_text()
-    return text
+    # Both libraries read straight from the file when given a path
+    source = job.content_source()
+    if job.file_type == "image":
+        return get_image_description(source)
+    elif job.file_type == "pdf":
+        return get_pdf_text(source)
+    raise ValueError(f"Unsupported file type for vision processor: {job.file_type}")
 
 def process(job: ProcessingJob, destination_folders_relative: list) -> ProcessingJob:
     """
     Processes an image or PDF file.
     """
-    content_for_llm = ""
     try:
-        if job.file_type == "image":
-            content_for_llm = get_image_description(job.content)
-        elif job.file_type == "pdf":
-            content_for_llm = get_pdf_text(job.content)
-        else:
-            job.status = "failure"
-            job.error_message = f"Unsupported file type for vision processor: {job.file_type}"
-            return job
-
-        (
-            parsed_metadata,
-            title,
-            suggested_filename,
-            suggested_folder_relative,
-            summary,
-        ) = get_llm_suggestions(content_for_llm, destination_folders_relative)
-
-        job.metadata = validate_and_normalize_metadata(parsed_metadata)
-        job.metadata['title'] = title
-
-        job.suggested_filename = suggested_filename
-        job.suggested_folder_path = os.path.join(PKM_ROOT, suggested_folder_relative)
-        job.summary = summary
-        job.status = "success"
+        content_for_llm = extract(job)
+        apply_suggestions(job, content_for_llm, destination_folders_relative)
 
     except Exception as e:
         job.status = "failure"
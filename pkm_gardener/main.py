@@ -1,4 +1,83 @@
+import argparse
+import time
+
+from pkm_gardener.config import SEARCH_RESULT_LIMIT, REGARDEN_MAX_LLM_REQUESTS, REGARDEN_WORKERS
 from pkm_gardener.orchestrator import run_pipeline
+from pkm_gardener.core_modules.vault_index import rebuild_from_vault
+from pkm_gardener.core_modules.search_index import search_index, rebuild_search_index
+from pkm_gardener.core_modules.folder_classifier import folder_classifier
+from pkm_gardener.core_modules.duplicate_index import rebuild_duplicate_index
+from pkm_gardener.core_modules.link_graph import link_graph
+from pkm_gardener.utils.llm import llm_cache
+from pkm_gardener.utils.tracing import tracer
+from pkm_gardener.watcher import watch
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="File and tag new notes from the PKM inbox.")
+    parser.add_argument("--watch", action="store_true", help="Keep running and process files as they land in the inbox.")
+    parser.add_argument("--rebuild-index", action="store_true", help="Rebuild the vault, search and duplicate indexes, the folder classifier, the link graph and every _index.md from the notes on disk, then exit.")
+    parser.add_argument("--no-cache", action="store_true", help="Bypass the LLM suggestion and image description caches for this run.")
+    parser.add_argument("--clear-cache", action="store_true", help="Empty the LLM suggestion and image description caches before running.")
+    parser.add_argument("--trace", action="store_true", help="Record per-stage timings to the trace and metrics files and print a summary.")
+
+    subparsers = parser.add_subparsers(dest="command")
+    search_parser = subparsers.add_parser("search", help="Full-text search over the notes in the vault.")
+    search_parser.add_argument("query", nargs="+", help="Search terms.")
+    search_parser.add_argument("-n", "--limit", type=int, default=SEARCH_RESULT_LIMIT, help="Maximum number of results.")
+    regarden_parser = subparsers.add_parser("regarden", help="Regenerate the frontmatter of notes already in the vault whose body, prompt version or model changed since their last pass.")
+    regarden_parser.add_argument("--force", action="store_true", help="Regenerate every note, changed or not.")
+    regarden_parser.add_argument("--budget", type=int, default=REGARDEN_MAX_LLM_REQUESTS, help="Maximum LLM requests for this run (0 for no cap); the remaining notes wait for the next run.")
+    regarden_parser.add_argument("--workers", type=int, default=REGARDEN_WORKERS, help="Notes regenerated concurrently.")
+    return parser.parse_args(argv)
+
+def search(query: str, limit: int):
+    start = time.perf_counter()
+    results = search_index.search(query, limit)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+
+    for rank, result in enumerate(results, start=1):
+        print(f"{rank:2}. {result.title} ({result.path}) [score: {result.score:.2f}]")
+        print(f"    {' '.join(result.snippet.split())}")
+    print(f"{len(results)} results in {elapsed_ms:.1f} ms.")
+
+def regarden(force: bool, budget: int | None, workers: int):
+    from pkm_gardener.core_modules.regardener import regarden as run_regarden
+    start = time.perf_counter()
+    counts = run_regarden(force=force, max_llm_requests=budget or None, workers=workers)
+    print(f"Re-gardening finished in {time.perf_counter() - start:.1f} s: {counts['regenerated']} notes regenerated, "
+          f"{counts['unchanged']} unchanged, {counts['failed']} failed, {counts['skipped']} skipped, {counts['deferred']} left for the next run.")
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.command == "search":
+        search(" ".join(args.query), args.limit)
+        return
+
+    if args.clear_cache or args.no_cache:
+        # Not imported at startup: the image pipeline only loads with the first image
+        from pkm_gardener.core_modules.image_preprocessor import image_cache
+    if args.clear_cache:
+        llm_cache.clear()
+        image_cache.clear()
+        print("LLM caches cleared.")
+    if args.no_cache:
+        llm_cache.enabled = False
+        image_cache.enabled = False
+    if args.trace:
+        tracer.enabled = True
+    if args.command == "regarden":
+        regarden(args.force, args.budget, args.workers)
+    elif args.rebuild_index:
+        count = rebuild_from_vault()
+        rebuild_search_index()
+        folder_classifier.rebuild()
+        rebuild_duplicate_index()
+        link_graph.rebuild()
+        print(f"Vault and search indexes rebuilt from {count} notes.")
+    elif args.watch:
+        watch()
+    else:
+        run_pipeline()
 
 if __name__ == "__main__":
-    run_pipeline()
+    main()
@@ -1,69 +1,367 @@
+import importlib
+import itertools
 import os
-import shutil
+import queue
+import threading
+from typing import Iterable
 
-from pkm_gardener.config import INBOX_PATH, RESOURCES_PATH, AREAS_PATH, PROJECTS_PATH, DRY_RUN
-from pkm_gardener.core_modules import ingestor, text_processor, vision_processor, document_processor, indexer, router
+from pkm_gardener.config import (
+    PIPELINE_CONCURRENT, DEDUPE_ENABLED, DEDUPE_WORKERS, EXTRACT_WORKERS, LLM_WORKERS, ROUTE_WORKERS, STAGE_QUEUE_SIZE, MAX_RESIDENT_BYTES,
+    LLM_BATCHING_ENABLED, LLM_BATCH_MAX_DOC_CHARS, LLM_BATCH_CHAR_BUDGET, LLM_BATCH_MAX_DOCS, LLM_BATCH_WAIT_SECONDS,
+)
+from pkm_gardener.core_modules import ingestor, indexer, router, suggester
+from pkm_gardener.core_modules.deduplicator import DuplicateChecker, resolve_duplicate
+from pkm_gardener.core_modules.folder_classifier import folder_classifier
+from pkm_gardener.core_modules.inbox_leases import InboxLease
+from pkm_gardener.core_modules.folder_taxonomy import folder_taxonomy
+from pkm_gardener.core_modules.link_graph import link_graph
+from pkm_gardener.core_modules.vault_index import seed_from_vault
 from pkm_gardener.types import ProcessingJob
+from pkm_gardener.utils.llm import llm_cache
+from pkm_gardener.utils.prompts import prompt_stats
+from pkm_gardener.utils.tracing import tracer
+
+# Maps each file type to the processor module responsible for extracting its content.
+# Processors are imported on first use, so a run only loads the libraries its files need.
+PROCESSORS = {
+    "text": "pkm_gardener.core_modules.text_processor",
+    "image": "pkm_gardener.core_modules.vision_processor",
+    "pdf": "pkm_gardener.core_modules.vision_processor",
+    "csv": "pkm_gardener.core_modules.document_processor",
+    "document": "pkm_gardener.core_modules.document_processor",
+}
+
+# Marks the end of the job stream flowing through a stage queue.
+_END_OF_STREAM = object()
+
+# Jobs in these states skip every remaining stage.
+_FINISHED_STATUSES = ("failure", "duplicate")
 
 def get_destination_folders():
-    """Returns a list of all possible destination folders (relative to PKM_ROOT)."""
-    resource_folders = [os.path.join("03_Resources", d) for d in os.listdir(RESOURCES_PATH) if os.path.isdir(os.path.join(RESOURCES_PATH, d))]
-    area_folders = [os.path.join("02_Areas", d) for d in os.listdir(AREAS_PATH) if os.path.isdir(os.path.join(AREAS_PATH, d))]
-    project_folders = [os.path.join("01_Projects", d) for d in os.listdir(PROJECTS_PATH) if os.path.isdir(os.path.join(PROJECTS_PATH, d))]
-    
-    # Add the base paths themselves
-    resource_folders.append("03_Resources")
-    area_folders.append("02_Areas")
-    project_folders.append("01_Projects")
-
-    return resource_folders + area_folders + project_folders
-
-def run_pipeline():
+    """Returns a list of all possible destination folders (relative to PKM_ROOT), at any depth."""
+    return folder_taxonomy.scan()
+
+class FolderLocks:
+    """
+    Hands out one lock per destination folder, so that the index update and the routing
+    of a note are never interleaved with another note written into the same folder.
+    """
+    def __init__(self):
+        self._locks = {}
+        self._guard = threading.Lock()
+
+    def get(self, folder_path: str) -> threading.Lock:
+        key = os.path.normcase(os.path.abspath(folder_path))
+        with self._guard:
+            if key not in self._locks:
+                self._locks[key] = threading.Lock()
+            return self._locks[key]
+
+class ByteBudget:
+    """
+    Bounds the total size of the files in flight through the pipeline. A file larger than
+    the whole budget waits until nothing else is resident and is then processed on its own.
+    """
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._in_use = 0
+        self._condition = threading.Condition()
+
+    def _charge(self, job: ProcessingJob) -> int:
+        return min(job.content_size, self.max_bytes)
+
+    def acquire(self, job: ProcessingJob):
+        charge = self._charge(job)
+        with self._condition:
+            while self._in_use and self._in_use + charge > self.max_bytes:
+                self._condition.wait()
+            self._in_use += charge
+
+    def release(self, job: ProcessingJob):
+        with self._condition:
+            self._in_use -= self._charge(job)
+            self._condition.notify_all()
+
+def check_duplicate(job: ProcessingJob, duplicate_checker: DuplicateChecker, folder_locks: FolderLocks) -> ProcessingJob:
+    """Stage 1b: short-circuits exact and near duplicates of existing notes before any processing."""
+    match = duplicate_checker.check(job)
+    if match is None:
+        return job
+    return resolve_duplicate(job, match, folder_locks.get)
+
+def extract_content(job: ProcessingJob) -> ProcessingJob:
+    """Stage 2: extracts the text for the LLM using the processor for the job's file type."""
+    processor_module = PROCESSORS.get(job.file_type)
+    if processor_module is None:
+        job.status = "failure"
+        job.error_message = f"Unsupported file type: {job.file_type}"
+        return job
+    job.extracted_content = importlib.import_module(processor_module).extract(job)
+    return job
+
+def request_suggestions(job: ProcessingJob, destination_folders_relative: list) -> ProcessingJob:
+    """Stage 3: asks the LLM for metadata, filename, folder and summary."""
+    return suggester.apply_suggestions(job, job.extracted_content, destination_folders_relative)
+
+def request_suggestions_batch(jobs: list[ProcessingJob], destination_folders_relative: list) -> list[ProcessingJob]:
+    """Stage 3 (batched): asks the LLM for suggestions for several small jobs in one request."""
+    return suggester.apply_suggestions_batch(jobs, destination_folders_relative)
+
+def commit_job(job: ProcessingJob, folder_locks: FolderLocks) -> ProcessingJob:
+    """Stage 4: routes the note and updates the index, serialized per destination folder."""
+    if job.status != "success":
+        return job
+    with folder_locks.get(job.suggested_folder_path):
+        with tracer.span("route", job):
+            router.file_note(job)
+        if job.status == "success":
+            with tracer.span("index", job):
+                indexer.update_index(job)
+    return job
+
+def _run_step(stage_name: str, step, job: ProcessingJob) -> ProcessingJob:
+    """Runs a single stage on a job, turning any exception into a job failure."""
+    if job.status in _FINISHED_STATUSES:
+        return job
+    try:
+        with tracer.span(stage_name, job) as span:
+            job = step(job)
+            span.set(status=job.status)
+        return job
+    except Exception as e:
+        job.status = "failure"
+        job.error_message = f"An unexpected error occurred during {stage_name}: {e}"
+        print(f"An unexpected error occurred for {job.original_filename}: {e}")
+        return job
+
+def _run_batch_step(stage_name: str, step, jobs: list[ProcessingJob]) -> list[ProcessingJob]:
+    """Runs a batched stage on a list of jobs, turning any exception into a failure of the whole batch."""
+    pending = [job for job in jobs if job.status not in _FINISHED_STATUSES]
+    if pending:
+        try:
+            with tracer.span(stage_name, batch_size=len(pending), files=[job.original_filename for job in pending]):
+                step(pending)
+        except Exception as e:
+            for job in pending:
+                job.status = "failure"
+                job.error_message = f"An unexpected error occurred during {stage_name}: {e}"
+            print(f"An unexpected error occurred for a batch of {len(pending)} files: {e}")
+    return jobs
+
+def _start_stage(stage_name: str, step, workers: int, in_queue: queue.Queue, out_queue: queue.Queue, batched: bool = False) -> list:
+    """
+    Starts `workers` threads that pull jobs from `in_queue`, run `step` on them and push the
+    result to `out_queue`. The end-of-stream marker is forwarded once every worker has drained.
+    With `batched`, each item pulled is a list of jobs and each job is pushed on individually.
+    """
+    remaining = [workers]
+    remaining_lock = threading.Lock()
+
+    def worker():
+        while True:
+            job = in_queue.get()
+            if job is _END_OF_STREAM:
+                in_queue.put(_END_OF_STREAM) # Let the sibling workers see it too
+                break
+            if batched:
+                for finished_job in _run_batch_step(stage_name, step, job):
+                    out_queue.put(finished_job)
+            else:
+                out_queue.put(_run_step(stage_name, step, job))
+        with remaining_lock:
+            remaining[0] -= 1
+            is_last = remaining[0] == 0
+        if is_last:
+            out_queue.put(_END_OF_STREAM)
+
+    threads = [
+        threading.Thread(target=worker, name=f"{stage_name}-{i}", daemon=True)
+        for i in range(max(1, workers))
+    ]
+    remaining[0] = len(threads)
+    for thread in threads:
+        thread.start()
+    return threads
+
+def _is_batchable(job: ProcessingJob) -> bool:
+    return job.status not in _FINISHED_STATUSES and len(job.extracted_content or "") <= LLM_BATCH_MAX_DOC_CHARS
+
+def _start_batcher(in_queue: queue.Queue, out_queue: queue.Queue) -> threading.Thread:
+    """
+    Starts a thread that groups small extracted jobs into batches for the LLM stage.
+    A batch is sent once it reaches the character budget or document limit, or once no new
+    job has arrived for LLM_BATCH_WAIT_SECONDS. Large and failed jobs pass through alone.
+    """
+    def batcher():
+        batch, batch_chars = [], 0
+        while True:
+            try:
+                job = in_queue.get(timeout=LLM_BATCH_WAIT_SECONDS)
+            except queue.Empty:
+                if batch:
+                    out_queue.put(batch)
+                    batch, batch_chars = [], 0
+                continue
+            if job is _END_OF_STREAM:
+                if batch:
+                    out_queue.put(batch)
+                out_queue.put(_END_OF_STREAM)
+                break
+            if not _is_batchable(job):
+                out_queue.put([job])
+                continue
+            job_chars = len(job.extracted_content)
+            if batch and (batch_chars + job_chars > LLM_BATCH_CHAR_BUDGET or len(batch) >= LLM_BATCH_MAX_DOCS):
+                out_queue.put(batch)
+                batch, batch_chars = [], 0
+            batch.append(job)
+            batch_chars += job_chars
+
+    thread = threading.Thread(target=batcher, name="LLM-batcher", daemon=True)
+    thread.start()
+    return thread
+
+def _report(job: ProcessingJob):
+    tracer.add("jobs", status=job.status)
+    if job.status == "duplicate":
+        print(f"Skipped {job.original_filename}: {job.error_message}")
+    elif job.status != "success":
+        print(f"Job for {job.original_filename} failed: {job.error_message}")
+        # The file is moved to 00_Inbox/_failed for manual review once the run ends
+    print(f"Finished processing {job.original_filename}. Status: {job.status}")
+
+def _run_sequential(jobs, destination_folders_relative: list, duplicate_checker: DuplicateChecker | None) -> list[ProcessingJob]:
+    """Processes jobs one at a time, running every stage in order."""
+    folder_locks = FolderLocks()
+    finished = []
+    for job in jobs:
+        print(f"--- Processing: {job.original_filename} ---")
+        if duplicate_checker is not None:
+            job = _run_step("dedupe", lambda j: check_duplicate(j, duplicate_checker, folder_locks), job)
+        job = _run_step("extract", extract_content, job)
+        job = _run_step("LLM", lambda j: request_suggestions(j, destination_folders_relative), job)
+        job = _run_step("routing", lambda j: commit_job(j, folder_locks), job)
+        _report(job)
+        finished.append(job)
+    return finished
+
+def _run_concurrent(jobs, destination_folders_relative: list, duplicate_checker: DuplicateChecker | None) -> list[ProcessingJob]:
+    """
+    Processes jobs through bounded queues connecting the dedupe, extract, LLM and index/route
+    stages, each served by its own pool of worker threads.
+    """
+    folder_locks = FolderLocks()
+    byte_budget = ByteBudget(MAX_RESIDENT_BYTES)
+    extract_queue = queue.Queue(maxsize=STAGE_QUEUE_SIZE)
+    if duplicate_checker is not None:
+        ingest_queue = queue.Queue(maxsize=STAGE_QUEUE_SIZE)
+        _start_stage("dedupe", lambda j: check_duplicate(j, duplicate_checker, folder_locks), DEDUPE_WORKERS, ingest_queue, extract_queue)
+    else:
+        ingest_queue = extract_queue
+    llm_queue = queue.Queue(maxsize=STAGE_QUEUE_SIZE)
+    route_queue = queue.Queue(maxsize=STAGE_QUEUE_SIZE)
+    done_queue = queue.Queue()
+
+    _start_stage("extract", extract_content, EXTRACT_WORKERS, extract_queue, llm_queue)
+    if LLM_BATCHING_ENABLED:
+        batch_queue = queue.Queue(maxsize=STAGE_QUEUE_SIZE)
+        _start_batcher(llm_queue, batch_queue)
+        _start_stage("LLM", lambda batch: request_suggestions_batch(batch, destination_folders_relative), LLM_WORKERS, batch_queue, route_queue, batched=True)
+    else:
+        _start_stage("LLM", lambda j: request_suggestions(j, destination_folders_relative), LLM_WORKERS, llm_queue, route_queue)
+    _start_stage("routing", lambda j: commit_job(j, folder_locks), ROUTE_WORKERS, route_queue, done_queue)
+
+    # Stage 1: feed the ingested jobs in from a separate thread so results can be drained meanwhile
+    ingest_errors = []
+
+    def ingest():
+        try:
+            for job in jobs:
+                byte_budget.acquire(job)
+                print(f"--- Processing: {job.original_filename} ---")
+                ingest_queue.put(job)
+        except BaseException as e:
+            ingest_errors.append(e) # Re-raised once the jobs already queued have drained
+        finally:
+            ingest_queue.put(_END_OF_STREAM)
+
+    threading.Thread(target=ingest, name="ingest", daemon=True).start()
+
+    finished = []
+    while True:
+        job = done_queue.get()
+        if job is _END_OF_STREAM:
+            break
+        byte_budget.release(job)
+        _report(job)
+        finished.append(job)
+    if ingest_errors:
+        raise ingest_errors[0]
+    return finished
+
+def run_pipeline(jobs: Iterable[ProcessingJob] | None = None) -> list[ProcessingJob]:
     """
     Manages the overall workflow of the application.
+    Processes the given jobs, or every file in the inbox when none are given.
     """
     print("Starting PKM Gardener pipeline...")
+    tracer.start_run()
+    prompt_stats.reset()
+    lease = InboxLease()
+    seed_from_vault()
+    indexer.recover_interrupted_moves(in_progress=lease.is_held)
+    lease.reclaim_stale()
+    try:
+        return _run_claimed(jobs, lease)
+    finally:
+        lease.close()
 
+def _run_claimed(jobs: Iterable[ProcessingJob] | None, lease: InboxLease) -> list[ProcessingJob]:
+    """Runs the pipeline on the jobs whose files this worker manages to claim."""
     destination_folders_relative = get_destination_folders()
     print(f"Available destination folders: {destination_folders_relative}")
 
-    jobs = ingestor.find_new_files()
+    # Jobs are ingested lazily; peek at the first one to detect an empty inbox
+    if jobs is None:
+        jobs = ingestor.find_new_files()
+    # Files another worker claimed first are skipped
+    jobs = (job for job in jobs if lease.claim(job))
+    first_job = next(jobs, None)
 
-    if not jobs:
+    if first_job is None:
         print("Inbox is empty. Nothing to process.")
-        return
+        return []
 
-    print(f"Found {len(jobs)} files to process.")
+    jobs = itertools.chain([first_job], jobs)
+    duplicate_checker = DuplicateChecker() if DEDUPE_ENABLED else None
 
-    for job in jobs:
-        print(f"--- Processing: {job.original_filename} ---")
-        try:
-            if job.file_type == "text":
-                processed_job = text_processor.process(job, destination_folders_relative)
-            elif job.file_type in ["image", "pdf"]:
-                processed_job = vision_processor.process(job, destination_folders_relative)
-            elif job.file_type in ["csv", "document"]:
-                processed_job = document_processor.process(job, destination_folders_relative)
-            else:
-                job.status = "failure"
-                job.error_message = f"Unsupported file type: {job.file_type}"
-                processed_job = job
+    if PIPELINE_CONCURRENT:
+        finished = _run_concurrent(jobs, destination_folders_relative, duplicate_checker)
+    else:
+        finished = _run_sequential(jobs, destination_folders_relative, duplicate_checker)
+    for job in finished:
+        lease.release(job)
 
-            if processed_job.status == "success":
-                indexer.update_index(processed_job)
-                router.file_note(processed_job)
-            else:
-                print(f"Job for {processed_job.original_filename} failed: {processed_job.error_message}")
-                # If processing failed, move the file back to inbox or a failed folder
-                if not DRY_RUN:
-                    # Optionally, move to a 'failed' subfolder in inbox or just leave it
-                    pass # For now, leave it in inbox if failed
+    # Regenerate the _index.md of each folder that received notes, once for the whole run
+    indexer.flush_folder_indexes()
+    # Persist the folder centroids and link graph updated by the notes routed in this run
+    folder_classifier.save()
+    link_graph.save()
 
-        except Exception as e:
-            job.status = "failure"
-            job.error_message = f"An unexpected error occurred during processing: {e}"
-            print(f"An unexpected error occurred for {job.original_filename}: {e}")
-        finally:
-            print(f"Finished processing {job.original_filename}. Status: {job.status}")
+    gauges = {"last_run_files": (len(finished), "Files processed by the last run.")}
+    if llm_cache.enabled:
+        stats = llm_cache.stats()
+        print(f"LLM cache: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.0%} hit rate), {stats['entries']} entries stored.")
+        gauges["llm_cache_hit_ratio"] = (stats['hit_rate'], "Share of LLM suggestion lookups served from the cache.")
+        gauges["llm_cache_entries"] = (stats['entries'], "Entries stored in the LLM suggestion cache.")
+    if prompt_stats.requests:
+        print(prompt_stats.summary())
+        gauges["llm_prompt_tokens_per_request"] = (prompt_stats.prompt_tokens / prompt_stats.requests, "Average estimated tokens of the last run's metadata prompts.")
+    tracer.finish_run(gauges)
+
+    duplicates = sum(1 for job in finished if job.status == "duplicate")
+    if duplicates:
+        print(f"Skipped {duplicates} duplicate file(s) without calling the LLM.")
 
-    print("PKM Gardener pipeline finished.")
\ No newline at end of file
+    print(f"PKM Gardener pipeline finished. Processed {len(finished)} files.")
+    return finished
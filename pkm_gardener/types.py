@@ -1,16 +1,83 @@
+import mmap
+from contextlib import contextmanager
 from dataclasses import dataclass, field
 from typing import Optional, Dict, Any
 
+@dataclass
+class ContentHandle:
+    """
+    A lazy reference to a file's content. Nothing is read until a processor asks for it,
+    so holding many jobs in memory costs only their paths and sizes.
+    """
+    path: str
+    size: int
+
+    def read_bytes(self) -> bytes:
+        with open(self.path, 'rb') as f:
+            return f.read()
+
+    def read_text(self, errors: str = 'ignore') -> str:
+        with self.view() as data:
+            return str(data, 'utf-8', errors)
+
+    def read_header(self, n: int) -> bytes:
+        with open(self.path, 'rb') as f:
+            return f.read(n)
+
+    @contextmanager
+    def view(self):
+        """Yields a read-only, mmap-backed memoryview of the file (empty files yield b"")."""
+        if self.size == 0:
+            yield memoryview(b"")
+            return
+        with open(self.path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            data = memoryview(mapped)
+            try:
+                yield data
+            finally:
+                data.release()
+
 @dataclass
 class ProcessingJob:
     original_filepath: str
     original_filename: str
-    content: str | bytes
+    content: ContentHandle | str | bytes
     file_type: str
+    extracted_content: Optional[str] = None # Text handed to the LLM, produced by the extract stage
     metadata: Dict[str, Any] = field(default_factory=dict)
     metadata_str: Optional[str] = None # To store the YAML string from LLM
     suggested_filename: Optional[str] = None
     suggested_folder_path: Optional[str] = None
+    final_filepath: Optional[str] = None # Where the router actually wrote the note
     summary: Optional[str] = None
-    status: str = "pending"  # 'pending', 'success', 'failure', 'needs_review'
+    status: str = "pending"  # 'pending', 'success', 'failure', 'needs_review', 'duplicate'
     error_message: Optional[str] = None
+
+    @property
+    def content_size(self) -> int:
+        """Size of the job's content in bytes, without loading it."""
+        if isinstance(self.content, ContentHandle):
+            return self.content.size
+        return len(self.content)
+
+    def content_source(self) -> str | bytes:
+        """Returns the file path when the content is lazily backed by a file, else the raw bytes."""
+        if isinstance(self.content, ContentHandle):
+            return self.content.path
+        return self.content_bytes()
+
+    def content_bytes(self) -> bytes:
+        """Loads the job's content as bytes."""
+        if isinstance(self.content, ContentHandle):
+            return self.content.read_bytes()
+        if isinstance(self.content, str):
+            return self.content.encode('utf-8')
+        return self.content
+
+    def content_text(self, errors: str = 'ignore') -> str:
+        """Loads the job's content as UTF-8 text."""
+        if isinstance(self.content, ContentHandle):
+            return self.content.read_text(errors)
+        if isinstance(self.content, str):
+            return self.content
+        return self.content.decode('utf-8', errors=errors)
@@ -0,0 +1,45 @@
+import re
+
+from pkm_gardener.utils.llm_client import estimate_tokens
+
+# Structural boundaries, from coarsest to finest: pages (form feeds, as produced by the PDF
+# extractor), Markdown headings, paragraphs, then sentences.
+_BOUNDARIES = [
+    re.compile(r'\f'),
+    re.compile(r'\n(?=#{1,6} )'),
+    re.compile(r'\n\s*\n'),
+    re.compile(r'(?<=[.!?])\s+'),
+]
+
+def _split(text: str, max_tokens: int, level: int) -> list[str]:
+    """Recursively splits text on ever finer boundaries until every segment fits the budget."""
+    if estimate_tokens(text) <= max_tokens:
+        return [text]
+    if level == len(_BOUNDARIES):
+        # No boundary left: cut at a fixed width (about four characters per token)
+        width = max_tokens * 4
+        return [text[i:i + width] for i in range(0, len(text), width)]
+
+    segments = []
+    for piece in _BOUNDARIES[level].split(text):
+        if piece.strip():
+            segments.extend(_split(piece, max_tokens, level + 1))
+    return segments
+
+def split_into_chunks(text: str, max_tokens: int) -> list[str]:
+    """
+    Splits long text into chunks of at most `max_tokens` (estimated) tokens, cutting on
+    pages, headings, paragraphs or sentences, and packing neighbouring segments together.
+    """
+    chunks = []
+    current, current_tokens = [], 0
+    for segment in _split(text, max_tokens, 0):
+        segment_tokens = estimate_tokens(segment)
+        if current and current_tokens + segment_tokens > max_tokens:
+            chunks.append("\n\n".join(current))
+            current, current_tokens = [], 0
+        current.append(segment.strip())
+        current_tokens += segment_tokens
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
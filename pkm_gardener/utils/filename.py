@@ -1,5 +1,8 @@
+import itertools
 import re
 import os
+import shutil
+from typing import Iterator
 
 def sanitize_filename(filename: str) -> str:
     """
@@ -15,20 +18,122 @@ def sanitize_filename(filename: str) -> str:
     filename = filename.strip('.- ')
     return filename
 
-def resolve_filename_conflict(filepath: str) -> str:
+def candidate_filenames(filepath: str) -> Iterator[str]:
+    """`filepath`, then the same name with a number appended (e.g., file.md -> file-1.md, file-2.md...)."""
+    directory, filename = os.path.split(filepath)
+    name, ext = os.path.splitext(filename)
+    yield filepath
+    for i in itertools.count(1):
+        yield os.path.join(directory, f"{name}-{i}{ext}")
+
+def create_placeholder(filepath: str) -> bool:
     """
-    Resolves filename conflicts by appending a number (e.g., file.md -> file-1.md).
+    Claims `filepath` by creating it as an empty file with O_EXCL. Creation is atomic, so two
+    writers can never both claim a name. Returns False if the file already exists.
     """
-    if not os.path.exists(filepath):
-        return filepath
+    try:
+        os.close(os.open(filepath, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644))
+        return True
+    except FileExistsError:
+        return False
 
+def remove_if_exists(filepath: str):
+    """Removes a file, doing nothing if it is already gone (e.g. removed by another worker)."""
+    try:
+        os.remove(filepath)
+    except FileNotFoundError:
+        pass
+
+def temp_path_for(filepath: str, suffix: str = "") -> str:
+    """
+    The temp file a write-then-rename of `filepath` writes first: hidden, next to it, and
+    named after the process, so processes sharing a vault never write the same temp file.
+    """
     directory, filename = os.path.split(filepath)
-    name, ext = os.path.splitext(filename)
+    return os.path.join(directory, f".{filename}.{os.getpid()}.tmp{suffix}")
+
+def fsync_directory(directory: str):
+    """Makes a rename or creation in `directory` durable. A no-op where directories can't be opened (Windows)."""
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+def _copy_all(copy, src_fd: int, dst_fd: int, size: int):
+    offset = 0
+    while offset < size:
+        copied = copy(src_fd, dst_fd, offset, size - offset)
+        if copied == 0:
+            break
+        offset += copied
 
-    i = 1
-    while True:
-        new_name = f"{name}-{i}{ext}"
-        new_filepath = os.path.join(directory, new_name)
-        if not os.path.exists(new_filepath):
-            return new_filepath
-        i += 1
+def _kernel_copies():
+    """The kernel-side ways to copy a file, in order; copy_file_range may even share the blocks (reflinks)."""
+    if hasattr(os, "copy_file_range"):
+        yield lambda src_fd, dst_fd, offset, count: os.copy_file_range(src_fd, dst_fd, count, offset, offset)
+    if hasattr(os, "sendfile"):
+        yield lambda src_fd, dst_fd, offset, count: os.sendfile(dst_fd, src_fd, offset, count)
+
+def copy_file(source: str, destination: str):
+    """
+    Copies a file and fsyncs the copy without passing its bytes through Python, using
+    copy_file_range or sendfile, and falls back to a chunked copy where neither works.
+    """
+    with open(source, 'rb') as src, open(destination, 'wb') as dst:
+        size = os.fstat(src.fileno()).st_size
+        for copy in _kernel_copies():
+            try:
+                _copy_all(copy, src.fileno(), dst.fileno(), size)
+                break
+            except OSError:
+                # Unsupported for this pair of files (e.g. EXDEV, EINVAL): start over with the next way
+                dst.seek(0)
+                dst.truncate()
+        else:
+            shutil.copyfileobj(src, dst)
+        os.fsync(dst.fileno())
+
+def link_file_atomic(source: str, filepath: str):
+    """
+    Puts the file at `source` at `filepath` without reading it, atomically like
+    `write_file_atomic`: a hard link, or a `copy_file` on another filesystem (or one without
+    hard links). `source` is left in place; unlinking it afterwards completes a move.
+    """
+    directory = os.path.dirname(filepath)
+    temp_path = temp_path_for(filepath)
+    try:
+        try:
+            os.link(source, temp_path)
+        except OSError:
+            copy_file(source, temp_path)
+        os.replace(temp_path, filepath)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    fsync_directory(directory)
+
+def write_file_atomic(filepath: str, data: str):
+    """
+    Writes `data` to a temp file next to `filepath`, fsyncs it and renames it into place,
+    so readers and crashes only ever see the old file or the complete new one.
+    """
+    directory = os.path.dirname(filepath)
+    temp_path = temp_path_for(filepath)
+    try:
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, filepath)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    fsync_directory(directory)
@@ -1,4 +1,33 @@
-import yaml
+import functools
+import re
+from typing import Iterable, Iterator
+
+from pkm_gardener.config import FRONTMATTER_MAX_BYTES, FRONTMATTER_READ_WORKERS
+
+# Blocks read from the start of a note while looking for the end of its frontmatter
+_READ_BLOCK_BYTES = 4096
+
+@functools.cache
+def _yaml():
+    """
+    Returns (yaml, Loader, Dumper), preferring the libyaml C implementations, which parse and
+    emit an order of magnitude faster than the pure-Python ones. yaml is imported on first use,
+    keeping it off the startup path.
+    """
+    import yaml
+    return yaml, getattr(yaml, "CSafeLoader", yaml.SafeLoader), getattr(yaml, "CSafeDumper", yaml.SafeDumper)
+
+def load_yaml(text: str):
+    """Parses a YAML document with the safe loader. Raises ValueError on invalid YAML."""
+    yaml, loader, _ = _yaml()
+    try:
+        return yaml.load(text, Loader=loader)
+    except yaml.YAMLError as e:
+        raise ValueError(f"Invalid YAML: {e}") from e
+
+def dump_yaml(data) -> str:
+    yaml, _, dumper = _yaml()
+    return yaml.dump(data, Dumper=dumper, sort_keys=False, default_flow_style=False, allow_unicode=True)
 
 def construct_frontmatter_string(metadata: dict) -> str:
     """
@@ -8,8 +37,7 @@ def construct_frontmatter_string(metadata: dict) -> str:
     if 'tags' in metadata and isinstance(metadata['tags'], list):
         metadata['tags'] = sorted(list(set(metadata['tags'])))
 
-    yaml_string = yaml.dump(metadata, sort_keys=False, default_flow_style=False)
-    return f"---\n{yaml_string}---\n"
+    return f"---\n{dump_yaml(metadata)}---\n"
 
 def validate_and_normalize_metadata(metadata: dict) -> dict:
     """
@@ -37,3 +65,61 @@ def validate_and_normalize_metadata(metadata: dict) -> dict:
         metadata['tags'] = []
 
     return metadata
+
+_FRONTMATTER_PATTERN = re.compile(r'^---[ \t]*\r?\n(.*?)\r?\n---[ \t]*(?:\r?\n|$)', re.DOTALL)
+
+def split_frontmatter(note_text: str) -> tuple[dict, str]:
+    """
+    Splits a note into its frontmatter dictionary and its body.
+    Notes without a valid frontmatter block get an empty dictionary and the full text as body.
+    """
+    match = _FRONTMATTER_PATTERN.match(note_text)
+    if not match:
+        return {}, note_text
+    try:
+        metadata = load_yaml(match.group(1))
+    except ValueError:
+        return {}, note_text
+    if not isinstance(metadata, dict):
+        return {}, note_text
+    return metadata, note_text[match.end():]
+
+_CLOSING_LINE = re.compile(rb'\n---[ \t]*\r?\n') # A closing line at end of file is found once the read hits EOF
+
+def read_frontmatter(note_path: str, max_bytes: int = FRONTMATTER_MAX_BYTES) -> dict:
+    """
+    Reads only a note's frontmatter: the file is read block by block until the closing `---`
+    line, and at most `max_bytes`, so the cost does not depend on the length of the body.
+    Notes without a valid frontmatter block, or with one longer than `max_bytes`, give {}.
+    """
+    with open(note_path, 'rb') as f:
+        header = f.read(_READ_BLOCK_BYTES)
+        if not header.startswith(b'---'):
+            return {}
+        # Search from the end of the opening line, so "---" itself is not taken as the closing line
+        search_from = 3
+        while not _CLOSING_LINE.search(header, search_from):
+            if len(header) >= max_bytes:
+                return {}
+            block = f.read(_READ_BLOCK_BYTES)
+            if not block:
+                break
+            search_from = max(3, len(header) - 8)
+            header += block
+    return split_frontmatter(header[:max_bytes].decode('utf-8', errors='ignore'))[0]
+
+def _read_frontmatter_or_empty(note_path: str) -> tuple[str, dict]:
+    try:
+        return note_path, read_frontmatter(note_path)
+    except OSError as e:
+        print(f"Error reading frontmatter of {note_path}: {e}")
+        return note_path, {}
+
+def iter_frontmatter(note_paths: Iterable[str], workers: int = FRONTMATTER_READ_WORKERS) -> Iterator[tuple[str, dict]]:
+    """
+    Yields (path, metadata) for many notes, reading their headers on a thread pool, in the
+    order of `note_paths`. Unreadable notes yield an empty dictionary.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        yield from executor.map(_read_frontmatter_or_empty, note_paths)
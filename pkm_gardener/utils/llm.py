@@ -1,111 +1,220 @@
-import google.generativeai as genai
-import yaml
 import re
-from pkm_gardener.config import GEMINI_API_KEY, GEMINI_MODEL_NAME
+import os
+from pkm_gardener.config import (
+    CACHE_DIR, LLM_CACHE_ENABLED, LLM_CACHE_MAX_ENTRIES, LLM_CACHE_MAX_AGE_DAYS,
+    MAX_CONTENT_TOKENS, CHUNK_TOKENS, CHUNK_SUMMARY_WORKERS,
+)
+from pkm_gardener.utils.chunking import split_into_chunks
+from pkm_gardener.utils.frontmatter import load_yaml
+from pkm_gardener.utils.llm_cache import LLMCache
+from pkm_gardener.utils.llm_client import estimate_tokens, get_client
+from pkm_gardener.utils.prompts import prepare_content, build_prompt, build_batch_prompt, prompt_stats
+
+# Bump whenever the prompt or the parsing below changes, so stale cached answers are not reused.
+PROMPT_TEMPLATE_VERSION = 3
+
+llm_cache = LLMCache(
+    os.path.join(CACHE_DIR, "llm_cache.sqlite3"),
+    max_entries=LLM_CACHE_MAX_ENTRIES,
+    max_age_seconds=LLM_CACHE_MAX_AGE_DAYS * 24 * 3600,
+    enabled=LLM_CACHE_ENABLED,
+)
+
+_CHUNK_SUMMARY_PROMPT = """Summarize the following section (part {index} of {total}) of a longer document in one short paragraph.
+Keep the key topics, names, organizations and any URLs, so the summary can be used to classify the whole document.
+Do not add any explanation. Output only the summary.
+
+**Section:**
+```
+{chunk}
+```
+"""
+
+# Guards against condensing forever if summaries do not get shorter
+_MAX_REDUCE_ROUNDS = 3
+
+_RESULT_MARKER = re.compile(r'^=== RESULT (\d+) ===\s*$', re.MULTILINE)
+
+def _fallback_suggestions() -> tuple[dict, str, str, str, str, str]:
+    fallback_yaml = {
+        'status': 'triage',
+        'priority': 'P3',
+        'type': 'unknown',
+        'tags': ['#needs-review'],
+        'source': '',
+        'entities': [],
+        'confidence_score': 0.0,
+        'title': 'Untitled'
+    }
+    return fallback_yaml, "Untitled", "unnamed-file.md", "00_Inbox", "Could not be processed.", "failure"
 
-genai.configure(api_key=GEMINI_API_KEY)
-model = genai.GenerativeModel(GEMINI_MODEL_NAME)
+def _cache_key(file_content: str, destination_folders_relative: list) -> str:
+    return LLMCache.make_key(file_content, destination_folders_relative, get_client().backend.model_id, PROMPT_TEMPLATE_VERSION)
 
 def get_llm_suggestions(
     file_content: str, destination_folders_relative: list
 ) -> tuple[dict, str, str, str, str, str]:
     """
-    Uses the Gemini API to get YAML frontmatter, a suggested filename, folder, and summary.
+    Returns LLM suggestions for the content, served from the on-disk cache when possible.
     Returns a tuple of: (parsed_metadata, title, suggested_filename, suggested_folder_relative, summary, status)
     """
-    print("\n--- Sending to LLM ---")
+    cache_key = _cache_key(file_content, destination_folders_relative)
+    cached = llm_cache.get(cache_key)
+    if cached is not None:
+        print("\n--- LLM cache hit ---")
+        return cached
+
+    suggestions = generate_llm_suggestions(file_content, destination_folders_relative)
+    if suggestions[-1] == "success":
+        llm_cache.put(cache_key, suggestions)
+    return suggestions
+
+def get_llm_suggestions_batch(
+    file_contents: list[str], destination_folders_relative: list
+) -> list[tuple[dict, str, str, str, str, str]]:
+    """
+    Returns LLM suggestions for several documents, sending every cache miss in a single request.
+    Documents the batched answer could not be parsed for are retried with single-document calls.
+    Returns one suggestions tuple per document, in the same order.
+    """
+    cache_keys = [_cache_key(content, destination_folders_relative) for content in file_contents]
+    results = [llm_cache.get(key) for key in cache_keys]
+    missing = [i for i, result in enumerate(results) if result is None]
+
+    if len(missing) > 1:
+        batch_results = generate_llm_suggestions_batch(
+            [file_contents[i] for i in missing], destination_folders_relative
+        )
+        for i, suggestions in zip(missing, batch_results):
+            if suggestions[-1] == "success":
+                results[i] = suggestions
+                llm_cache.put(cache_keys[i], suggestions)
+
+    for i, result in enumerate(results):
+        if result is None:
+            # Fall back to a single-document call for anything the batch did not resolve
+            suggestions = generate_llm_suggestions(file_contents[i], destination_folders_relative)
+            if suggestions[-1] == "success":
+                llm_cache.put(cache_keys[i], suggestions)
+            results[i] = suggestions
+    return results
+
+def parse_llm_output(llm_output: str) -> tuple[dict, str, str, str, str, str]:
+    """
+    Parses the four items (YAML, summary, folder, filename) of a single LLM answer.
+    Raises ValueError if the answer does not follow the expected format.
+    """
+    # 1. Find the YAML block
+    yaml_match = re.search(r'^---\s*\n(.*?)\n\s*---', llm_output, re.DOTALL)
+    if not yaml_match:
+        raise ValueError("LLM output did not contain a valid YAML block.")
 
-    prompt = f"""You are an expert librarian and metadata specialist. Your task is to analyze the provided content and generate four items in a strict, specific format.
+    yaml_body = yaml_match.group(1).strip()
+    parsed_yaml = load_yaml(yaml_body)
+    if not isinstance(parsed_yaml, dict):
+        raise ValueError("LLM output YAML is not a valid dictionary.")
 
-**Instructions:**
-1.  **Generate YAML Frontmatter:** Create a valid YAML block with detailed metadata, including a `title`.
-2.  **Generate a Summary:** Write a one-paragraph summary of the content.
-3.  **Suggest a Folder:** Suggest a relative folder path from the provided list. If no suitable folder exists, suggest a new, logical folder path within the PARA structure (e.g., `01_Projects/New-Project-Name`).
-4.  **Suggest a Filename:** Suggest a filename in kebab-case (e.g., `deep-learning-cheatsheet.md`).
+    # 2. Get the rest of the content and split into parts
+    rest_of_output = llm_output[yaml_match.end():].strip()
+    parts = [line.strip() for line in rest_of_output.split('\n') if line.strip()]
 
-**Return these four items, each on a new line, in the following strict order:**
-```
----
-<yaml-keys-and-values>
----
-A one-paragraph summary of the note content.
-relative/path/to/folder
-suggested-filename.md
-```
+    if len(parts) != 3:
+        raise ValueError(f"Expected 3 parts after YAML (summary, folder, filename), but got {len(parts)}: {parts}")
 
-**YAML Rules:**
-- **`title`**: A concise, descriptive title.
-- **`status`**: `active-tool`, `learning`, `archived`, or `triage`.
-- **`priority`**: `P1`, `P2`, `P3`, or `P4`.
-- **`type`**: `repo`, `paper`, `tutorial`, `cheatsheet`, `SOP`, `course`, `website`, `image`, `pdf`, `csv`, or `document`.
-- **`tags`**: A list of 5-7 relevant lowercase, kebab-case tags.
-- **`source`**: The primary URL if the content is from a webpage, otherwise empty.
-- **`entities`**: A list of key people, organizations, or topics mentioned.
-- **`confidence_score`**: A value from 0.0 to 1.0 indicating your confidence in the generated metadata.
-
-**Folder Rules:**
-- **`01_Projects`**: For content related to a specific, time-bound goal.
-- **`02_Areas`**: For content related to an ongoing responsibility.
-- **`03_Resources`**: The default destination for general knowledge and reference material.
-- **Prioritize Existing Folders**: First, try to place the file in one of the existing folders.
-- **Create New Folders**: If no existing folder is a good match, create a new, descriptive folder within the most appropriate PARA category.
-
-**Content to Analyze:**
-```
-{file_content}
-```
+    summary = parts[0]
+    suggested_folder_relative = parts[1]
+    suggested_filename = parts[2]
 
-**List of Valid Destination Folders:**
-```
-{destination_folders_relative}
-```
+    # 3. Get title from YAML
+    title = parsed_yaml.get('title', 'Untitled')
 
-Do not add any explanation. Output only the four requested items, each on its own line, in the specified order.
-"""
+    return parsed_yaml, title, suggested_filename, suggested_folder_relative, summary, "success"
 
-    try:
-        response = model.generate_content(prompt)
-        llm_output = response.text.strip()
-        print("--- LLM Raw Response ---")
-        print(llm_output)
+def condense_content(file_content: str) -> str:
+    """
+    Map-reduce summarization for content too long for one prompt: the content is split into
+    chunks on structural boundaries, the chunks are summarized concurrently, and the joined
+    summaries replace the content. Repeats until the result fits MAX_CONTENT_TOKENS.
+    """
+    for _ in range(_MAX_REDUCE_ROUNDS):
+        if estimate_tokens(file_content) <= MAX_CONTENT_TOKENS:
+            break
+        chunks = split_into_chunks(file_content, CHUNK_TOKENS)
+        print(f"--- Condensing long content: summarizing {len(chunks)} chunks ---")
+        prompts = [
+            _CHUNK_SUMMARY_PROMPT.format(index=i, total=len(chunks), chunk=chunk)
+            for i, chunk in enumerate(chunks, start=1)
+        ]
+        client = get_client()
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=CHUNK_SUMMARY_WORKERS) as executor:
+            summaries = list(executor.map(client.generate, prompts))
+        file_content = "\n\n".join(
+            f"Part {i} of {len(summaries)}: {summary.strip()}" for i, summary in enumerate(summaries, start=1)
+        )
+    return file_content
+
+def generate_llm_suggestions(
+    file_content: str, destination_folders_relative: list
+) -> tuple[dict, str, str, str, str, str]:
+    """
+    Asks the LLM for YAML frontmatter, a suggested filename, folder, and summary.
+    Returns a tuple of: (parsed_metadata, title, suggested_filename, suggested_folder_relative, summary, status)
+    """
+    print("\n--- Sending to LLM ---")
 
-        # More robust parsing
-        # 1. Find the YAML block
-        yaml_match = re.search(r'^---\s*\n(.*?)\n\s*---', llm_output, re.DOTALL)
-        if not yaml_match:
-            raise ValueError("LLM output did not contain a valid YAML block.")
+    try:
+        content = prepare_content(file_content, condense=condense_content)
+    except Exception as e:
+        print(f"Error while condensing long content: {e}")
+        return _fallback_suggestions()
 
-        yaml_body = yaml_match.group(1).strip()
-        parsed_yaml = yaml.safe_load(yaml_body)
-        if not isinstance(parsed_yaml, dict):
-            raise ValueError("LLM output YAML is not a valid dictionary.")
+    prompt = build_prompt(content, destination_folders_relative)
+    prompt_stats.record([file_content], [content], prompt)
 
-        # 2. Get the rest of the content and split into parts
-        rest_of_output = llm_output[yaml_match.end():].strip()
-        parts = [line.strip() for line in rest_of_output.split('\n') if line.strip()]
+    try:
+        llm_output = get_client().generate(prompt)
+        print("--- LLM Raw Response ---")
+        print(llm_output)
 
-        if len(parts) != 3:
-            raise ValueError(f"Expected 3 parts after YAML (summary, folder, filename), but got {len(parts)}: {parts}")
+        return parse_llm_output(llm_output)
 
-        summary = parts[0]
-        suggested_folder_relative = parts[1]
-        suggested_filename = parts[2]
+    except Exception as e:
+        print(f"Error during LLM call or parsing: {e}")
+        return _fallback_suggestions()
 
-        # 3. Get title from YAML
-        title = parsed_yaml.get('title', 'Untitled')
+def generate_llm_suggestions_batch(
+    file_contents: list[str], destination_folders_relative: list
+) -> list[tuple[dict, str, str, str, str, str]]:
+    """
+    Uses a single LLM request to get suggestions for several documents at once, so the
+    instructions and the folder list are only sent once.
+    Returns one suggestions tuple per document; documents whose result is missing or
+    malformed get the failure fallback tuple.
+    """
+    print(f"\n--- Sending batch of {len(file_contents)} documents to LLM ---")
 
-        return parsed_yaml, title, suggested_filename, suggested_folder_relative, summary, "success"
+    contents = [prepare_content(content) for content in file_contents]
+    prompt = build_batch_prompt(contents, destination_folders_relative)
+    prompt_stats.record(file_contents, contents, prompt)
 
+    results = [_fallback_suggestions() for _ in file_contents]
+    try:
+        llm_output = get_client().generate(prompt)
+        print("--- LLM Raw Response ---")
+        print(llm_output)
     except Exception as e:
-        print(f"Error during LLM call or parsing: {e}")
-        fallback_yaml = {
-            'status': 'triage',
-            'priority': 'P3',
-            'type': 'unknown',
-            'tags': ['#needs-review'],
-            'source': '',
-            'entities': [],
-            'confidence_score': 0.0,
-            'title': 'Untitled'
-        }
-        return fallback_yaml, "Untitled", "unnamed-file.md", "00_Inbox", "Could not be processed.", "failure"
+        print(f"Error during batched LLM call: {e}")
+        return results
+
+    # Split the answer on the result markers: [preamble, n1, body1, n2, body2, ...]
+    sections = _RESULT_MARKER.split(llm_output)
+    for number, body in zip(sections[1::2], sections[2::2]):
+        index = int(number) - 1
+        if not 0 <= index < len(file_contents):
+            continue
+        try:
+            results[index] = parse_llm_output(body.strip())
+        except Exception as e:
+            print(f"Error parsing batched result {number}: {e}")
+    return results
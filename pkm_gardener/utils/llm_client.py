@@ -0,0 +1,250 @@
+import abc
+import hashlib
+import random
+import re
+import threading
+import time
+
+from pkm_gardener.config import (
+    GEMINI_API_KEY, GEMINI_MODEL_NAME, LLM_BACKEND, FAKE_LLM_LATENCY, FAKE_LLM_LATENCY_PER_1K_TOKENS,
+    LLM_REQUESTS_PER_MINUTE, LLM_TOKENS_PER_MINUTE, LLM_REQUEST_TIMEOUT,
+    LLM_MAX_RETRIES, LLM_RETRY_BASE_DELAY, LLM_RETRY_MAX_DELAY,
+)
+from pkm_gardener.utils.tracing import tracer
+
+# Gemini charges a fixed number of tokens per image part
+IMAGE_TOKEN_ESTIMATE = 258
+
+def estimate_tokens(prompt: str | list) -> int:
+    """
+    Roughly estimates the number of tokens in a prompt (about four characters per token).
+    Non-text parts such as images count as a fixed amount.
+    """
+    parts = prompt if isinstance(prompt, list) else [prompt]
+    tokens = 0
+    for part in parts:
+        tokens += len(part) // 4 + 1 if isinstance(part, str) else IMAGE_TOKEN_ESTIMATE
+    return tokens
+
+class LLMBackend(abc.ABC):
+    """
+    The interface every model backend implements: turn a prompt (a string, or a list of
+    strings and images) into the model's text answer.
+    """
+    name = "base"
+    model_id = "base" # Identifies the model in cache keys
+
+    @abc.abstractmethod
+    def generate(self, prompt: str | list, timeout: float) -> str:
+        """Returns the model's text answer to the prompt, raising on any API error."""
+
+    def is_transient(self, error: Exception) -> bool:
+        """Whether an error is worth retrying (rate limits, timeouts, server errors)."""
+        return isinstance(error, (TimeoutError, ConnectionError))
+
+class GeminiBackend(LLMBackend):
+    """Sends prompts to the Gemini API."""
+    name = "gemini"
+
+    def __init__(self, api_key: str, model_name: str):
+        if not api_key:
+            raise ValueError("GEMINI_API_KEY is not set. Please set it as an environment variable or in `pkm_gardener/api.py`.")
+        import google.generativeai as genai
+
+        genai.configure(api_key=api_key)
+        self.model = genai.GenerativeModel(model_name)
+        self.model_id = model_name
+
+    def generate(self, prompt: str | list, timeout: float) -> str:
+        response = self.model.generate_content(prompt, request_options={"timeout": timeout})
+        usage = getattr(response, "usage_metadata", None)
+        if usage is not None:
+            tracer.add("llm_billed_prompt_tokens", getattr(usage, "prompt_token_count", 0) or 0)
+            tracer.add("llm_cached_prompt_tokens", getattr(usage, "cached_content_token_count", 0) or 0)
+        return response.text.strip()
+
+    def is_transient(self, error: Exception) -> bool:
+        if super().is_transient(error):
+            return True
+        try:
+            from google.api_core import exceptions as api_exceptions
+        except ImportError:
+            return False
+        return isinstance(error, (
+            api_exceptions.TooManyRequests,
+            api_exceptions.ResourceExhausted,
+            api_exceptions.ServiceUnavailable,
+            api_exceptions.InternalServerError,
+            api_exceptions.DeadlineExceeded,
+        ))
+
+class FakeBackend(LLMBackend):
+    """
+    A deterministic local stand-in for the model, for offline and throughput testing.
+    The answer depends only on the prompt, and follows the same output format as Gemini,
+    including the per-document results of batched prompts.
+    """
+    name = "fake"
+    model_id = "fake"
+
+    _DOCUMENT_MARKER = re.compile(r'^=== DOCUMENT (\d+) ===$', re.MULTILINE)
+    _FOLDER_LIST = re.compile(r'\*\*List of Valid Destination Folders:\*\*\s*```\s*(.*?)\s*```', re.DOTALL)
+
+    def __init__(self, latency: float = 0.0, latency_per_1k_tokens: float = 0.0):
+        self.latency = latency
+        self.latency_per_1k_tokens = latency_per_1k_tokens # Models the prompt processing time of a real model
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _folders(self, prompt: str) -> list:
+        match = self._FOLDER_LIST.search(prompt)
+        if match:
+            # One folder per line, optionally followed by its stats in parentheses
+            folders = [line.split(" (", 1)[0].strip() for line in match.group(1).splitlines() if line.strip()]
+            if folders:
+                return folders
+        return ["03_Resources"]
+
+    def _answer(self, text: str, folders: list) -> str:
+        digest = hashlib.sha256(text.encode("utf-8", errors="ignore")).hexdigest()
+        folder = folders[int(digest[:8], 16) % len(folders)]
+        return (
+            f"---\ntitle: Note {digest[:8]}\nstatus: triage\npriority: P3\ntype: document\n"
+            f"tags: [fake, note-{digest[8:12]}]\nsource: ''\nentities: []\nconfidence_score: 0.5\n---\n"
+            f"A deterministic summary of note {digest[:8]}.\n{folder}\nnote-{digest[:8]}.md"
+        )
+
+    def generate(self, prompt: str | list, timeout: float) -> str:
+        with self._lock:
+            self.calls += 1
+        latency = self.latency + self.latency_per_1k_tokens * estimate_tokens(prompt) / 1000
+        if latency:
+            time.sleep(latency)
+
+        if isinstance(prompt, list):
+            # Multimodal (vision) prompt: describe the non-text parts
+            digest = hashlib.sha256(repr(prompt).encode("utf-8", errors="ignore")).hexdigest()
+            return f"An image, fake description {digest[:8]}."
+
+        folders = self._folders(prompt)
+        sections = self._DOCUMENT_MARKER.split(prompt)
+        if len(sections) == 1:
+            return self._answer(prompt, folders)
+        return "\n".join(
+            f"=== RESULT {number} ===\n{self._answer(body, folders)}"
+            for number, body in zip(sections[1::2], sections[2::2])
+        )
+
+class RateLimiter:
+    """
+    A token-bucket limiter on both requests per minute and tokens per minute.
+    Each bucket holds up to one minute's allowance and refills continuously.
+    """
+
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._request_allowance = float(requests_per_minute)
+        self._token_allowance = float(tokens_per_minute)
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        elapsed = now - self._last_refill
+        self._last_refill = now
+        self._request_allowance = min(self.requests_per_minute, self._request_allowance + elapsed * self.requests_per_minute / 60)
+        self._token_allowance = min(self.tokens_per_minute, self._token_allowance + elapsed * self.tokens_per_minute / 60)
+
+    def acquire(self, tokens: int):
+        """Blocks until one request carrying `tokens` tokens may be sent."""
+        # A single prompt larger than the whole allowance only waits for a full bucket
+        tokens = min(tokens, self.tokens_per_minute)
+        while True:
+            with self._lock:
+                self._refill(time.monotonic())
+                if self._request_allowance >= 1 and self._token_allowance >= tokens:
+                    self._request_allowance -= 1
+                    self._token_allowance -= tokens
+                    return
+                wait = max(
+                    (1 - self._request_allowance) * 60 / self.requests_per_minute,
+                    (tokens - self._token_allowance) * 60 / self.tokens_per_minute,
+                )
+            time.sleep(max(wait, 0.01))
+
+class LLMClient:
+    """
+    The shared entry point for every model call: applies the rate limiter, a per-call
+    timeout, and jittered exponential backoff on transient errors.
+    """
+
+    def __init__(self, backend: LLMBackend, rate_limiter: RateLimiter, timeout: float,
+                 max_retries: int, retry_base_delay: float, retry_max_delay: float):
+        self.backend = backend
+        self.rate_limiter = rate_limiter
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self.requests = 0 # Requests sent, including retries, since the client was created
+        self._requests_lock = threading.Lock()
+
+    def generate(self, prompt: str | list) -> str:
+        tokens = estimate_tokens(prompt)
+        prompt_chars = sum(len(part) for part in prompt if isinstance(part, str)) if isinstance(prompt, list) else len(prompt)
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.acquire(tokens)
+            with self._requests_lock:
+                self.requests += 1
+            tracer.add("llm_requests")
+            tracer.add("llm_prompt_tokens", tokens)
+            tracer.add("llm_prompt_chars", prompt_chars)
+            try:
+                with tracer.span("llm_request", backend=self.backend.name, attempt=attempt,
+                                 prompt_tokens=tokens, prompt_chars=prompt_chars) as span:
+                    response = self.backend.generate(prompt, self.timeout)
+                    response_tokens = estimate_tokens(response)
+                    span.set(response_tokens=response_tokens, response_chars=len(response))
+                tracer.add("llm_response_tokens", response_tokens)
+                tracer.add("llm_response_chars", len(response))
+                return response
+            except Exception as e:
+                if attempt == self.max_retries or not self.backend.is_transient(e):
+                    tracer.add("llm_errors")
+                    raise
+                tracer.add("llm_retries")
+                # Full jitter: sleep a random time up to the exponential backoff cap
+                delay = random.uniform(0, min(self.retry_max_delay, self.retry_base_delay * 2 ** attempt))
+                print(f"Transient LLM error ({e}); retrying in {delay:.1f}s (attempt {attempt + 1}/{self.max_retries}).")
+                time.sleep(delay)
+
+def create_backend(name: str) -> LLMBackend:
+    if name == "gemini":
+        return GeminiBackend(GEMINI_API_KEY, GEMINI_MODEL_NAME)
+    if name == "fake":
+        return FakeBackend(latency=FAKE_LLM_LATENCY, latency_per_1k_tokens=FAKE_LLM_LATENCY_PER_1K_TOKENS)
+    raise ValueError(f"Unknown LLM backend: {name}")
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_client() -> LLMClient:
+    """Returns the process-wide LLM client, creating it on first use."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = LLMClient(
+                create_backend(LLM_BACKEND),
+                RateLimiter(LLM_REQUESTS_PER_MINUTE, LLM_TOKENS_PER_MINUTE),
+                timeout=LLM_REQUEST_TIMEOUT,
+                max_retries=LLM_MAX_RETRIES,
+                retry_base_delay=LLM_RETRY_BASE_DELAY,
+                retry_max_delay=LLM_RETRY_MAX_DELAY,
+            )
+        return _client
+
+def set_client(client: LLMClient | None):
+    """Replaces the shared client (e.g. with one wrapping a FakeBackend); None resets it."""
+    global _client
+    with _client_lock:
+        _client = client
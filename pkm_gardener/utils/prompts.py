@@ -0,0 +1,298 @@
+import math
+import re
+import threading
+from collections import Counter
+from html import unescape
+from typing import Callable
+
+from pkm_gardener.config import PROMPT_NORMALIZE_CONTENT, PROMPT_CONTENT_TOKENS
+from pkm_gardener.core_modules.folder_taxonomy import describe_folders, folder_taxonomy
+from pkm_gardener.utils.chunking import split_into_chunks
+from pkm_gardener.utils.llm_client import estimate_tokens
+from pkm_gardener.utils.tracing import tracer
+
+# The prompts are laid out static-first: instructions, then the folder list (the same for a
+# whole run), then the content. Consecutive requests thus share a long identical prefix,
+# which providers with prefix caching bill and process once.
+
+_INSTRUCTIONS = """You are an expert librarian and metadata specialist. Analyze the content and produce four items: YAML frontmatter with detailed metadata including a `title`, a one-paragraph summary, a destination folder, and a kebab-case filename (e.g. `deep-learning-cheatsheet.md`).
+
+YAML keys:
+- title: concise and descriptive
+- status: active-tool, learning, archived or triage
+- priority: P1, P2, P3 or P4
+- type: repo, paper, tutorial, cheatsheet, SOP, course, website, image, pdf, csv or document
+- tags: 5-7 lowercase, kebab-case tags
+- source: the primary URL if the content is from a webpage, otherwise empty
+- entities: key people, organizations or topics mentioned
+- confidence_score: 0.0 to 1.0, your confidence in the metadata
+
+Folders follow PARA: 01_Projects for time-bound goals, 02_Areas for ongoing responsibilities, 03_Resources (the default) for general knowledge and reference material. Prefer an existing folder from the list below, which shows each folder's note count and most used tags in parentheses; answer with the folder path only. If none fits, create a new, descriptive folder in the most appropriate PARA category (e.g. `01_Projects/New-Project-Name`).
+"""
+
+_SINGLE_OUTPUT_FORMAT = """
+Output exactly these four items, each on its own line, in this order:
+```
+---
+<yaml-keys-and-values>
+---
+A one-paragraph summary of the content.
+relative/path/to/folder
+suggested-filename.md
+```
+"""
+
+_BATCH_OUTPUT_FORMAT = """
+Several documents follow, each introduced by a `=== DOCUMENT <n> ===` line. For every document, in order, output a `=== RESULT <n> ===` line followed by its four items, each on its own line, in this order:
+```
+=== RESULT <n> ===
+---
+<yaml-keys-and-values>
+---
+A one-paragraph summary of the content.
+relative/path/to/folder
+suggested-filename.md
+```
+"""
+
+_SINGLE_PREFIX = _INSTRUCTIONS + _SINGLE_OUTPUT_FORMAT
+_BATCH_PREFIX = _INSTRUCTIONS + _BATCH_OUTPUT_FORMAT
+
+_HTML_BLOCK = re.compile(r'<(script|style|noscript|nav|footer|aside|svg)\b.*?</\1\s*>', re.IGNORECASE | re.DOTALL)
+_HTML_COMMENT = re.compile(r'<!--.*?-->', re.DOTALL)
+_HTML_TAG = re.compile(r'</?[a-zA-Z][\w-]*(?:\s[^<>]*)?/?>') # Not <https://...> autolinks
+_MD_IMAGE = re.compile(r'!\[[^\]\n]*\]\([^)\n]*\)')
+_MD_LINK = re.compile(r'\[([^\]\n]*)\]\(\s*<?([^)\s>]*)>?(?:\s+"[^"\n]*")?\s*\)')
+_DATA_URI = re.compile(r'data:[\w/+.-]+;base64,[A-Za-z0-9+/=]+')
+_LONG_TOKEN = re.compile(r'[A-Za-z0-9+/=_-]{120,}') # Base64 blobs, hashes, tracking ids
+_URL = re.compile(r'https?://[^\s)\]>"]+')
+_TRACKING_PARAM = re.compile(r'(?:utm_\w+|fbclid|gclid|mc_cid|mc_eid)(?:=|$)')
+_EMPHASIS = re.compile(r'\*\*|__|~~')
+_TABLE_RULE = re.compile(r'^\|?(?:\s*:?-{3,}:?\s*\|)+\s*:?-*:?\s*\|?$')
+_SPACES = re.compile(r'[ \t\u00a0\u200b]+')
+_BLANK_LINES = re.compile(r'\n{3,}')
+_LIST_MARKER = re.compile(r'^(?:[-*+•·|>]|\d+[.)])\s*')
+_LINK_SEPARATORS = re.compile(r'[\s|•·/,-]+')
+# Lines matching a banner pattern are page furniture however they are worded
+_BANNER = re.compile(
+    r'skip to (?:main )?content|(?:accept|reject|manage) (?:all )?cookies|(?:we|site|website) uses? cookies'
+    r'|cookie (?:policy|settings|preferences|consent)|all rights reserved|back to top|toggle navigation|©',
+    re.IGNORECASE,
+)
+# Lines matching a boilerplate pattern are dropped when little else is left on them
+_BOILERPLATE = re.compile(
+    r'\b(?:subscribe(?: now)?|sign (?:in|up)|log ?in|share (?:this|on)|follow us|advertisement|newsletter'
+    r'|privacy policy|terms of (?:service|use)|related (?:posts|articles)|read more|open menu)\b',
+    re.IGNORECASE,
+)
+_BOILERPLATE_MAX_OTHER_WORDS = 3
+
+# Lines this short or shorter can be banners, menu items or repeated page furniture
+_SHORT_LINE = 100
+# Consecutive lines made only of short links, from this many on, are a navigation menu
+_MENU_MIN_LINES = 3
+_MENU_MAX_LINK_WORDS = 3
+# Short lines repeated this often (headers, footers, "Read more") keep their first occurrence only
+_REPEATED_LINE_MIN_COUNT = 3
+
+_WORD = re.compile(r'[^\W\d_]{3,}')
+
+def _link_text(match: re.Match) -> str:
+    text, url = match.group(1).strip(), match.group(2)
+    # Keep the URL of autolinks ([https://...](https://...)): the model may need it as `source`
+    return url if not text or text == url else text
+
+def _strip_tracking(match: re.Match) -> str:
+    url, hash_mark, fragment = match.group(0).partition("#")
+    base, question_mark, query = url.partition("?")
+    if not question_mark:
+        return match.group(0)
+    params = [param for param in query.split("&") if param and not _TRACKING_PARAM.match(param)]
+    return base + ("?" + "&".join(params) if params else "") + hash_mark + fragment
+
+def _is_boilerplate(line: str) -> bool:
+    if len(line) > _SHORT_LINE * 2 or not line:
+        return False
+    if _BANNER.search(line) or _TABLE_RULE.match(line):
+        return True
+    if len(line) > _SHORT_LINE or not _BOILERPLATE.search(line):
+        return False
+    return len(_BOILERPLATE.sub(" ", line).split()) <= _BOILERPLATE_MAX_OTHER_WORDS
+
+def _is_menu_line(line: str) -> bool:
+    """Whether a line holds nothing but one or more short links (e.g. `- [Home](/) | [About](/about)`)."""
+    links = _MD_LINK.findall(line)
+    if not links or any(len(text.split()) > _MENU_MAX_LINK_WORDS for text, _ in links):
+        return False
+    return not _LINK_SEPARATORS.sub("", _LIST_MARKER.sub("", _MD_LINK.sub("", line.strip())))
+
+def normalize_content(text: str) -> str:
+    """
+    Strips what costs tokens without helping classification: HTML markup and entities, images,
+    link targets, data URIs and long opaque tokens, tracking parameters, emphasis markers,
+    navigation menus, cookie and share banners, repeated page furniture, and runs of spaces
+    and blank lines. Headings, paragraphs, frontmatter and bare URLs are kept.
+    """
+    if "<" in text:
+        text = _HTML_TAG.sub(" ", _HTML_COMMENT.sub(" ", _HTML_BLOCK.sub(" ", text)))
+    if "&" in text:
+        text = unescape(text)
+    text = _DATA_URI.sub("[data]", text)
+    text = _LONG_TOKEN.sub("[data]", text)
+    text = _MD_IMAGE.sub("", text)
+
+    lines = text.split("\n")
+    menu = [_is_menu_line(line) if "](" in line else False for line in lines]
+    run_start = None
+    for i in range(len(lines) + 1):
+        if i < len(lines) and menu[i]:
+            run_start = i if run_start is None else run_start
+            continue
+        if run_start is not None and i - run_start < _MENU_MIN_LINES:
+            menu[run_start:i] = [False] * (i - run_start) # Too short a run to be a menu
+        run_start = None
+
+    cleaned = []
+    for line, in_menu in zip(lines, menu):
+        if in_menu:
+            continue
+        if "](" in line:
+            line = _MD_LINK.sub(_link_text, line)
+        if "://" in line and "?" in line:
+            line = _URL.sub(_strip_tracking, line)
+        line = _SPACES.sub(" ", _EMPHASIS.sub("", line)).strip(" ") # Keeps the PDF extractor's form feeds
+        if _is_boilerplate(line):
+            continue
+        cleaned.append(line)
+
+    counts = Counter(line for line in cleaned if line and len(line) <= _SHORT_LINE)
+    seen = set()
+    kept = []
+    for line in cleaned:
+        if counts.get(line, 0) >= _REPEATED_LINE_MIN_COUNT:
+            if line in seen:
+                continue
+            seen.add(line)
+        if kept and line and line == kept[-1]:
+            continue
+        kept.append(line)
+    return _BLANK_LINES.sub("\n\n", "\n".join(kept)).strip()
+
+def key_passages(text: str, max_tokens: int) -> str:
+    """
+    Cuts content over `max_tokens` down to its most central passages, in their original order
+    with `[...]` marking the gaps. The opening passage is always kept; the others are ranked by
+    how many of the document's characteristic words (frequent overall, but concentrated in
+    few passages) they contain, relative to their length.
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    passages = split_into_chunks(text, max(50, max_tokens // 20))
+    words = [Counter(_WORD.findall(passage.lower())) for passage in passages]
+    frequency, spread = Counter(), Counter()
+    for passage_words in words:
+        frequency.update(passage_words)
+        spread.update(passage_words.keys())
+    weight = {word: math.log1p(count) * math.log(len(passages) / spread[word]) for word, count in frequency.items()}
+    scores = [
+        sum(weight[word] for word in passage_words) / math.sqrt(sum(passage_words.values()) + 1)
+        for passage_words in words
+    ]
+
+    chosen, used = set(), 0
+    for i in [0] + sorted(range(1, len(passages)), key=lambda i: -scores[i]):
+        tokens = estimate_tokens(passages[i]) + 2
+        if used + tokens <= max_tokens:
+            chosen.add(i)
+            used += tokens
+    parts = []
+    for i in sorted(chosen):
+        if parts and i - 1 not in chosen:
+            parts.append("[...]")
+        parts.append(passages[i])
+    if max(chosen) < len(passages) - 1:
+        parts.append("[...]")
+    return "\n\n".join(parts)
+
+def prepare_content(text: str, condense: Callable[[str], str] | None = None) -> str:
+    """
+    Readies content for a metadata prompt: normalizes it (when enabled), passes it through
+    `condense` (the chunked summarization of overlong content) and trims it to
+    PROMPT_CONTENT_TOKENS. Normalizing first keeps the summaries from being spent on markup.
+    """
+    if PROMPT_NORMALIZE_CONTENT:
+        text = normalize_content(text)
+    if condense is not None:
+        text = condense(text)
+    return key_passages(text, PROMPT_CONTENT_TOKENS)
+
+_folder_block = (None, None) # (key, rendered folder list)
+_folder_block_lock = threading.Lock()
+
+def _folders(destination_folders_relative: list) -> str:
+    """
+    The rendered folder list, reused while the folders and their stats are unchanged, so
+    every request of a run sends a byte-identical prefix. The stats are keyed by the taxonomy's
+    scan generation: an object id could be reused by the stats of a later scan.
+    """
+    global _folder_block
+    key = (tuple(destination_folders_relative), folder_taxonomy.generation)
+    with _folder_block_lock:
+        if _folder_block[0] != key:
+            _folder_block = (key, describe_folders(destination_folders_relative))
+        return _folder_block[1]
+
+def build_prompt(content: str, destination_folders_relative: list) -> str:
+    """The metadata prompt for one document; `content` should already be prepared."""
+    return (
+        f"{_SINGLE_PREFIX}\n**List of Valid Destination Folders:**\n```\n{_folders(destination_folders_relative)}\n```\n\n"
+        f"**Content to Analyze:**\n```\n{content}\n```\n\nOutput only the four items, with no explanation.\n"
+    )
+
+def build_batch_prompt(contents: list[str], destination_folders_relative: list) -> str:
+    """The metadata prompt for several documents answered in one request."""
+    documents = "\n".join(f"=== DOCUMENT {i} ===\n```\n{content}\n```" for i, content in enumerate(contents, start=1))
+    return (
+        f"{_BATCH_PREFIX}\n**List of Valid Destination Folders:**\n```\n{_folders(destination_folders_relative)}\n```\n\n"
+        f"**Documents to Analyze:**\n{documents}\n\nFor each document, output only its result marker and its four items, with no explanation.\n"
+    )
+
+class PromptStats:
+    """Totals of the metadata prompts sent in the current run, for the end-of-run report."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests = 0
+            self.documents = 0
+            self.prompt_tokens = 0
+            self.raw_chars = 0
+            self.content_chars = 0
+
+    def record(self, raw_contents: list[str], contents: list[str], prompt: str):
+        """Counts one request carrying `contents`, prepared from `raw_contents`."""
+        raw_chars = sum(len(content) for content in raw_contents)
+        content_chars = sum(len(content) for content in contents)
+        tokens = estimate_tokens(prompt)
+        with self._lock:
+            self.requests += 1
+            self.documents += len(contents)
+            self.prompt_tokens += tokens
+            self.raw_chars += raw_chars
+            self.content_chars += content_chars
+        tracer.add("llm_content_chars_raw", raw_chars)
+        tracer.add("llm_content_chars_sent", content_chars)
+
+    def summary(self) -> str:
+        with self._lock:
+            if not self.requests:
+                return "Metadata prompts: none sent."
+            saved = 1 - self.content_chars / self.raw_chars if self.raw_chars else 0.0
+            return (f"Metadata prompts: {self.requests} requests for {self.documents} documents, "
+                    f"{self.prompt_tokens} tokens ({self.prompt_tokens / self.requests:.0f} per request); "
+                    f"content cut from {self.raw_chars} to {self.content_chars} chars ({saved:.0%} saved).")
+
+prompt_stats = PromptStats()
@@ -0,0 +1,215 @@
+import json
+import math
+import os
+import threading
+import time
+from collections import defaultdict, deque
+
+from pkm_gardener.config import TRACING_ENABLED, TRACE_PATH, TRACE_MAX_BYTES, METRICS_PATH
+from pkm_gardener.utils.filename import temp_path_for
+
+# Per-stage durations kept for the quantiles in the metrics file
+_QUANTILE_WINDOW = 10000
+
+# Help text for the counters written to the metrics file, keyed by counter name
+_COUNTER_HELP = {
+    "jobs": "Files processed, by final status.",
+    "llm_requests": "Requests sent to the LLM backend, including retries.",
+    "llm_retries": "LLM requests retried after a transient error.",
+    "llm_errors": "LLM requests that failed for good.",
+    "llm_prompt_tokens": "Estimated prompt tokens sent to the LLM.",
+    "llm_response_tokens": "Estimated response tokens received from the LLM.",
+    "llm_prompt_chars": "Prompt characters sent to the LLM.",
+    "llm_response_chars": "Response characters received from the LLM.",
+    "llm_billed_prompt_tokens": "Prompt tokens counted by the LLM provider.",
+    "llm_cached_prompt_tokens": "Prompt tokens the LLM provider served from its prefix cache.",
+    "llm_content_chars_raw": "Characters of content before prompt normalization and trimming.",
+    "llm_content_chars_sent": "Characters of content sent in metadata prompts.",
+    "pdf_cache_hits": "PDF extractions served from the extracted-text cache.",
+    "pdf_cache_misses": "PDF extractions that ran PyMuPDF.",
+}
+
+class Span:
+    """A timed operation. Attributes added with `set` are written with it to the trace file."""
+    __slots__ = ("tracer", "name", "attributes", "start", "wall_start")
+
+    def __init__(self, tracer: "Tracer", name: str, attributes: dict):
+        self.tracer = tracer
+        self.name = name
+        self.attributes = attributes
+
+    def __enter__(self):
+        self.wall_start = time.time()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self.start
+        if exc_type is not None:
+            self.attributes["error"] = f"{exc_type.__name__}: {exc}"
+        self.tracer._finish(self, duration)
+        return False
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+class _NullSpan:
+    """Stands in for a span when tracing is disabled, so instrumented code costs a method call."""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **attributes):
+        pass
+
+_NULL_SPAN = _NullSpan()
+
+def _percentile(sorted_values: list[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    return sorted_values[max(0, math.ceil(fraction * len(sorted_values)) - 1)]
+
+def _labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in sorted(labels.items())) + "}"
+
+class Tracer:
+    """
+    Records per-job spans for each pipeline stage and a few counters. Spans are appended to
+    a JSONL trace file as they finish; at the end of a run the per-stage p50/p95 table is
+    printed and the metrics are written in the Prometheus textfile format.
+    """
+
+    def __init__(self, trace_path: str, metrics_path: str, enabled: bool = True):
+        self.trace_path = trace_path
+        self.metrics_path = metrics_path
+        self.enabled = enabled
+        self.run_id = None
+        self._lock = threading.Lock()
+        self._trace_file = None
+        self._run_durations = defaultdict(list) # stage -> durations in this run
+        self._recent_durations = defaultdict(lambda: deque(maxlen=_QUANTILE_WINDOW))
+        self._duration_totals = defaultdict(lambda: [0, 0.0]) # stage -> [count, seconds], since start
+        self._counters = defaultdict(float) # (name, labels) -> value, since start
+
+    def span(self, name: str, job=None, **attributes) -> Span | _NullSpan:
+        """Times the enclosed block as a span of `job` (a ProcessingJob, optional)."""
+        if not self.enabled:
+            return _NULL_SPAN
+        if job is not None:
+            attributes["file"] = job.original_filename
+        return Span(self, name, attributes)
+
+    def add(self, name: str, value: float = 1, **labels):
+        """Increments a counter."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[(name, tuple(sorted(labels.items())))] += value
+
+    def start_run(self):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.run_id = os.urandom(6).hex()
+            self._run_durations.clear()
+            if self._trace_file is None and os.path.exists(self.trace_path) and os.path.getsize(self.trace_path) > TRACE_MAX_BYTES:
+                # Keep one previous generation of the trace
+                os.replace(self.trace_path, f"{self.trace_path}.1")
+
+    def _finish(self, span: Span, duration: float):
+        record = {"run": self.run_id, "span": span.name, "start": round(span.wall_start, 6),
+                  "duration_ms": round(duration * 1000, 3), "thread": threading.current_thread().name}
+        record.update(span.attributes)
+        line = json.dumps(record, default=str) + "\n"
+        with self._lock:
+            self._run_durations[span.name].append(duration)
+            self._recent_durations[span.name].append(duration)
+            totals = self._duration_totals[span.name]
+            totals[0] += 1
+            totals[1] += duration
+            if self._trace_file is None:
+                os.makedirs(os.path.dirname(self.trace_path), exist_ok=True)
+                self._trace_file = open(self.trace_path, 'a', encoding='utf-8')
+            self._trace_file.write(line)
+
+    def stage_stats(self) -> dict[str, dict]:
+        """Per-stage timings of the current run: count, p50, p95 and max in ms, and total seconds."""
+        stats = {}
+        with self._lock:
+            for name, durations in sorted(self._run_durations.items()):
+                ordered = sorted(durations)
+                stats[name] = {
+                    "count": len(ordered),
+                    "p50_ms": _percentile(ordered, 0.5) * 1000,
+                    "p95_ms": _percentile(ordered, 0.95) * 1000,
+                    "max_ms": ordered[-1] * 1000,
+                    "total_s": sum(ordered),
+                }
+        return stats
+
+    def summary_table(self) -> str:
+        """Formats the per-stage timings of the current run."""
+        rows = [("stage", "count", "p50 ms", "p95 ms", "max ms", "total s")]
+        for name, stats in self.stage_stats().items():
+            rows.append((name, str(stats["count"]), f"{stats['p50_ms']:.1f}", f"{stats['p95_ms']:.1f}",
+                         f"{stats['max_ms']:.1f}", f"{stats['total_s']:.2f}"))
+        widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+        return "\n".join(
+            "  ".join(cell.ljust(width) if i == 0 else cell.rjust(width) for i, (cell, width) in enumerate(zip(row, widths)))
+            for row in rows
+        )
+
+    def metrics_text(self, gauges: dict | None = None) -> str:
+        """Renders the metrics in the Prometheus text exposition format."""
+        lines = [
+            "# HELP pkm_stage_duration_seconds Time spent per pipeline stage.",
+            "# TYPE pkm_stage_duration_seconds summary",
+        ]
+        with self._lock:
+            for name in sorted(self._duration_totals):
+                ordered = sorted(self._recent_durations[name])
+                for quantile in (0.5, 0.95):
+                    lines.append(f'pkm_stage_duration_seconds{{stage="{name}",quantile="{quantile}"}} {_percentile(ordered, quantile):.6f}')
+                count, total = self._duration_totals[name]
+                lines.append(f'pkm_stage_duration_seconds_sum{{stage="{name}"}} {total:.6f}')
+                lines.append(f'pkm_stage_duration_seconds_count{{stage="{name}"}} {count}')
+
+            counters = defaultdict(list)
+            for (name, labels), value in self._counters.items():
+                counters[name].append((dict(labels), value))
+        for name in sorted(counters):
+            lines.append(f"# HELP pkm_{name}_total {_COUNTER_HELP.get(name, name)}")
+            lines.append(f"# TYPE pkm_{name}_total counter")
+            for labels, value in sorted(counters[name], key=lambda item: sorted(item[0].items())):
+                lines.append(f"pkm_{name}_total{_labels(labels)} {value:g}")
+        for name, (value, help_text) in sorted((gauges or {}).items()):
+            lines.append(f"# HELP pkm_{name} {help_text}")
+            lines.append(f"# TYPE pkm_{name} gauge")
+            lines.append(f"pkm_{name} {value:g}")
+        return "\n".join(lines) + "\n"
+
+    def finish_run(self, gauges: dict | None = None):
+        """
+        Prints the run's stage table, flushes the trace and writes the metrics file.
+        `gauges` maps metric names to (value, help text) pairs for point-in-time values.
+        """
+        if not self.enabled:
+            return
+        print(f"Stage timings (trace: {self.trace_path}):")
+        print(self.summary_table())
+        with self._lock:
+            if self._trace_file is not None:
+                self._trace_file.flush()
+        # Write-then-rename, so a metrics collector never reads a half-written file
+        os.makedirs(os.path.dirname(self.metrics_path), exist_ok=True)
+        temp_path = temp_path_for(self.metrics_path)
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(self.metrics_text(gauges))
+        os.replace(temp_path, self.metrics_path)
+
+tracer = Tracer(TRACE_PATH, METRICS_PATH, enabled=TRACING_ENABLED)
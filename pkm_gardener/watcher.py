@@ -0,0 +1,100 @@
+import os
+import time
+
+from pkm_gardener.config import INBOX_PATH, CACHE_DIR, WATCH_POLL_INTERVAL, WATCH_SETTLE_SECONDS
+from pkm_gardener.core_modules import ingestor
+from pkm_gardener.core_modules.inbox_state import FileRecord, InboxState
+from pkm_gardener.orchestrator import run_pipeline
+from pkm_gardener.types import ProcessingJob
+from pkm_gardener.utils.hashing import file_sha256
+
+def _scan_inbox() -> dict[str, os.stat_result]:
+    """Returns the stat result of every regular, non-hidden file in the inbox."""
+    stats = {}
+    if not os.path.exists(INBOX_PATH):
+        return stats
+    with os.scandir(INBOX_PATH) as entries:
+        for entry in entries:
+            if entry.name.startswith('.') or not entry.is_file():
+                continue
+            try:
+                stats[entry.path] = entry.stat()
+            except OSError:
+                continue # Removed between listing and stat
+    return stats
+
+class InboxWatcher:
+    """
+    Polls the inbox and decides which files are ready to be processed: new or changed
+    files whose size and mtime have stayed the same for `settle_seconds`.
+    """
+
+    def __init__(self, state: InboxState, settle_seconds: float = WATCH_SETTLE_SECONDS):
+        self.state = state
+        self.settle_seconds = settle_seconds
+        self._pending = {} # path -> ((size, mtime_ns), monotonic time the fingerprint was first seen)
+
+    def poll(self) -> list[tuple[ProcessingJob, FileRecord]]:
+        now = time.monotonic()
+        stats = _scan_inbox()
+        self.state.prune(set(stats))
+        for path in list(self._pending):
+            if path not in stats:
+                del self._pending[path]
+
+        ready = []
+        for path, st in stats.items():
+            fingerprint = (st.st_size, st.st_mtime_ns)
+            record = self.state.get(path)
+            if record and (record.size, record.mtime_ns) == fingerprint:
+                # Already handled and untouched since (this includes files that failed)
+                self._pending.pop(path, None)
+                continue
+
+            seen = self._pending.get(path)
+            if seen is None or seen[0] != fingerprint:
+                # New, or still being written: wait for it to settle
+                self._pending[path] = (fingerprint, now)
+                continue
+            if now - seen[1] < self.settle_seconds:
+                continue
+            del self._pending[path]
+
+            try:
+                content_hash = file_sha256(path)
+            except OSError as e:
+                print(f"Error reading file {os.path.basename(path)}: {e}")
+                continue
+            if record and record.content_hash == content_hash:
+                # Touched but not changed: keep skipping it
+                self.state.touch(path, *fingerprint)
+                continue
+
+            job = ingestor.make_job(path)
+            if job is not None:
+                ready.append((job, FileRecord(path, st.st_size, st.st_mtime_ns, content_hash, "pending")))
+        return ready
+
+def watch(poll_interval: float = WATCH_POLL_INTERVAL):
+    """
+    Runs the gardener as a long-lived process, processing files as they land in the inbox.
+    """
+    state = InboxState(os.path.join(CACHE_DIR, "inbox_state.sqlite3"))
+    watcher = InboxWatcher(state)
+    print(f"Watching {INBOX_PATH} for new files (polling every {poll_interval}s). Press Ctrl+C to stop.")
+    try:
+        while True:
+            ready = watcher.poll()
+            if ready:
+                # Keyed by name: jobs point at the leased copy of the file once claimed
+                records = {job.original_filename: record for job, record in ready}
+                for job in run_pipeline(job for job, _ in ready):
+                    record = records[job.original_filename]
+                    record.status = job.status
+                    record.error_message = job.error_message
+                    state.record(record)
+            time.sleep(poll_interval)
+    except KeyboardInterrupt:
+        print("Stopped watching the inbox.")
+    finally:
+        state.close()